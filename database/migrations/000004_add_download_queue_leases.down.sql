@@ -0,0 +1,6 @@
+-- Remove lease columns from download_queue table
+
+DROP INDEX IF EXISTS idx_download_queue_lease_expires_at;
+
+ALTER TABLE download_queue DROP COLUMN lease_expires_at;
+ALTER TABLE download_queue DROP COLUMN lease_owner;
@@ -0,0 +1,6 @@
+-- Add lease columns so several queue manager instances can claim downloads safely
+
+ALTER TABLE download_queue ADD COLUMN lease_owner TEXT;
+ALTER TABLE download_queue ADD COLUMN lease_expires_at DATETIME;
+
+CREATE INDEX idx_download_queue_lease_expires_at ON download_queue(status, lease_expires_at);
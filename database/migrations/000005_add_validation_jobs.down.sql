@@ -0,0 +1,4 @@
+-- Remove validation_jobs table
+
+DROP INDEX IF EXISTS idx_validation_jobs_status;
+DROP TABLE IF EXISTS validation_jobs;
@@ -0,0 +1,19 @@
+-- Add validation_jobs table so completed downloads can hand their inline
+-- checksum and format sniffing results to the format validator
+
+CREATE TABLE validation_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    book_file_id INTEGER NOT NULL,
+    checksum TEXT, -- SHA-256 computed while downloading
+    file_size_bytes INTEGER,
+    detected_format TEXT, -- Format sniffed from the leading bytes
+    format_mismatch BOOLEAN DEFAULT FALSE,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    error_message TEXT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    completed_at DATETIME,
+    FOREIGN KEY (book_file_id) REFERENCES book_files(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_validation_jobs_status ON validation_jobs(status, created_at);
@@ -0,0 +1,5 @@
+-- Remove next_retry_at column from download_queue table
+
+DROP INDEX IF EXISTS idx_download_queue_next_retry_at;
+
+ALTER TABLE download_queue DROP COLUMN next_retry_at;
@@ -0,0 +1,6 @@
+-- Persist the scheduled retry time of failed downloads so retry cycles
+-- only read rows that are actually due
+
+ALTER TABLE download_queue ADD COLUMN next_retry_at DATETIME;
+
+CREATE INDEX idx_download_queue_next_retry_at ON download_queue(status, next_retry_at);
@@ -0,0 +1,11 @@
+-- Remove retry event tables
+
+DROP TRIGGER IF EXISTS update_download_retry_summary;
+
+DROP INDEX IF EXISTS idx_download_retry_summary_reason;
+DROP TABLE IF EXISTS download_retry_summary;
+
+DROP INDEX IF EXISTS idx_download_retry_events_created_at;
+DROP INDEX IF EXISTS idx_download_retry_events_reason;
+DROP INDEX IF EXISTS idx_download_retry_events_download_id;
+DROP TABLE IF EXISTS download_retry_events;
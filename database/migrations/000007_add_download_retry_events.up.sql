@@ -0,0 +1,43 @@
+-- Record each retry as an append-only event and keep a per-download summary
+-- current from a trigger, so recording a retry is a single insert
+
+CREATE TABLE download_retry_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    download_id INTEGER NOT NULL,
+    failure_reason TEXT NOT NULL,
+    next_retry_at DATETIME,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (download_id) REFERENCES download_queue(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_download_retry_events_download_id ON download_retry_events(download_id, created_at);
+CREATE INDEX idx_download_retry_events_reason ON download_retry_events(failure_reason, created_at);
+CREATE INDEX idx_download_retry_events_created_at ON download_retry_events(created_at);
+
+CREATE TABLE download_retry_summary (
+    download_id INTEGER PRIMARY KEY,
+    failure_reason TEXT NOT NULL, -- Reason of the latest retry
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    first_retry_at DATETIME NOT NULL,
+    last_retry_at DATETIME NOT NULL,
+    next_retry_at DATETIME,
+    total_retry_time INTEGER NOT NULL DEFAULT 0, -- Seconds between first and latest retry
+    FOREIGN KEY (download_id) REFERENCES download_queue(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_download_retry_summary_reason ON download_retry_summary(failure_reason);
+
+CREATE TRIGGER update_download_retry_summary
+    AFTER INSERT ON download_retry_events
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO download_retry_summary
+            (download_id, failure_reason, retry_count, first_retry_at, last_retry_at, next_retry_at, total_retry_time)
+        VALUES (NEW.download_id, NEW.failure_reason, 1, NEW.created_at, NEW.created_at, NEW.next_retry_at, 0)
+        ON CONFLICT(download_id) DO UPDATE SET
+            failure_reason = excluded.failure_reason,
+            retry_count = retry_count + 1,
+            last_retry_at = excluded.last_retry_at,
+            next_retry_at = excluded.next_retry_at,
+            total_retry_time = CAST(ROUND((julianday(excluded.last_retry_at) - julianday(first_retry_at)) * 86400) AS INTEGER);
+    END;
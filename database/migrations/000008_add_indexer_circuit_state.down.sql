@@ -0,0 +1,3 @@
+-- Remove indexer_circuit_state table
+
+DROP TABLE IF EXISTS indexer_circuit_state;
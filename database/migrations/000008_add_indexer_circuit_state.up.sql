@@ -0,0 +1,12 @@
+-- Publish the failover manager's per-indexer circuit breaker state so the
+-- retry manager can hold back retries for indexers that are down
+
+CREATE TABLE indexer_circuit_state (
+    indexer_id INTEGER PRIMARY KEY,
+    state TEXT NOT NULL DEFAULT 'CLOSED' CHECK (state IN ('CLOSED', 'OPEN', 'HALF_OPEN')),
+    failure_count INTEGER NOT NULL DEFAULT 0,
+    last_failure_at DATETIME,
+    retry_after DATETIME, -- When an open circuit lets a probe through
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (indexer_id) REFERENCES indexers(id) ON DELETE CASCADE
+);
@@ -0,0 +1,12 @@
+-- Remove failure template tables
+
+DROP TRIGGER IF EXISTS update_failure_template_stats;
+
+DROP INDEX IF EXISTS idx_failure_template_stats_hour;
+DROP TABLE IF EXISTS failure_template_stats;
+
+DROP INDEX IF EXISTS idx_download_failure_events_download_id;
+DROP INDEX IF EXISTS idx_download_failure_events_template_id;
+DROP TABLE IF EXISTS download_failure_events;
+
+DROP TABLE IF EXISTS failure_templates;
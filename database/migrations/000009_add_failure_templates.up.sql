@@ -0,0 +1,51 @@
+-- Cluster download failure messages into templates and keep hourly
+-- counters per template, indexer and category for failure reports
+
+CREATE TABLE failure_templates (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    template TEXT NOT NULL, -- Message with variable tokens replaced by <*>
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE download_failure_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    download_id INTEGER NOT NULL,
+    template_id INTEGER NOT NULL,
+    indexer_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    parameters TEXT, -- JSON array of the values matched by <*>
+    retry_count INTEGER NOT NULL DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (download_id) REFERENCES download_queue(id) ON DELETE CASCADE,
+    FOREIGN KEY (template_id) REFERENCES failure_templates(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_download_failure_events_template_id ON download_failure_events(template_id, created_at);
+CREATE INDEX idx_download_failure_events_download_id ON download_failure_events(download_id);
+
+CREATE TABLE failure_template_stats (
+    template_id INTEGER NOT NULL,
+    indexer_id INTEGER NOT NULL,
+    category TEXT NOT NULL,
+    hour DATETIME NOT NULL, -- Start of the hour, 'YYYY-MM-DD HH:00:00'
+    failures INTEGER NOT NULL DEFAULT 0,
+    total_retry_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (template_id, indexer_id, category, hour),
+    FOREIGN KEY (template_id) REFERENCES failure_templates(id) ON DELETE CASCADE
+);
+
+CREATE INDEX idx_failure_template_stats_hour ON failure_template_stats(hour);
+
+CREATE TRIGGER update_failure_template_stats
+    AFTER INSERT ON download_failure_events
+    FOR EACH ROW
+    BEGIN
+        INSERT INTO failure_template_stats
+            (template_id, indexer_id, category, hour, failures, total_retry_count)
+        VALUES (NEW.template_id, NEW.indexer_id, NEW.category,
+                strftime('%Y-%m-%d %H:00:00', NEW.created_at), 1, NEW.retry_count)
+        ON CONFLICT(template_id, indexer_id, category, hour) DO UPDATE SET
+            failures = failures + 1,
+            total_retry_count = total_retry_count + excluded.total_retry_count;
+    END;
@@ -0,0 +1,5 @@
+-- Restore the single-column status index
+
+CREATE INDEX IF NOT EXISTS idx_download_queue_status ON download_queue(status);
+
+DROP INDEX IF EXISTS idx_download_queue_status_updated_at;
@@ -0,0 +1,7 @@
+-- Covering index for queue monitoring: status counters, stale and retry
+-- checks are answered from the index without touching table rows. It
+-- supersedes the single-column status index.
+
+CREATE INDEX idx_download_queue_status_updated_at ON download_queue(status, updated_at, priority);
+
+DROP INDEX IF EXISTS idx_download_queue_status;
@@ -0,0 +1,33 @@
+-- Restore the download_history.queue_id foreign key. Fails while history
+-- rows reference queue rows that have been archived; restore those first.
+
+CREATE TABLE download_history_old (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    book_id INTEGER,
+    indexer_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    author_name TEXT,
+    file_format TEXT NOT NULL,
+    file_size_bytes INTEGER,
+    download_duration_seconds INTEGER,
+    final_status TEXT NOT NULL CHECK (final_status IN ('completed', 'failed', 'cancelled')),
+    error_message TEXT,
+    download_path TEXT,
+    completed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (queue_id) REFERENCES download_queue(id),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE SET NULL,
+    FOREIGN KEY (indexer_id) REFERENCES indexers(id)
+);
+
+INSERT INTO download_history_old SELECT * FROM download_history;
+
+DROP TABLE download_history;
+ALTER TABLE download_history_old RENAME TO download_history;
+
+CREATE INDEX idx_download_history_user_id ON download_history(user_id);
+CREATE INDEX idx_download_history_completed_at ON download_history(completed_at);
+CREATE INDEX idx_download_history_final_status ON download_history(final_status);
+CREATE INDEX idx_download_history_book_id ON download_history(book_id);
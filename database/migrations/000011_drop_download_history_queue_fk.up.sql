@@ -0,0 +1,35 @@
+-- download_history is the permanent record of a download and outlives its
+-- queue row, which is archived or cleaned up on a shorter schedule. Drop
+-- the foreign key so queue rows can be removed with foreign keys enforced
+-- (letting ON DELETE CASCADE clean up retry and failure events); queue_id
+-- stays as a plain reference, resolvable through the archive views.
+
+CREATE TABLE download_history_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    queue_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    book_id INTEGER,
+    indexer_id INTEGER NOT NULL,
+    title TEXT NOT NULL,
+    author_name TEXT,
+    file_format TEXT NOT NULL,
+    file_size_bytes INTEGER,
+    download_duration_seconds INTEGER,
+    final_status TEXT NOT NULL CHECK (final_status IN ('completed', 'failed', 'cancelled')),
+    error_message TEXT,
+    download_path TEXT,
+    completed_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (book_id) REFERENCES books(id) ON DELETE SET NULL,
+    FOREIGN KEY (indexer_id) REFERENCES indexers(id)
+);
+
+INSERT INTO download_history_new SELECT * FROM download_history;
+
+DROP TABLE download_history;
+ALTER TABLE download_history_new RENAME TO download_history;
+
+CREATE INDEX idx_download_history_user_id ON download_history(user_id);
+CREATE INDEX idx_download_history_completed_at ON download_history(completed_at);
+CREATE INDEX idx_download_history_final_status ON download_history(final_status);
+CREATE INDEX idx_download_history_book_id ON download_history(book_id);
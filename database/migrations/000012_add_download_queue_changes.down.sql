@@ -0,0 +1,8 @@
+-- Remove the download_queue change log
+
+DROP TRIGGER IF EXISTS log_download_queue_delete;
+DROP TRIGGER IF EXISTS log_download_queue_update;
+DROP TRIGGER IF EXISTS log_download_queue_insert;
+
+DROP INDEX IF EXISTS idx_download_queue_changes_created_at;
+DROP TABLE IF EXISTS download_queue_changes;
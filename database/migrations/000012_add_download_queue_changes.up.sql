@@ -0,0 +1,35 @@
+-- Log changes to the pending part of download_queue so dispatchers can sync
+-- their in-memory schedulers incrementally: each insert, status or
+-- priority change or delete that touches a pending row appends its id
+
+CREATE TABLE download_queue_changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    download_id INTEGER NOT NULL,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_download_queue_changes_created_at ON download_queue_changes(created_at);
+
+CREATE TRIGGER log_download_queue_insert
+    AFTER INSERT ON download_queue
+    FOR EACH ROW
+    WHEN NEW.status = 'pending'
+    BEGIN
+        INSERT INTO download_queue_changes (download_id) VALUES (NEW.id);
+    END;
+
+CREATE TRIGGER log_download_queue_update
+    AFTER UPDATE OF status, priority ON download_queue
+    FOR EACH ROW
+    WHEN NEW.status = 'pending' OR OLD.status = 'pending'
+    BEGIN
+        INSERT INTO download_queue_changes (download_id) VALUES (NEW.id);
+    END;
+
+CREATE TRIGGER log_download_queue_delete
+    AFTER DELETE ON download_queue
+    FOR EACH ROW
+    WHEN OLD.status = 'pending'
+    BEGIN
+        INSERT INTO download_queue_changes (download_id) VALUES (OLD.id);
+    END;
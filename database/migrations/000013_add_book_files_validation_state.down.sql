@@ -0,0 +1,5 @@
+-- Remove validation tracking from book_files
+
+DROP TABLE IF EXISTS validation_checkpoints;
+
+ALTER TABLE book_files DROP COLUMN updated_at;
@@ -0,0 +1,12 @@
+-- Track when a book file was last validated and let resumable validation
+-- runs record the last book_files id whose results were durably written
+
+ALTER TABLE book_files ADD COLUMN updated_at DATETIME;
+
+UPDATE book_files SET updated_at = created_at;
+
+CREATE TABLE validation_checkpoints (
+    name TEXT PRIMARY KEY,
+    last_file_id INTEGER NOT NULL,
+    updated_at DATETIME NOT NULL
+);
@@ -0,0 +1,4 @@
+-- Remove the conversion job queue
+
+DROP INDEX IF EXISTS idx_conversion_jobs_status;
+DROP TABLE IF EXISTS conversion_jobs;
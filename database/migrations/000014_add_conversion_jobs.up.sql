@@ -0,0 +1,19 @@
+-- Persistent queue of format conversion jobs run by the format validator's
+-- conversion workers, so queued work survives restarts
+
+CREATE TABLE conversion_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_path TEXT NOT NULL,
+    target_format TEXT NOT NULL,
+    options TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'running', 'completed', 'failed')),
+    target_path TEXT,
+    quality_score REAL,
+    error_message TEXT,
+    attempts INTEGER DEFAULT 0,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    started_at DATETIME,
+    completed_at DATETIME
+);
+
+CREATE INDEX idx_conversion_jobs_status ON conversion_jobs(status, created_at);
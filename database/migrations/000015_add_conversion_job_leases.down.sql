@@ -0,0 +1,6 @@
+-- Remove lease columns from conversion_jobs
+
+DROP INDEX IF EXISTS idx_conversion_jobs_lease_expires_at;
+
+ALTER TABLE conversion_jobs DROP COLUMN lease_expires_at;
+ALTER TABLE conversion_jobs DROP COLUMN lease_owner;
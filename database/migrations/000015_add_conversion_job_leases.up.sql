@@ -0,0 +1,6 @@
+-- Add lease columns so overlapping conversion runs never take over each other's jobs
+
+ALTER TABLE conversion_jobs ADD COLUMN lease_owner TEXT;
+ALTER TABLE conversion_jobs ADD COLUMN lease_expires_at DATETIME;
+
+CREATE INDEX idx_conversion_jobs_lease_expires_at ON conversion_jobs(status, lease_expires_at);
@@ -13,14 +13,23 @@ import sys
 import time
 import os
 import shutil
+import socket
 import subprocess
 import hashlib
 import mimetypes
+import mmap
+import struct
+import resource
+import fcntl
+import errno
+import gzip
+import zlib
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any, Set
 from dataclasses import dataclass, asdict
 from enum import Enum
+from contextlib import contextmanager
 import yaml
 import zipfile
 import xml.etree.ElementTree as ET
@@ -37,6 +46,30 @@ logging.basicConfig(
 )
 logger = logging.getLogger('foliofox.format_validator')
 
+# PalmDB/MOBI layout constants
+PALMDB_HEADER_SIZE = 78
+PALMDOC_HEADER_SIZE = 16
+
+MOBI_COMPRESSION_TYPES = {
+    1: 'none',
+    2: 'palmdoc',
+    17480: 'huff/cdic'
+}
+
+# EXTH record types we care about, mapped to metadata keys
+EXTH_RECORD_TYPES = {
+    100: 'authors',
+    101: 'publisher',
+    103: 'description',
+    104: 'isbn',
+    106: 'publication_date',
+    113: 'asin',
+    121: 'kf8_boundary',
+    503: 'title',
+    504: 'asin',
+    524: 'language'
+}
+
 class ValidationStatus(Enum):
     VALID = "valid"
     INVALID = "invalid"
@@ -88,6 +121,225 @@ class ConversionResult:
     conversion_time_seconds: float
     errors: List[str]
 
+class BackupStore:
+    """Backs up original files using the cheapest mechanism that is still safe.
+    
+    Strategies, tried in order for 'auto':
+      reflink  - copy-on-write clone via the FICLONE ioctl (btrfs, XFS, ...)
+      hardlink - shares the inode; only safe when the original is not later
+                 modified in place, because the backup would change with it
+      dedup    - content-addressed object store under backup_dir/objects, so
+                 each distinct file is stored once and backups link to it
+    'copy' forces a plain shutil.copy2.
+    """
+    
+    FICLONE = 0x40049409  # _IOW(0x94, 9, int) from linux/fs.h
+    STRATEGIES = ('auto', 'reflink', 'hardlink', 'dedup', 'copy')
+    
+    def __init__(self, backup_dir: Path, strategy: str = 'auto'):
+        if strategy not in self.STRATEGIES:
+            logger.warning(f"Unknown backup strategy '{strategy}', using auto")
+            strategy = 'auto'
+        
+        self.backup_dir = Path(backup_dir)
+        self.objects_dir = self.backup_dir / 'objects'
+        self.strategy = strategy
+        self._reflink_supported = True
+    
+    def backup(self, source: Path, modifies_in_place: bool = True, 
+               checksum: Optional[str] = None) -> Tuple[Path, str]:
+        """Back up source and return (backup_path, method used)."""
+        backup_path = self.backup_dir / f"{source.name}.backup"
+        temp_path = backup_path.with_name(f".{backup_path.name}.tmp")
+        if temp_path.exists():
+            temp_path.unlink()
+        
+        if self.strategy == 'copy':
+            method = self._copy(source, temp_path)
+        elif self.strategy == 'reflink':
+            method = self._reflink(source, temp_path) or self._copy(source, temp_path)
+        elif self.strategy == 'hardlink':
+            method = self._hardlink(source, temp_path) or self._copy(source, temp_path)
+        elif self.strategy == 'dedup':
+            method = self._dedup(source, temp_path, checksum)
+        else:
+            method = self._reflink(source, temp_path)
+            if not method and not modifies_in_place:
+                method = self._hardlink(source, temp_path)
+            if not method:
+                method = self._dedup(source, temp_path, checksum)
+        
+        # Swap the finished backup into place so a previous backup is never half-overwritten
+        os.replace(temp_path, backup_path)
+        if temp_path.exists():
+            # rename() is a no-op when both names already link the same inode
+            temp_path.unlink()
+        return backup_path, method
+    
+    def _reflink(self, source: Path, destination: Path) -> Optional[str]:
+        """Clone source into destination sharing extents; None if unsupported."""
+        if not self._reflink_supported:
+            return None
+        
+        try:
+            with open(source, 'rb') as src, open(destination, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), self.FICLONE, src.fileno())
+            shutil.copystat(source, destination)
+            return 'reflink'
+        except OSError as e:
+            if destination.exists():
+                destination.unlink()
+            # Filesystem-level lack of support will not change between calls
+            if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL):
+                self._reflink_supported = False
+            return None
+    
+    def _hardlink(self, source: Path, destination: Path) -> Optional[str]:
+        """Link destination to the source inode; None across filesystems."""
+        try:
+            os.link(source, destination)
+            return 'hardlink'
+        except OSError:
+            return None
+    
+    def _copy(self, source: Path, destination: Path) -> str:
+        shutil.copy2(source, destination)
+        return 'copy'
+    
+    def _dedup(self, source: Path, destination: Path, checksum: Optional[str]) -> str:
+        """Store source once by content hash and link the backup to the stored object."""
+        if not checksum:
+            digest = hashlib.sha256()
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            checksum = digest.hexdigest()
+        
+        object_path = self.objects_dir / checksum[:2] / checksum
+        if not object_path.exists():
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_object = object_path.with_name(f".{checksum}.tmp")
+            if not self._reflink(source, temp_object):
+                shutil.copy2(source, temp_object)
+            os.replace(temp_object, object_path)
+        
+        # Objects are never modified, so linking to them is always safe
+        if self._hardlink(object_path, destination):
+            return 'dedup'
+        return self._copy(object_path, destination)
+
+
+class ValidationResultSink:
+    """Buffers validation results and persists them in batched transactions.
+    
+    Results are flushed with a single executemany when the buffer reaches
+    batch_size or flush_interval seconds have passed since the last flush.
+    While checkpointing is enabled (id-ordered resumable runs) the highest
+    flushed book_files id is stored in the same transaction, so after a crash
+    validation can resume from the last durable point.
+    
+    When flushes keep failing the buffer is capped at max_buffered rows and
+    the oldest results are dropped. Those files are validated again later,
+    and the checkpoint is held below them until they have been flushed.
+    """
+    
+    CHECKPOINT_NAME = 'format_validation'
+    
+    def __init__(self, connection_factory, batch_size: int = 500, flush_interval: float = 5.0,
+                 max_buffered: int = 5000):
+        self.connection_factory = connection_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max(max_buffered, batch_size)
+        self._buffer: List[Tuple[str, float, str, int]] = []
+        self._dropped_ids: Set[int] = set()
+        self._highest_flushed_id = 0
+        self._last_flush = time.monotonic()
+        self.checkpoint_enabled = False
+    
+    def add(self, file_id: int, result: ValidationResult):
+        """Buffer one result, flushing if a size or time trigger has fired."""
+        self._buffer.append((
+            result.checksum,
+            result.quality_score,
+            datetime.now().isoformat(),
+            file_id
+        ))
+        
+        if (len(self._buffer) >= self.batch_size or 
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+    
+    def flush(self) -> int:
+        """Write all buffered results in one transaction; returns rows written."""
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return 0
+        
+        rows = self._buffer
+        try:
+            with self.connection_factory() as conn:
+                conn.executemany("""
+                    UPDATE book_files 
+                    SET checksum = ?, quality_score = ?, updated_at = ?
+                    WHERE id = ?
+                """, rows)
+                highest_flushed_id = max(self._highest_flushed_id, max(row[3] for row in rows))
+                if self.checkpoint_enabled:
+                    last_file_id = highest_flushed_id
+                    pending_ids = self._dropped_ids.difference(row[3] for row in rows)
+                    if pending_ids:
+                        last_file_id = min(last_file_id, min(pending_ids) - 1)
+                    conn.execute("""
+                        INSERT INTO validation_checkpoints (name, last_file_id, updated_at)
+                        VALUES (?, ?, ?)
+                        ON CONFLICT(name) DO UPDATE SET
+                            last_file_id = MAX(last_file_id, excluded.last_file_id),
+                            updated_at = excluded.updated_at
+                    """, (self.CHECKPOINT_NAME, last_file_id, datetime.now().isoformat()))
+            
+            # Leaving the connection context committed both statements atomically
+            self._buffer = []
+            self._dropped_ids.difference_update(row[3] for row in rows)
+            self._highest_flushed_id = highest_flushed_id
+            logger.debug(f"Flushed {len(rows)} validation results")
+            return len(rows)
+            
+        except Exception as e:
+            # Keep the buffer so the next flush retries these rows, up to max_buffered
+            logger.error(f"Error flushing validation results: {e}")
+            overflow = len(self._buffer) - self.max_buffered
+            if overflow > 0:
+                self._dropped_ids.update(row[3] for row in self._buffer[:overflow])
+                self._buffer = self._buffer[overflow:]
+                logger.warning(f"Dropped {overflow} unflushed validation results; those files will be validated again")
+            return 0
+    
+    def last_flushed_id(self) -> int:
+        """Highest book_files id whose result is durably stored."""
+        try:
+            with self.connection_factory() as conn:
+                row = conn.execute(
+                    "SELECT last_file_id FROM validation_checkpoints WHERE name = ?",
+                    (self.CHECKPOINT_NAME,)
+                ).fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            logger.error(f"Error reading validation checkpoint: {e}")
+            return 0
+    
+    def reset_checkpoint(self):
+        """Start the next resumed pass from the beginning of the table."""
+        try:
+            with self.connection_factory() as conn:
+                conn.execute("DELETE FROM validation_checkpoints WHERE name = ?", (self.CHECKPOINT_NAME,))
+            # The new pass revisits every file, including any that were dropped
+            self._highest_flushed_id = 0
+            self._dropped_ids.clear()
+        except Exception as e:
+            logger.error(f"Error resetting validation checkpoint: {e}")
+
+
 class FormatValidator:
     """Comprehensive book format validator and converter."""
     
@@ -99,13 +351,23 @@ class FormatValidator:
         self.temp_dir = Path(self.config.get('processing', {}).get('temp_dir', './temp'))
         self.backup_originals = self.config.get('processing', {}).get('backup_originals', True)
         self.backup_dir = Path(self.config.get('processing', {}).get('backup_dir', './backups'))
+        self.backup_strategy = self.config.get('processing', {}).get('backup_strategy', 'auto')
         self.max_file_size_mb = self.config.get('processing', {}).get('max_file_size_mb', 500)
+        self.result_batch_size = self.config.get('processing', {}).get('result_batch_size', 500)
+        self.result_flush_interval = self.config.get('processing', {}).get('result_flush_interval_seconds', 5)
+        self.result_buffer_limit = self.config.get('processing', {}).get('result_buffer_limit', 5000)
         
         # Conversion settings
         self.preferred_formats = self.config.get('conversion', {}).get('preferred_formats', ['epub', 'pdf'])
         self.epub_compression_level = self.config.get('conversion', {}).get('epub_compression_level', 9)
         self.pdf_quality = self.config.get('conversion', {}).get('pdf_quality', 85)
         self.enable_ocr = self.config.get('conversion', {}).get('enable_ocr', False)
+        self.max_conversion_workers = self.config.get('conversion', {}).get('max_workers', 2)
+        # Unlimited by default; see _limit_converter_resources
+        self.worker_memory_limit_mb = self.config.get('conversion', {}).get('worker_memory_limit_mb', 0)
+        self.worker_cpu_time_limit = self.config.get('conversion', {}).get('worker_cpu_time_limit_seconds', 600)
+        self.worker_nice = self.config.get('conversion', {}).get('worker_nice', 10)
+        self.conversion_cache_dir = Path(self.config.get('conversion', {}).get('cache_dir', './cache/conversions'))
         
         # Quality thresholds
         self.min_quality_score = self.config.get('quality', {}).get('min_quality_score', 0.7)
@@ -120,6 +382,18 @@ class FormatValidator:
         self.temp_dir.mkdir(exist_ok=True, parents=True)
         if self.backup_originals:
             self.backup_dir.mkdir(exist_ok=True, parents=True)
+            self.backup_store = BackupStore(self.backup_dir, self.backup_strategy)
+        self.conversion_cache_dir.mkdir(exist_ok=True, parents=True)
+        
+        # Converter subprocess pool and tool availability (probed once, then cached)
+        self._converter_slots = asyncio.Semaphore(self.max_conversion_workers)
+        self._tool_availability: Dict[str, bool] = {}
+        
+        # Validation results are buffered and written in batched transactions
+        self.result_sink = ValidationResultSink(
+            self.get_database_connection, self.result_batch_size, self.result_flush_interval,
+            self.result_buffer_limit
+        )
         
         # Statistics
         self.processing_stats = {
@@ -153,13 +427,22 @@ class FormatValidator:
                 'temp_dir': './temp',
                 'backup_originals': True,
                 'backup_dir': './backups',
-                'max_file_size_mb': 500
+                'backup_strategy': 'auto',
+                'max_file_size_mb': 500,
+                'result_batch_size': 500,
+                'result_flush_interval_seconds': 5,
+                'result_buffer_limit': 5000
             },
             'conversion': {
                 'preferred_formats': ['epub', 'pdf'],
                 'epub_compression_level': 9,
                 'pdf_quality': 85,
-                'enable_ocr': False
+                'enable_ocr': False,
+                'max_workers': 2,
+                'worker_memory_limit_mb': 0,
+                'worker_cpu_time_limit_seconds': 600,
+                'worker_nice': 10,
+                'cache_dir': './cache/conversions'
             },
             'quality': {
                 'min_quality_score': 0.7,
@@ -185,13 +468,26 @@ class FormatValidator:
             logger.error(f"Database connection error: {e}")
             raise
     
-    def get_files_needing_validation(self, limit: int = 100) -> List[Dict]:
-        """Get book files that need format validation."""
+    def get_files_needing_validation(self, limit: int = 100, after_id: Optional[int] = None) -> List[Dict]:
+        """Get book files that need format validation.
+        
+        When after_id is given the table is walked in id order starting after
+        that id, which lets an interrupted run resume from its last checkpoint.
+        """
         try:
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 
-                cursor.execute("""
+                params: List[Any] = [self.min_quality_score]
+                resume_clause = ""
+                order_clause = "ORDER BY bf.updated_at ASC"
+                if after_id is not None:
+                    resume_clause = "AND bf.id > ?"
+                    order_clause = "ORDER BY bf.id ASC"
+                    params.append(after_id)
+                params.append(limit)
+                
+                cursor.execute(f"""
                     SELECT bf.id, bf.book_id, bf.format_id, bf.file_path, 
                            bf.file_size_bytes, bf.quality_score, bf.checksum,
                            bf.created_at, bf.updated_at,
@@ -208,9 +504,10 @@ class FormatValidator:
                     )
                     AND bf.file_path IS NOT NULL
                     AND bf.file_path != ''
-                    ORDER BY bf.updated_at ASC
+                    {resume_clause}
+                    {order_clause}
                     LIMIT ?
-                """, (self.min_quality_score, limit))
+                """, params)
                 
                 rows = cursor.fetchall()
                 return [dict(row) for row in rows]
@@ -220,7 +517,13 @@ class FormatValidator:
             return []
     
     async def validate_file(self, file_info: Dict) -> ValidationResult:
-        """Validate a single book file."""
+        """Validate a single book file.
+        
+        file_info may carry results computed while the file was downloaded
+        (known_checksum/known_size, format_mismatch/detected_format); a known
+        checksum is reused when the file size still matches, skipping a full
+        re-read of the file.
+        """
         start_time = time.time()
         file_path = Path(file_info['file_path'])
         
@@ -256,18 +559,29 @@ class FormatValidator:
                 result.status = ValidationStatus.INVALID
                 return result
             
-            # Calculate checksum
-            result.checksum = await self._calculate_checksum(file_path)
+            # Calculate checksum, reusing the download-time hash if the file is unchanged
+            if file_info.get('known_checksum') and file_info.get('known_size') == result.file_size:
+                result.checksum = file_info['known_checksum']
+            else:
+                result.checksum = await self._calculate_checksum(file_path)
             
             # Detect MIME type
             result.mime_type = mimetypes.guess_type(str(file_path))[0] or "application/octet-stream"
             
             # Format-specific validation
-            if result.format == BookFormat.EPUB:
+            if file_info.get('format_mismatch'):
+                validation_result = {
+                    'status': ValidationStatus.INVALID,
+                    'metadata': {'detected_format': file_info.get('detected_format')},
+                    'issues': [f"Content does not match declared format "
+                               f"(detected {file_info.get('detected_format')})"],
+                    'quality_score': 0.0
+                }
+            elif result.format == BookFormat.EPUB:
                 validation_result = await self._validate_epub(file_path)
             elif result.format == BookFormat.PDF:
                 validation_result = await self._validate_pdf(file_path)
-            elif result.format == BookFormat.MOBI:
+            elif result.format in (BookFormat.MOBI, BookFormat.AZW3):
                 validation_result = await self._validate_mobi(file_path)
             elif result.format == BookFormat.TXT:
                 validation_result = await self._validate_txt(file_path)
@@ -298,11 +612,15 @@ class FormatValidator:
         return result
     
     async def _calculate_checksum(self, file_path: Path) -> str:
-        """Calculate SHA-256 checksum of file."""
+        """Calculate SHA-256 checksum of file on a worker thread, off the event loop."""
+        return await asyncio.to_thread(self._hash_file, file_path)
+    
+    @staticmethod
+    def _hash_file(file_path: Path) -> str:
         hash_sha256 = hashlib.sha256()
         
         with open(file_path, 'rb') as f:
-            for chunk in iter(lambda: f.read(4096), b""):
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
                 hash_sha256.update(chunk)
         
         return hash_sha256.hexdigest()
@@ -590,7 +908,7 @@ class FormatValidator:
         return result
     
     async def _validate_mobi(self, file_path: Path) -> Dict:
-        """Validate MOBI file format."""
+        """Validate MOBI/AZW3 file format by walking the PalmDB, MOBI and EXTH headers."""
         result = {
             'status': ValidationStatus.VALID,
             'metadata': {},
@@ -599,40 +917,53 @@ class FormatValidator:
         }
         
         try:
-            with open(file_path, 'rb') as f:
-                # Check MOBI header
-                header = f.read(68)
-                
-                # MOBI files start with PalmDOC header
-                if len(header) < 68:
-                    result['status'] = ValidationStatus.CORRUPTED
-                    result['issues'].append("File too short to be valid MOBI")
-                    return result
-                
-                # Check for MOBI signature
-                f.seek(60)
-                mobi_header = f.read(4)
-                if mobi_header == b'MOBI':
-                    result['metadata']['format'] = 'MOBI'
-                    result['quality_score'] += 0.2
-                elif mobi_header == b'BOOK':
-                    result['metadata']['format'] = 'PalmDOC'
-                    result['quality_score'] += 0.1
-                else:
-                    result['status'] = ValidationStatus.INVALID
-                    result['issues'].append("Invalid MOBI header signature")
-                    return result
-                
-                # Try to extract basic metadata
-                f.seek(0)
-                palm_header = f.read(78)
-                
-                # Database name (first 32 bytes)
-                db_name = palm_header[:32].rstrip(b'\x00').decode('ascii', errors='ignore')
-                if db_name:
-                    result['metadata']['title'] = db_name
-                    result['quality_score'] += 0.1
-                
+            file_size = file_path.stat().st_size
+            if file_size < PALMDB_HEADER_SIZE:
+                result['status'] = ValidationStatus.CORRUPTED
+                result['issues'].append("File too short to be valid MOBI")
+                result['quality_score'] = 0.0
+                return result
+            
+            # Map the file so header parsing works on memoryview slices without copying
+            with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    parsed = self._parse_mobi_headers(view, file_size)
+                finally:
+                    view.release()
+            
+            result['metadata'].update(parsed['metadata'])
+            result['issues'].extend(parsed['issues'])
+            
+            if parsed['fatal']:
+                result['status'] = ValidationStatus.CORRUPTED
+                result['quality_score'] = 0.0
+                return result
+            
+            container = result['metadata'].get('format')
+            if container in ('MOBI', 'KF8'):
+                result['quality_score'] += 0.2
+            elif container == 'PalmDOC':
+                result['quality_score'] += 0.1
+            else:
+                result['status'] = ValidationStatus.INVALID
+                result['issues'].append("Invalid MOBI header signature")
+                return result
+            
+            if result['metadata'].get('title'):
+                result['quality_score'] += 0.1
+            if result['metadata'].get('authors'):
+                result['quality_score'] += 0.1
+            if result['metadata'].get('isbn') or result['metadata'].get('asin'):
+                result['quality_score'] += 0.05
+            
+            # Structural problems (bad record offsets, missing records) mean a damaged file
+            result['quality_score'] -= 0.2 * len(parsed['issues'])
+            result['quality_score'] = max(0.0, min(1.0, result['quality_score']))
+            
+            if parsed['truncated'] or (parsed['issues'] and result['quality_score'] < 0.3):
+                result['status'] = ValidationStatus.CORRUPTED
+            
         except Exception as e:
             result['status'] = ValidationStatus.INVALID  
             result['issues'].append(f"MOBI validation error: {str(e)}")
@@ -640,6 +971,147 @@ class FormatValidator:
         
         return result
     
+    def _parse_mobi_headers(self, view: memoryview, file_size: int) -> Dict:
+        """Parse PalmDB record table, PalmDOC/MOBI header and EXTH block from a mapped file.
+        
+        All reads go through struct.unpack_from or memoryview slices so nothing beyond
+        the decoded metadata strings is copied out of the mapping.
+        """
+        parsed = {'metadata': {}, 'issues': [], 'fatal': False, 'truncated': False}
+        metadata = parsed['metadata']
+        
+        # PalmDB header: 32-byte name, type/creator at 60, record count at 76
+        db_name = bytes(view[:32]).split(b'\x00', 1)[0].decode('latin-1', errors='ignore')
+        db_type, db_creator = struct.unpack_from('>4s4s', view, 60)
+        (num_records,) = struct.unpack_from('>H', view, 76)
+        
+        if (db_type, db_creator) == (b'BOOK', b'MOBI'):
+            metadata['format'] = 'MOBI'
+        elif (db_type, db_creator) == (b'TEXt', b'REAd'):
+            metadata['format'] = 'PalmDOC'
+        else:
+            return parsed
+        
+        if db_name:
+            metadata['title'] = db_name
+        
+        metadata['record_count'] = num_records
+        if num_records == 0:
+            parsed['issues'].append("PalmDB record table is empty")
+            parsed['fatal'] = True
+            return parsed
+        
+        table_end = PALMDB_HEADER_SIZE + num_records * 8
+        if table_end > file_size:
+            parsed['issues'].append(f"Record table ({num_records} entries) extends past end of file")
+            parsed['fatal'] = True
+            return parsed
+        
+        # Validate the record offset table against file size
+        offsets = [
+            struct.unpack_from('>I', view, PALMDB_HEADER_SIZE + i * 8)[0]
+            for i in range(num_records)
+        ]
+        previous = table_end
+        for index, offset in enumerate(offsets):
+            if offset >= file_size:
+                parsed['issues'].append(f"Record {index} offset {offset} beyond file size {file_size} (truncated file)")
+                parsed['truncated'] = True
+                break
+            if offset < previous:
+                parsed['issues'].append(f"Record {index} offset {offset} is out of order")
+                break
+            previous = offset
+        
+        record0_start = offsets[0]
+        record0_end = offsets[1] if num_records > 1 else file_size
+        if record0_start + PALMDOC_HEADER_SIZE > min(record0_end, file_size):
+            parsed['issues'].append("Record 0 too short for PalmDOC header")
+            parsed['fatal'] = True
+            return parsed
+        record0 = view[record0_start:min(record0_end, file_size)]
+        
+        compression, text_length, text_record_count, _, encryption = struct.unpack_from('>H2xIHHH', record0, 0)
+        metadata['compression'] = MOBI_COMPRESSION_TYPES.get(compression, f"unknown ({compression})")
+        metadata['text_length'] = text_length
+        metadata['encrypted'] = encryption != 0
+        
+        if text_record_count + 1 > num_records:
+            parsed['issues'].append(f"Header declares {text_record_count} text records but file has {num_records - 1}")
+        
+        if metadata['format'] == 'PalmDOC' or len(record0) < PALMDOC_HEADER_SIZE + 8:
+            return parsed
+        
+        # MOBI header immediately follows the 16-byte PalmDOC header
+        mobi = record0[PALMDOC_HEADER_SIZE:]
+        if bytes(mobi[:4]) != b'MOBI':
+            parsed['issues'].append("Record 0 lacks MOBI header identifier")
+            return parsed
+        
+        (mobi_header_length,) = struct.unpack_from('>I', mobi, 4)
+        if mobi_header_length < 0x80 or mobi_header_length > len(mobi):
+            parsed['issues'].append(f"MOBI header length {mobi_header_length} is invalid")
+            return parsed
+        
+        text_encoding, file_version = struct.unpack_from('>I4xI', mobi, 12)
+        codec = 'utf-8' if text_encoding == 65001 else 'cp1252'
+        metadata['text_encoding'] = codec
+        metadata['mobi_version'] = file_version
+        if file_version >= 8:
+            metadata['format'] = 'KF8'
+        
+        # Full name offset/length sit at 0x54 of record 0, i.e. 0x44 into the MOBI header
+        full_name_offset, full_name_length = struct.unpack_from('>II', record0, 0x54)
+        if full_name_length and full_name_offset + full_name_length <= len(record0):
+            full_name = bytes(record0[full_name_offset:full_name_offset + full_name_length])
+            metadata['title'] = full_name.decode(codec, errors='replace')
+        
+        (exth_flags,) = struct.unpack_from('>I', mobi, 0x70)
+        if exth_flags & 0x40:
+            self._parse_exth(mobi[mobi_header_length:], codec, parsed)
+        
+        return parsed
+    
+    def _parse_exth(self, exth: memoryview, codec: str, parsed: Dict):
+        """Extract author, ISBN, ASIN and related records from an EXTH block."""
+        metadata = parsed['metadata']
+        
+        if len(exth) < 12 or bytes(exth[:4]) != b'EXTH':
+            parsed['issues'].append("EXTH flag set but EXTH header missing")
+            return
+        
+        exth_length, record_count = struct.unpack_from('>II', exth, 4)
+        if exth_length > len(exth):
+            parsed['issues'].append("EXTH header extends past record 0")
+            return
+        
+        position = 12
+        for _ in range(record_count):
+            if position + 8 > exth_length:
+                parsed['issues'].append("EXTH record table truncated")
+                break
+            record_type, record_length = struct.unpack_from('>II', exth, position)
+            if record_length < 8 or position + record_length > exth_length:
+                parsed['issues'].append(f"EXTH record {record_type} has invalid length {record_length}")
+                break
+            
+            field = EXTH_RECORD_TYPES.get(record_type)
+            if field == 'kf8_boundary':
+                metadata['has_kf8'] = True
+            elif field:
+                value = bytes(exth[position + 8:position + record_length]).decode(codec, errors='replace').strip()
+                if value:
+                    if field == 'authors':
+                        metadata.setdefault('authors', []).append(value)
+                    elif field == 'isbn':
+                        metadata.setdefault('isbn', value.replace('-', '').replace(' ', ''))
+                    elif field == 'title':
+                        metadata['title'] = value
+                    else:
+                        metadata.setdefault(field, value)
+            
+            position += record_length
+    
     async def _validate_txt(self, file_path: Path) -> Dict:
         """Validate plain text file."""
         result = {
@@ -699,8 +1171,15 @@ class FormatValidator:
         
         return result
     
-    async def _validate_fb2(self, file_path: Path) -> Dict:
-        """Validate FB2 (FictionBook) file format."""
+    async def _validate_fb2(self, file_path: Path, metadata_only: bool = False) -> Dict:
+        """Validate FB2 (FictionBook) file format.
+        
+        The document is parsed incrementally: metadata comes from <description>,
+        the body is only streamed when metadata_only is False, and parsing stops
+        before the base64 <binary> sections so memory stays bounded regardless
+        of file size. Plain, gzip-compressed and zip-wrapped (FB2.zip) files are
+        handled transparently.
+        """
         result = {
             'status': ValidationStatus.VALID,
             'metadata': {},
@@ -709,94 +1188,58 @@ class FormatValidator:
         }
         
         try:
-            # FB2 files are XML
-            with open(file_path, 'rb') as f:
-                # Check if it might be compressed
-                header = f.read(10)
-                if header.startswith(b'\x1f\x8b'):  # gzip header
-                    result['issues'].append("FB2 file appears to be compressed (FB2.zip)")
-                    result['status'] = ValidationStatus.NEEDS_CONVERSION
-                    return result
-            
-            # Parse as XML
-            try:
-                tree = ET.parse(file_path)
-                root = tree.getroot()
+            with self._open_fb2_stream(file_path) as (stream, compression):
+                if compression:
+                    result['metadata']['compression'] = compression
                 
-                # Check root element
-                if not root.tag.endswith('FictionBook'):
+                if stream is None:
                     result['status'] = ValidationStatus.INVALID
-                    result['issues'].append("Root element is not FictionBook")
+                    result['issues'].append("Archive does not contain an FB2 document")
+                    result['quality_score'] = 0.0
                     return result
                 
-                result['quality_score'] += 0.2
-                
-                # Look for description section
-                description = root.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}description')
-                if description is not None:
+                parsed = self._stream_fb2(stream, metadata_only)
+            
+            if not parsed['is_fictionbook']:
+                result['status'] = ValidationStatus.INVALID
+                result['issues'].append("Root element is not FictionBook")
+                return result
+            
+            result['quality_score'] += 0.2
+            result['metadata'].update(parsed['metadata'])
+            
+            if parsed['has_description']:
+                result['quality_score'] += 0.1
+                if 'title' in parsed['metadata']:
                     result['quality_score'] += 0.1
-                    
-                    # Extract metadata
-                    title_info = description.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}title-info')
-                    if title_info is not None:
-                        # Book title
-                        book_title = title_info.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}book-title')
-                        if book_title is not None and book_title.text:
-                            result['metadata']['title'] = book_title.text
-                            result['quality_score'] += 0.1
-                        
-                        # Authors
-                        authors = title_info.findall('.//{http://www.gribuser.ru/xml/fictionbook/2.0}author')
-                        if authors:
-                            author_names = []
-                            for author in authors:
-                                first_name = author.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}first-name')
-                                last_name = author.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}last-name')
-                                
-                                name_parts = []
-                                if first_name is not None and first_name.text:
-                                    name_parts.append(first_name.text)
-                                if last_name is not None and last_name.text:
-                                    name_parts.append(last_name.text)
-                                
-                                if name_parts:
-                                    author_names.append(' '.join(name_parts))
-                            
-                            if author_names:
-                                result['metadata']['authors'] = author_names
-                                result['quality_score'] += 0.1
-                        
-                        # Genre
-                        genres = title_info.findall('.//{http://www.gribuser.ru/xml/fictionbook/2.0}genre')
-                        if genres:
-                            result['metadata']['genres'] = [g.text for g in genres if g.text]
-                            result['quality_score'] += 0.05
-                        
-                        # Annotation
-                        annotation = title_info.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}annotation')
-                        if annotation is not None:
-                            result['quality_score'] += 0.05
-                
-                # Look for body section
-                body = root.find('.//{http://www.gribuser.ru/xml/fictionbook/2.0}body')
-                if body is not None:
+                if 'authors' in parsed['metadata']:
+                    result['quality_score'] += 0.1
+                if 'genres' in parsed['metadata']:
+                    result['quality_score'] += 0.05
+                if parsed['has_annotation']:
+                    result['quality_score'] += 0.05
+            
+            if not metadata_only:
+                if parsed['has_body']:
                     result['quality_score'] += 0.2
+                    result['metadata']['section_count'] = parsed['section_count']
                     
-                    # Count sections
-                    sections = body.findall('.//{http://www.gribuser.ru/xml/fictionbook/2.0}section')
-                    result['metadata']['section_count'] = len(sections)
-                    
-                    if len(sections) > 0:
+                    if parsed['section_count'] > 0:
                         result['quality_score'] += 0.1
                 else:
                     result['issues'].append("No body section found")
                     result['quality_score'] -= 0.2
-                
-            except ET.ParseError as e:
-                result['status'] = ValidationStatus.CORRUPTED
-                result['issues'].append(f"Invalid XML structure: {str(e)}")
-                result['quality_score'] = 0.0
-                
+            
+            result['quality_score'] = max(0.0, min(1.0, result['quality_score']))
+            
+        except ET.ParseError as e:
+            result['status'] = ValidationStatus.CORRUPTED
+            result['issues'].append(f"Invalid XML structure: {str(e)}")
+            result['quality_score'] = 0.0
+        except (zipfile.BadZipFile, gzip.BadGzipFile, EOFError, zlib.error) as e:
+            result['status'] = ValidationStatus.CORRUPTED
+            result['issues'].append(f"Corrupted FB2 archive: {str(e)}")
+            result['quality_score'] = 0.0
         except Exception as e:
             result['status'] = ValidationStatus.INVALID
             result['issues'].append(f"FB2 validation error: {str(e)}")
@@ -804,6 +1247,118 @@ class FormatValidator:
         
         return result
     
+    @contextmanager
+    def _open_fb2_stream(self, file_path: Path):
+        """Open an FB2 document as a binary stream, unwrapping gzip or zip containers.
+        
+        Yields (stream, compression) where compression is None, 'gzip' or 'zip'.
+        stream is None when a zip archive holds no .fb2 member.
+        """
+        with open(file_path, 'rb') as f:
+            header = f.read(4)
+        
+        if header.startswith(b'\x1f\x8b'):
+            with gzip.open(file_path, 'rb') as stream:
+                yield stream, 'gzip'
+        elif header.startswith(b'PK\x03\x04'):
+            with zipfile.ZipFile(file_path, 'r') as archive:
+                members = [name for name in archive.namelist() if name.lower().endswith('.fb2')]
+                if not members:
+                    yield None, 'zip'
+                    return
+                with archive.open(members[0], 'r') as stream:
+                    yield stream, 'zip'
+        else:
+            with open(file_path, 'rb') as stream:
+                yield stream, None
+    
+    def _stream_fb2(self, stream, metadata_only: bool) -> Dict:
+        """Walk FB2 parse events, collecting metadata and body structure.
+        
+        Elements are cleared as soon as they have been inspected so only the
+        current path through the tree is held in memory.
+        """
+        parsed = {
+            'is_fictionbook': False,
+            'has_description': False,
+            'has_annotation': False,
+            'has_body': False,
+            'section_count': 0,
+            'metadata': {}
+        }
+        metadata = parsed['metadata']
+        authors = []
+        genres = []
+        
+        path: List[str] = []
+        root = None
+        body = None
+        
+        for event, elem in ET.iterparse(stream, events=('start', 'end')):
+            tag = elem.tag.rsplit('}', 1)[-1]
+            
+            if event == 'start':
+                if root is None:
+                    root = elem
+                    if tag != 'FictionBook':
+                        return parsed
+                    parsed['is_fictionbook'] = True
+                elif len(path) == 1:
+                    # Binary attachments follow the body; everything we need has been seen
+                    if tag == 'binary':
+                        break
+                    if tag == 'body':
+                        if metadata_only:
+                            break
+                        parsed['has_body'] = True
+                        body = elem
+                elif tag == 'section' and body is not None:
+                    parsed['section_count'] += 1
+                
+                path.append(tag)
+                continue
+            
+            path.pop()
+            
+            if 'title-info' in path:
+                if tag == 'book-title' and elem.text:
+                    metadata['title'] = elem.text.strip()
+                elif tag == 'author' and path[-1] == 'title-info':
+                    name_parts = []
+                    for child in elem:
+                        child_tag = child.tag.rsplit('}', 1)[-1]
+                        if child_tag in ('first-name', 'last-name') and child.text:
+                            name_parts.append(child.text.strip())
+                    if name_parts:
+                        authors.append(' '.join(name_parts))
+                elif tag == 'genre' and elem.text:
+                    genres.append(elem.text.strip())
+                elif tag == 'annotation':
+                    parsed['has_annotation'] = True
+                elif tag == 'lang' and elem.text:
+                    metadata['language'] = elem.text.strip()
+            
+            if tag == 'description' and len(path) == 1:
+                parsed['has_description'] = True
+                if authors:
+                    metadata['authors'] = authors
+                if genres:
+                    metadata['genres'] = genres
+                root.clear()
+                if metadata_only:
+                    break
+            elif body is not None and len(path) >= 2:
+                elem.clear()
+                if len(path) == 2:
+                    # Direct child of <body> finished; drop the emptied shells as well
+                    body.clear()
+            elif len(path) == 1:
+                root.clear()
+                if elem is body:
+                    body = None
+        
+        return parsed
+    
     async def _validate_generic(self, file_path: Path) -> Dict:
         """Generic validation for unsupported formats."""
         result = {
@@ -842,25 +1397,13 @@ class FormatValidator:
         return result
     
     async def _update_file_validation_results(self, file_id: int, result: ValidationResult):
-        """Update database with validation results."""
+        """Queue validation results for the next batched database write."""
+        # Ad-hoc validations (single-file mode, converted outputs) have no book_files row
+        if not file_id:
+            return
+        
         try:
-            with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute("""
-                    UPDATE book_files 
-                    SET checksum = ?, quality_score = ?, updated_at = ?
-                    WHERE id = ?
-                """, (
-                    result.checksum,
-                    result.quality_score,
-                    datetime.now().isoformat(),
-                    file_id
-                ))
-                
-                conn.commit()
-                logger.debug(f"Updated validation results for file ID {file_id}")
-                
+            self.result_sink.add(file_id, result)
         except Exception as e:
             logger.error(f"Error updating validation results: {e}")
     
@@ -900,11 +1443,27 @@ class FormatValidator:
                 result.quality_score = 1.0
                 return result
             
+            # Identical conversions are served from the content-addressed cache
+            source_checksum = await self._calculate_checksum(source_path)
+            cache_key = self._conversion_cache_key(source_checksum, target_format, options or {})
+            cached = self._lookup_cached_conversion(cache_key, target_format)
+            if cached:
+                cache_path, cache_info = cached
+                await asyncio.to_thread(self._materialize_file, cache_path, target_path)
+                result.status = ConversionStatus.SUCCESS
+                result.file_size_after = target_path.stat().st_size
+                result.quality_score = cache_info.get('quality_score', 0.0)
+                result.conversion_time_seconds = time.time() - start_time
+                logger.info(f"Served conversion of {source_path} from cache ({cache_key[:12]})")
+                return result
+            
             # Backup original if enabled
+            # (conversion writes a new file, so the original is never modified in place)
             if self.backup_originals:
-                backup_path = self.backup_dir / f"{source_path.name}.backup"
-                shutil.copy2(source_path, backup_path)
-                logger.info(f"Backed up original file to {backup_path}")
+                backup_path, method = await asyncio.to_thread(
+                    self.backup_store.backup, source_path, modifies_in_place=False, checksum=source_checksum
+                )
+                logger.info(f"Backed up original file to {backup_path} ({method})")
             
             # Perform conversion based on source and target formats
             conversion_success = False
@@ -944,6 +1503,10 @@ class FormatValidator:
                 if validation_result.status == ValidationStatus.CORRUPTED:
                     result.errors.append("Converted file failed validation")
                     result.quality_score = 0.0
+                else:
+                    await asyncio.to_thread(
+                        self._store_cached_conversion, cache_key, target_path, target_format, result.quality_score
+                    )
                 
                 logger.info(f"Successfully converted {source_path} to {target_path}")
             else:
@@ -963,6 +1526,10 @@ class FormatValidator:
         """Detect book format from file extension."""
         suffix = file_path.suffix.lower().lstrip('.')
         
+        # FB2.zip / FB2.gz wrappers are validated as FB2
+        if suffix in ('zip', 'gz') and file_path.stem.lower().endswith('.fb2'):
+            return BookFormat.FB2
+        
         format_mapping = {
             'epub': BookFormat.EPUB,
             'pdf': BookFormat.PDF,
@@ -979,23 +1546,140 @@ class FormatValidator:
         
         return format_mapping.get(suffix, BookFormat.TXT)
     
+    def _is_tool_available(self, tool_path: str) -> bool:
+        """Check whether a converter binary runs, caching the answer per process."""
+        if tool_path not in self._tool_availability:
+            try:
+                subprocess.run([tool_path, '--version'], 
+                             capture_output=True, timeout=5)
+                available = True
+            except (FileNotFoundError, PermissionError, subprocess.TimeoutExpired):
+                available = False
+            self._tool_availability[tool_path] = available
+            logger.info(f"Conversion tool {tool_path}: {'available' if available else 'not available'}")
+        
+        return self._tool_availability[tool_path]
+    
+    def probe_conversion_tools(self) -> Dict[str, bool]:
+        """(Re)probe all converter binaries; called once when a scheduler starts."""
+        self._tool_availability.clear()
+        return {
+            'calibre': self._is_calibre_available(),
+            'pandoc': self._is_pandoc_available()
+        }
+    
     def _is_calibre_available(self) -> bool:
         """Check if Calibre is available."""
-        try:
-            subprocess.run([self.calibre_path, '--version'], 
-                         capture_output=True, timeout=5)
-            return True
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            return False
+        return self._is_tool_available(self.calibre_path)
     
     def _is_pandoc_available(self) -> bool:
         """Check if Pandoc is available."""
+        return self._is_tool_available(self.pandoc_path)
+    
+    def _limit_converter_resources(self):
+        """Apply CPU/memory limits inside a converter child process before exec.
+        
+        Memory is capped with RLIMIT_DATA rather than RLIMIT_AS: Calibre's
+        Qt/WebEngine reserves far more address space than it ever touches,
+        so an address space limit kills it at startup. A limit of 0 leaves
+        memory unlimited.
+        """
+        if self.worker_memory_limit_mb:
+            memory_bytes = int(self.worker_memory_limit_mb) * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_DATA, (memory_bytes, memory_bytes))
+        cpu_seconds = int(self.worker_cpu_time_limit)
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 5))
+        if self.worker_nice:
+            os.nice(int(self.worker_nice))
+    
+    async def _run_converter(self, cmd: List[str], timeout: int) -> Tuple[int, bytes]:
+        """Run a converter subprocess in one of the bounded, resource-limited worker slots."""
+        async with self._converter_slots:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                preexec_fn=self._limit_converter_resources
+            )
+            
+            try:
+                stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                process.kill()
+                await process.wait()
+                raise
+            
+            return process.returncode, stderr
+    
+    def _conversion_cache_key(self, source_checksum: str, target_format: BookFormat, options: Dict) -> str:
+        """Build the content address for a (source, target format, options) conversion."""
+        key_material = json.dumps({
+            'source': source_checksum,
+            'target': target_format.value,
+            'options': options
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key_material.encode('utf-8')).hexdigest()
+    
+    def _conversion_cache_path(self, cache_key: str, target_format: BookFormat) -> Path:
+        """Location of a cached conversion output, sharded by key prefix."""
+        return self.conversion_cache_dir / cache_key[:2] / f"{cache_key}.{target_format.value}"
+    
+    def _lookup_cached_conversion(self, cache_key: str, target_format: BookFormat) -> Optional[Tuple[Path, Dict]]:
+        """Return the cached output and its recorded info, if present."""
+        cache_path = self._conversion_cache_path(cache_key, target_format)
+        info_path = cache_path.with_suffix(cache_path.suffix + '.json')
+        
+        if not cache_path.exists() or not info_path.exists():
+            return None
+        
         try:
-            subprocess.run([self.pandoc_path, '--version'], 
-                         capture_output=True, timeout=5)
-            return True
-        except (FileNotFoundError, subprocess.TimeoutExpired):
-            return False
+            with open(info_path, 'r') as f:
+                return cache_path, json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable conversion cache entry {info_path}: {e}")
+            return None
+    
+    def _store_cached_conversion(self, cache_key: str, output_path: Path, 
+                                 target_format: BookFormat, quality_score: float):
+        """Add a successful conversion output to the cache."""
+        cache_path = self._conversion_cache_path(cache_key, target_format)
+        
+        try:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self._materialize_file(output_path, cache_path)
+            
+            # The info file is written last so a partial entry is never treated as a hit
+            info_path = cache_path.with_suffix(cache_path.suffix + '.json')
+            temp_info = info_path.with_suffix('.tmp')
+            with open(temp_info, 'w') as f:
+                json.dump({
+                    'quality_score': quality_score,
+                    'file_size': cache_path.stat().st_size,
+                    'created_at': datetime.now().isoformat()
+                }, f)
+            os.replace(temp_info, info_path)
+            
+        except OSError as e:
+            logger.warning(f"Could not cache conversion output {output_path}: {e}")
+    
+    def _materialize_file(self, source: Path, destination: Path):
+        """Place an independent copy of source at destination, cloning extents where supported.
+        
+        Cache entries and user outputs must never share an inode, or editing
+        an output in place would corrupt the cache, so files are never hardlinked.
+        """
+        temp_destination = destination.with_name(f".{destination.name}.tmp")
+        if temp_destination.exists():
+            temp_destination.unlink()
+        
+        try:
+            with open(source, 'rb') as src, open(temp_destination, 'wb') as dst:
+                fcntl.ioctl(dst.fileno(), BackupStore.FICLONE, src.fileno())
+            shutil.copystat(source, temp_destination)
+        except OSError:
+            shutil.copy2(source, temp_destination)
+        
+        os.replace(temp_destination, destination)
     
     async def _convert_with_calibre(self, source_path: Path, target_path: Path, 
                                    target_format: BookFormat, options: Dict) -> bool:
@@ -1015,15 +1699,9 @@ class FormatValidator:
                     cmd.extend(['--pdf-default-image-quality', str(options['pdf_quality'])])
             
             # Run conversion
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=300)
+            returncode, stderr = await self._run_converter(cmd, timeout=300)
             
-            if process.returncode == 0:
+            if returncode == 0:
                 return True
             else:
                 logger.error(f"Calibre conversion failed: {stderr.decode()}")
@@ -1052,15 +1730,9 @@ class FormatValidator:
                 cmd.extend(['--standalone'])
             
             # Run conversion
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=180)
+            returncode, stderr = await self._run_converter(cmd, timeout=180)
             
-            if process.returncode == 0:
+            if returncode == 0:
                 return True
             else:
                 logger.error(f"Pandoc conversion failed: {stderr.decode()}")
@@ -1073,33 +1745,45 @@ class FormatValidator:
             logger.error(f"Pandoc conversion error: {e}")
             return False
     
-    async def process_batch(self, limit: int = 50) -> Dict:
-        """Process a batch of files needing validation."""
+    async def process_batch(self, limit: int = 50, resume: bool = False) -> Dict:
+        """Process a batch of files needing validation.
+        
+        With resume=True the batch continues after the last file id whose
+        results were durably flushed, so a crashed run does not start over.
+        """
         logger.info(f"Starting batch validation (limit: {limit})")
         
-        files_to_process = self.get_files_needing_validation(limit)
+        self.result_sink.checkpoint_enabled = resume
+        after_id = self.result_sink.last_flushed_id() if resume else None
+        files_to_process = self.get_files_needing_validation(limit, after_id=after_id)
         if not files_to_process:
+            if resume and after_id:
+                # Reached the end of the table; the next resumed run starts a new pass
+                self.result_sink.reset_checkpoint()
             logger.info("No files need validation")
             return {'processed': 0, 'valid': 0, 'invalid': 0}
         
         logger.info(f"Processing {len(files_to_process)} files")
         
         results = []
-        for file_info in files_to_process:
-            try:
-                result = await self.validate_file(file_info)
-                results.append(result)
-                
-                # Update statistics
-                self.processing_stats['files_processed'] += 1
-                if result.status == ValidationStatus.VALID:
-                    self.processing_stats['valid_files'] += 1
-                else:
+        try:
+            for file_info in files_to_process:
+                try:
+                    result = await self.validate_file(file_info)
+                    results.append(result)
+                    
+                    # Update statistics
+                    self.processing_stats['files_processed'] += 1
+                    if result.status == ValidationStatus.VALID:
+                        self.processing_stats['valid_files'] += 1
+                    else:
+                        self.processing_stats['invalid_files'] += 1
+                    
+                except Exception as e:
+                    logger.error(f"Error processing file {file_info['file_path']}: {e}")
                     self.processing_stats['invalid_files'] += 1
-                
-            except Exception as e:
-                logger.error(f"Error processing file {file_info['file_path']}: {e}")
-                self.processing_stats['invalid_files'] += 1
+        finally:
+            self.result_sink.flush()
         
         # Calculate averages
         valid_results = [r for r in results if r.status == ValidationStatus.VALID]
@@ -1117,6 +1801,95 @@ class FormatValidator:
         logger.info(f"Batch validation completed: {summary}")
         return summary
     
+    def _claim_validation_jobs(self, limit: int) -> List[Dict]:
+        """Atomically claim pending download validation jobs with their file details."""
+        with self.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE validation_jobs
+                SET status = 'running', started_at = ?
+                WHERE id IN (
+                    SELECT id FROM validation_jobs 
+                    WHERE status = 'pending' 
+                    ORDER BY created_at ASC, id ASC 
+                    LIMIT ?
+                )
+                AND status = 'pending'
+                RETURNING id
+            """, (datetime.now().isoformat(), limit))
+            job_ids = [row['id'] for row in cursor.fetchall()]
+            conn.commit()
+            
+            if not job_ids:
+                return []
+            
+            placeholders = ','.join('?' * len(job_ids))
+            cursor.execute(f"""
+                SELECT vj.id as job_id, vj.checksum as known_checksum, 
+                       vj.file_size_bytes as known_size, vj.detected_format, vj.format_mismatch,
+                       bf.id, bf.book_id, bf.format_id, bf.file_path, bf.file_size_bytes,
+                       bfmt.name as format_name
+                FROM validation_jobs vj
+                JOIN book_files bf ON vj.book_file_id = bf.id
+                JOIN book_formats bfmt ON bf.format_id = bfmt.id
+                WHERE vj.id IN ({placeholders})
+                ORDER BY vj.id
+            """, job_ids)
+            return [dict(row) for row in cursor.fetchall()]
+    
+    async def process_validation_jobs(self, limit: int = 50) -> Dict:
+        """Validate freshly downloaded files queued by the download manager.
+        
+        These jobs already carry the file's SHA-256 and sniffed format, so
+        only the format-specific structural checks touch the file.
+        """
+        jobs = self._claim_validation_jobs(limit)
+        if not jobs:
+            logger.info("No validation jobs pending")
+            return {'processed': 0, 'valid': 0, 'invalid': 0}
+        
+        outcomes = []
+        results = []
+        try:
+            for job in jobs:
+                try:
+                    result = await self.validate_file(job)
+                    results.append(result)
+                    outcomes.append(('completed', '; '.join(result.issues) or None, job['job_id']))
+                    
+                    self.processing_stats['files_processed'] += 1
+                    if result.status == ValidationStatus.VALID:
+                        self.processing_stats['valid_files'] += 1
+                    else:
+                        self.processing_stats['invalid_files'] += 1
+                except Exception as e:
+                    logger.error(f"Error processing validation job {job['job_id']}: {e}")
+                    outcomes.append(('failed', str(e), job['job_id']))
+                    self.processing_stats['invalid_files'] += 1
+        finally:
+            self.result_sink.flush()
+            
+            # Jobs claimed but never reached go back to the queue
+            finished = {outcome[2] for outcome in outcomes}
+            with self.get_database_connection() as conn:
+                now = datetime.now().isoformat()
+                conn.executemany("""
+                    UPDATE validation_jobs SET status = ?, error_message = ?, completed_at = ?
+                    WHERE id = ?
+                """, [(status, message, now, job_id) for status, message, job_id in outcomes])
+                conn.executemany("""
+                    UPDATE validation_jobs SET status = 'pending', started_at = NULL WHERE id = ?
+                """, [(job['job_id'],) for job in jobs if job['job_id'] not in finished])
+                conn.commit()
+        
+        summary = {
+            'processed': len(results),
+            'valid': sum(1 for r in results if r.status == ValidationStatus.VALID),
+            'invalid': sum(1 for r in results if r.status != ValidationStatus.VALID)
+        }
+        logger.info(f"Validation job run completed: {summary}")
+        return summary
+    
     def generate_validation_report(self) -> Dict:
         """Generate comprehensive validation report."""
         try:
@@ -1176,15 +1949,255 @@ class FormatValidator:
             return {'error': str(e), 'timestamp': datetime.now().isoformat()}
 
 
+class ConversionScheduler:
+    """Persistent conversion job queue executed by a bounded pool of converter workers.
+    
+    Jobs live in the conversion_jobs table so queued work survives restarts.
+    Each worker hands jobs to FormatValidator.convert_file, which runs the
+    actual Calibre/Pandoc process inside the validator's resource-limited
+    slots and serves repeat conversions from the content-addressed cache.
+    
+    A claimed job is leased to this run and the lease is renewed while the
+    conversion runs, so overlapping runs (say from cron) only take over
+    jobs whose owner has stopped renewing, as with download_queue leases.
+    """
+    
+    def __init__(self, validator: FormatValidator, max_workers: Optional[int] = None):
+        self.validator = validator
+        self.max_workers = max_workers or validator.max_conversion_workers
+        
+        conversion_config = validator.config.get('conversion', {})
+        self.instance_id = conversion_config.get('instance_id') or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = conversion_config.get('lease_seconds', 120)
+        self.lease_renew_interval = max(1.0, self.lease_seconds / 3)
+        
+        self._claimed = 0
+        self._active_jobs: Dict[int, asyncio.Task] = {}
+        self._lost_leases: Set[int] = set()
+    
+    def submit(self, source_path: str, target_format: BookFormat, options: Dict = None) -> int:
+        """Queue a conversion, reusing an identical job that is still pending or running."""
+        options_json = json.dumps(options or {}, sort_keys=True, default=str)
+        
+        with self.validator.get_database_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                SELECT id FROM conversion_jobs 
+                WHERE source_path = ? AND target_format = ? AND options = ?
+                AND status IN ('pending', 'running')
+            """, (str(source_path), target_format.value, options_json))
+            existing = cursor.fetchone()
+            if existing:
+                return existing['id']
+            
+            cursor.execute("""
+                INSERT INTO conversion_jobs (source_path, target_format, options)
+                VALUES (?, ?, ?)
+            """, (str(source_path), target_format.value, options_json))
+            conn.commit()
+            
+            logger.info(f"Queued conversion job {cursor.lastrowid}: {source_path} -> {target_format.value}")
+            return cursor.lastrowid
+    
+    def _lease_modifier(self) -> str:
+        """SQLite datetime() modifier for one lease period from now."""
+        return f"+{int(self.lease_seconds)} seconds"
+    
+    def reclaim_expired_leases(self) -> int:
+        """Return jobs whose owner stopped renewing its lease to the pending state.
+        
+        Running jobs without a lease were claimed before leases existed.
+        """
+        with self.validator.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE conversion_jobs 
+                SET status = 'pending', started_at = NULL, lease_owner = NULL, lease_expires_at = NULL
+                WHERE status = 'running'
+                AND (lease_expires_at IS NULL OR datetime(lease_expires_at) < datetime('now'))
+            """)
+            conn.commit()
+            
+            if cursor.rowcount:
+                logger.warning(f"Reclaimed {cursor.rowcount} conversion jobs from expired leases")
+            return cursor.rowcount
+    
+    def _claim_next_job(self) -> Optional[Dict]:
+        """Atomically move the oldest pending job to running under this run's lease."""
+        with self.validator.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE conversion_jobs
+                SET status = 'running', attempts = attempts + 1, started_at = ?,
+                    lease_owner = ?, lease_expires_at = datetime('now', ?)
+                WHERE id = (
+                    SELECT id FROM conversion_jobs 
+                    WHERE status = 'pending' 
+                    ORDER BY created_at ASC, id ASC 
+                    LIMIT 1
+                )
+                AND status = 'pending'
+                RETURNING id, source_path, target_format, options
+            """, (datetime.now().isoformat(), self.instance_id, self._lease_modifier()))
+            row = cursor.fetchone()
+            conn.commit()
+            return dict(row) if row else None
+    
+    def renew_leases(self) -> Set[int]:
+        """Extend leases on jobs this run is converting; returns the ids whose lease was lost."""
+        job_ids = list(self._active_jobs)
+        if not job_ids:
+            return set()
+        
+        placeholders = ','.join('?' * len(job_ids))
+        with self.validator.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE conversion_jobs 
+                SET lease_expires_at = datetime('now', ?)
+                WHERE lease_owner = ? AND status = 'running' AND id IN ({placeholders})
+                RETURNING id
+            """, [self._lease_modifier(), self.instance_id] + job_ids)
+            renewed = {row['id'] for row in cursor.fetchall()}
+            conn.commit()
+        
+        return set(job_ids) - renewed
+    
+    async def _renew_leases_periodically(self, stop_event: asyncio.Event):
+        """Heartbeat that keeps this run's leases alive and stops jobs it no longer owns."""
+        while not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=self.lease_renew_interval)
+            except asyncio.TimeoutError:
+                pass
+            if stop_event.is_set():
+                break
+            
+            try:
+                for job_id in await asyncio.to_thread(self.renew_leases):
+                    task = self._active_jobs.get(job_id)
+                    if task is not None:
+                        logger.warning(f"Lease lost for conversion job {job_id}, stopping local conversion")
+                        self._lost_leases.add(job_id)
+                        task.cancel()
+            except Exception as e:
+                logger.error(f"Error renewing conversion job leases: {e}")
+    
+    def _finish_job(self, job_id: int, result: ConversionResult) -> bool:
+        """Record the outcome of a conversion job if this run still holds its lease."""
+        succeeded = result.status in (ConversionStatus.SUCCESS, ConversionStatus.NOT_NEEDED)
+        
+        with self.validator.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE conversion_jobs
+                SET status = ?, target_path = ?, quality_score = ?, 
+                    error_message = ?, completed_at = ?,
+                    lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND status = 'running' AND lease_owner = ?
+            """, (
+                'completed' if succeeded else 'failed',
+                result.target_path if succeeded else None,
+                result.quality_score,
+                '; '.join(result.errors) or None,
+                datetime.now().isoformat(),
+                job_id,
+                self.instance_id
+            ))
+            conn.commit()
+        
+        if cursor.rowcount == 0:
+            logger.warning(f"Conversion job {job_id} finished after its lease was reclaimed; not recording result")
+            return False
+        return True
+    
+    async def _worker(self, worker_id: int, results: List[ConversionResult], limit: Optional[int]):
+        """Claim and run jobs until the queue is drained or the limit is reached."""
+        while limit is None or self._claimed < limit:
+            # Count the claim before awaiting it so concurrent workers respect the limit
+            self._claimed += 1
+            job = await asyncio.to_thread(self._claim_next_job)
+            if job is None:
+                self._claimed -= 1
+                return
+            
+            logger.info(f"Worker {worker_id} converting job {job['id']}: {job['source_path']}")
+            task = asyncio.ensure_future(self.validator.convert_file(
+                job['source_path'], BookFormat(job['target_format']), json.loads(job['options'])
+            ))
+            self._active_jobs[job['id']] = task
+            try:
+                result = await task
+            except asyncio.CancelledError:
+                if job['id'] not in self._lost_leases:
+                    raise
+                self._lost_leases.discard(job['id'])
+                continue
+            except Exception as e:
+                result = ConversionResult(
+                    source_path=job['source_path'], target_path='',
+                    source_format=self.validator._detect_format_from_path(Path(job['source_path'])),
+                    target_format=BookFormat(job['target_format']),
+                    status=ConversionStatus.FAILED, file_size_before=0, file_size_after=0,
+                    quality_score=0.0, conversion_time_seconds=0.0, errors=[str(e)]
+                )
+            finally:
+                self._active_jobs.pop(job['id'], None)
+            
+            if await asyncio.to_thread(self._finish_job, job['id'], result):
+                results.append(result)
+    
+    async def run_pending(self, limit: Optional[int] = None) -> Dict:
+        """Drain pending conversion jobs with up to max_workers running concurrently."""
+        tools = self.validator.probe_conversion_tools()
+        if not any(tools.values()):
+            logger.error("No conversion tools available; leaving jobs queued")
+            return {'processed': 0, 'succeeded': 0, 'failed': 0, 'tools': tools}
+        
+        await asyncio.to_thread(self.reclaim_expired_leases)
+        
+        self._claimed = 0
+        results: List[ConversionResult] = []
+        stop_renewing = asyncio.Event()
+        renewer = asyncio.create_task(self._renew_leases_periodically(stop_renewing))
+        try:
+            await asyncio.gather(*[
+                self._worker(worker_id, results, limit) for worker_id in range(self.max_workers)
+            ])
+        finally:
+            stop_renewing.set()
+            await renewer
+        
+        succeeded = sum(1 for r in results if r.status in (ConversionStatus.SUCCESS, ConversionStatus.NOT_NEEDED))
+        summary = {
+            'processed': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'tools': tools
+        }
+        
+        self.validator.processing_stats['conversions_performed'] += len(results)
+        if results:
+            self.validator.processing_stats['conversion_success_rate'] = succeeded / len(results)
+        
+        logger.info(f"Conversion queue run completed: {summary}")
+        return summary
+
+
 def main():
     parser = argparse.ArgumentParser(description='FolioFox Book Format Validator')
     parser.add_argument('--config', default='./config/config.yaml', help='Configuration file path')
-    parser.add_argument('--mode', choices=['batch', 'single', 'convert', 'report'], default='batch',
+    parser.add_argument('--mode', choices=['batch', 'single', 'convert', 'queue-convert', 'run-conversions',
+                                           'validation-jobs', 'report'],
+                       default='batch',
                        help='Operation mode')
     parser.add_argument('--file-path', help='File path for single mode')
     parser.add_argument('--target-format', choices=[f.value for f in BookFormat], 
                        help='Target format for conversion')
     parser.add_argument('--limit', type=int, default=50, help='Batch processing limit')
+    parser.add_argument('--workers', type=int, help='Concurrent converter processes for run-conversions mode')
+    parser.add_argument('--resume', action='store_true', help='Resume batch validation after the last flushed file')
     
     args = parser.parse_args()
     
@@ -1220,6 +2233,26 @@ def main():
         
         asyncio.run(convert_single())
         
+    elif args.mode == 'queue-convert':
+        if not args.file_path or not args.target_format:
+            print("--file-path and --target-format required for queue-convert mode")
+            sys.exit(1)
+        
+        scheduler = ConversionScheduler(validator)
+        job_id = scheduler.submit(args.file_path, BookFormat(args.target_format))
+        print(json.dumps({'job_id': job_id}, indent=2))
+        
+    elif args.mode == 'run-conversions':
+        # Drain the persistent conversion job queue
+        scheduler = ConversionScheduler(validator, max_workers=args.workers)
+        summary = asyncio.run(scheduler.run_pending(args.limit))
+        print(json.dumps(summary, indent=2, default=str))
+        
+    elif args.mode == 'validation-jobs':
+        # Validate downloads handed off by the queue manager
+        summary = asyncio.run(validator.process_validation_jobs(args.limit))
+        print(json.dumps(summary, indent=2, default=str))
+        
     elif args.mode == 'report':
         # Generate and print report
         report = validator.generate_validation_report()
@@ -1228,7 +2261,7 @@ def main():
     else:
         # Batch validation
         async def run_batch():
-            return await validator.process_batch(args.limit)
+            return await validator.process_batch(args.limit, resume=args.resume)
         
         summary = asyncio.run(run_batch())
         print(json.dumps(summary, indent=2, default=str))
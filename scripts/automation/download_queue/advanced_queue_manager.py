@@ -5,15 +5,17 @@ Comprehensive download queue automation with advanced features and reliability.
 """
 
 import argparse
+import array
 import asyncio
 import json
 import logging
+import os
 import sqlite3
 import sys
 import time
 import signal
+import socket
 import psutil
-import aiofiles
 import aiohttp
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -22,11 +24,22 @@ from dataclasses import dataclass, asdict
 from enum import Enum
 import yaml
 import hashlib
+import heapq
+import math
 import threading
+from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
 import shutil
 
+sys.path.append(str(Path(__file__).parent))
+from failure_classifier import classify_download_failure
+from retry_gate import RetryGate
+
+sys.path.append(str(Path(__file__).parent.parent / 'system_maintenance'))
+from archive_manager import ArchiveManager
+from chunked_executor import ChunkedExecutor
+
 # Configure comprehensive logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,6 +51,66 @@ logging.basicConfig(
 )
 logger = logging.getLogger('foliofox.advanced_queue_manager')
 
+# Write batches grow with throughput so fast links make few large writes
+WRITE_CHUNK_MIN = 256 * 1024
+WRITE_CHUNK_MAX = 4 * 1024 * 1024
+WRITE_BATCH_SECONDS = 0.1
+
+# Leading bytes kept from each download for format sniffing
+SNIFF_BYTES = 4096
+
+# Sniffed content types acceptable for each requested file format
+COMPATIBLE_CONTENT = {
+    'epub': {'epub', 'zip'},
+    'pdf': {'pdf'},
+    'mobi': {'mobi'},
+    'azw': {'mobi'},
+    'azw3': {'mobi'},
+    'fb2': {'fb2', 'zip', 'gzip'},
+    'djvu': {'djvu'},
+    'rtf': {'rtf'},
+    'txt': {'text'},
+    'docx': {'zip'},
+}
+
+
+def sniff_content_type(head: bytes) -> Optional[str]:
+    """Identify downloaded content from its leading bytes; None if unrecognised."""
+    if not head:
+        return None
+    if head.startswith(b'%PDF-'):
+        return 'pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return 'epub' if head[30:58] == b'mimetypeapplication/epub+zip' else 'zip'
+    if head[60:68] in (b'BOOKMOBI', b'TEXtREAd'):
+        return 'mobi'
+    if head.startswith(b'AT&TFORM'):
+        return 'djvu'
+    if head.startswith(b'{\\rtf'):
+        return 'rtf'
+    if head.startswith(b'\x1f\x8b'):
+        return 'gzip'
+    
+    # Only a leading doctype or html tag counts; text and books may mention <head>
+    text = head[3:] if head.startswith(b'\xef\xbb\xbf') else head
+    text = text.lstrip(b' \t\r\n').lower()
+    if text.startswith((b'<!doctype html', b'<html')):
+        return 'html'
+    if b'<fictionbook' in text:
+        return 'fb2'
+    if b'\x00' not in head:
+        try:
+            head.decode('utf-8')
+            return 'text'
+        except UnicodeDecodeError:
+            # A multi-byte character may straddle the sniffing window
+            try:
+                head[:-3].decode('utf-8')
+                return 'text'
+            except UnicodeDecodeError:
+                pass
+    return None
+
 class QueueStatus(Enum):
     PENDING = "pending"
     DOWNLOADING = "downloading"
@@ -53,6 +126,9 @@ class Priority(Enum):
     LOW = 7
     BACKGROUND = 10
 
+class DownloadIntegrityError(Exception):
+    """Downloaded data failed verification and must not be resumed."""
+
 @dataclass  
 class DownloadTask:
     id: int
@@ -78,6 +154,12 @@ class DownloadTask:
     created_at: datetime
     updated_at: datetime
 
+@dataclass
+class TransferResult:
+    bytes_written: int
+    sha256: Optional[str]
+    head: bytes
+
 @dataclass
 class QueueMetrics:
     total_items: int
@@ -109,6 +191,19 @@ class AdvancedQueueManager:
         self.db_path = self.config.get('database', {}).get('path', './data/foliofox.db')
         self.api_base_url = f"http://{self.config.get('server', {}).get('host', 'localhost')}:{self.config.get('server', {}).get('port', 8080)}"
         
+        # Old queue rows are moved to monthly archive partitions rather than deleted
+        self.archiver = ArchiveManager(
+            self.db_path,
+            self.config.get('database', {}).get('archive_dir', './data/archive'),
+            chunk_size=self.config.get('database', {}).get('archive_chunk_size', 500)
+        )
+        self.bulk_executor = ChunkedExecutor.from_config(self.db_path, self.config.get('database', {}))
+        
+        # Retries share the retry manager's per-indexer budgets and circuit gate
+        self.retry_gate = RetryGate.from_config(
+            self.get_database_connection, self.config.get('downloads', {}).get('retry_budget', {})
+        )
+        
         # Advanced configuration
         self.max_concurrent_downloads = self.config.get('downloads', {}).get('max_concurrent', 3)
         self.bandwidth_limit_mbps = self.config.get('downloads', {}).get('bandwidth_limit_mbps', 50)
@@ -116,6 +211,26 @@ class AdvancedQueueManager:
         self.predictive_scheduling = self.config.get('downloads', {}).get('predictive_scheduling', True)
         self.auto_quality_adjustment = self.config.get('downloads', {}).get('auto_quality_adjustment', True)
         
+        # Resumable and segmented transfers
+        self.resume_enabled = self.config.get('downloads', {}).get('resume_enabled', True)
+        self.segmented_downloads = self.config.get('downloads', {}).get('segmented', False)
+        self.segment_count = max(1, self.config.get('downloads', {}).get('segment_count', 4))
+        self.segment_min_size_bytes = self.config.get('downloads', {}).get('segment_min_size_mb', 20) * 1024 * 1024
+        
+        # Dispatcher timing
+        self.resource_sample_interval = self.config.get('downloads', {}).get('resource_sample_interval_seconds', 5)
+        self.enqueue_poll_interval = self.config.get('downloads', {}).get('enqueue_poll_interval_ms', 250) / 1000.0
+        self.retry_check_interval = self.config.get('downloads', {}).get('retry_check_interval_seconds', 60)
+        
+        # Leases let several queue managers share one download_queue
+        self.instance_id = self.config.get('downloads', {}).get('instance_id') or f"{socket.gethostname()}:{os.getpid()}"
+        self.lease_seconds = self.config.get('downloads', {}).get('lease_seconds', 120)
+        self.lease_renew_interval = max(1.0, self.lease_seconds / 3)
+        
+        # In-process metrics, reconciled against SQL to absorb external changes
+        self.metrics_model = QueueMetricsModel()
+        self.metrics_reconcile_interval = self.config.get('monitoring', {}).get('metrics_reconcile_interval_seconds', 300)
+        
         # Monitoring intervals
         self.health_check_interval = 30
         self.metrics_collection_interval = 60
@@ -124,16 +239,42 @@ class AdvancedQueueManager:
         
         # State management
         self.active_downloads: Dict[int, asyncio.Task] = {}
+        self.lost_leases: Set[int] = set()
         self.system_resources = SystemResource(0, 0, 0, 0, 0)
-        self.bandwidth_monitor = BandwidthMonitor()
+        self.bandwidth_monitor = BandwidthMonitor(
+            self.bandwidth_limit_mbps,
+            self.config.get('downloads', {}).get('per_indexer_bandwidth_limit_mbps'),
+            self.config.get('downloads', {}).get('indexer_bandwidth_limits_mbps')
+        )
         self.running = False
         self.shutdown_event = asyncio.Event()
         
+        # Event-driven dispatch: set when a slot frees up or new work arrives
+        self.dispatch_event = asyncio.Event()
+        self.scheduler = FairScheduler(
+            user_weights=self.config.get('downloads', {}).get('user_weights'),
+            per_indexer_max=self.config.get('downloads', {}).get('per_indexer_max_concurrent'),
+            indexer_limits=self.config.get('downloads', {}).get('indexer_max_concurrent')
+        )
+        self._queue_changed = True
+        # Last download_queue_changes id applied to the scheduler; None until the first full sync
+        self._scheduler_change_id: Optional[int] = None
+        
         # Thread pool for I/O operations
         self.executor = ThreadPoolExecutor(max_workers=4)
         
-        # Performance tracking
-        self.performance_history: List[Dict] = []
+        # Live download progress, persisted in coalesced batches
+        self.progress_reporter = ProgressReporter(
+            self.get_database_connection,
+            self.executor,
+            flush_interval_ms=self.config.get('downloads', {}).get('progress_flush_interval_ms', 1000),
+            heartbeat_seconds=self.config.get('downloads', {}).get('progress_heartbeat_seconds', 30)
+        )
+        
+        # Performance tracking: 24h of per-minute samples in a fixed ring
+        self.performance_history = MetricsHistory(
+            capacity=int(24 * 3600 / self.metrics_collection_interval) + 1
+        )
         self.failure_patterns: Dict[str, List] = {}
         
     def _load_config(self, config_path: str) -> Dict:
@@ -153,16 +294,32 @@ class AdvancedQueueManager:
     def _get_default_config(self) -> Dict:
         """Return default configuration."""
         return {
-            'database': {'path': './data/foliofox.db'},
+            'database': {'path': './data/foliofox.db', 'archive_dir': './data/archive', 'archive_chunk_size': 500},
             'server': {'host': 'localhost', 'port': 8080},
             'downloads': {
                 'max_concurrent': 3,
                 'bandwidth_limit_mbps': 50,
+                'per_indexer_bandwidth_limit_mbps': None,
+                'indexer_bandwidth_limits_mbps': {},
                 'smart_retry': True,
                 'predictive_scheduling': True,
                 'auto_quality_adjustment': True,
+                'resume_enabled': True,
+                'segmented': False,
+                'segment_count': 4,
+                'segment_min_size_mb': 20,
                 'timeout_seconds': 300,
-                'chunk_size': 8192
+                'chunk_size': 8192,
+                'progress_flush_interval_ms': 1000,
+                'progress_heartbeat_seconds': 30,
+                'resource_sample_interval_seconds': 5,
+                'enqueue_poll_interval_ms': 250,
+                'retry_check_interval_seconds': 60,
+                'instance_id': None,
+                'lease_seconds': 120,
+                'per_indexer_max_concurrent': None,
+                'indexer_max_concurrent': {},
+                'user_weights': {}
             },
             'monitoring': {
                 'enable_metrics': True,
@@ -189,9 +346,14 @@ class AdvancedQueueManager:
             raise
     
     async def get_system_resources(self) -> SystemResource:
-        """Get current system resource usage."""
+        """Get current system resource usage without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._sample_system_resources)
+    
+    def _sample_system_resources(self) -> SystemResource:
+        """Sample resource usage; CPU is measured since the previous sample rather than blocking."""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
+            cpu_percent = psutil.cpu_percent(interval=None)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
             net_io = psutil.net_io_counters()
@@ -212,84 +374,75 @@ class AdvancedQueueManager:
             return SystemResource(0, 0, 0, 0, 0)
     
     def get_queue_metrics(self) -> QueueMetrics:
-        """Get comprehensive queue metrics."""
+        """Get comprehensive queue metrics from the in-process model."""
+        if self.metrics_model.last_reconciled is None:
+            self.reconcile_metrics()
+        
+        return self.metrics_model.snapshot(
+            self.max_concurrent_downloads,
+            self.bandwidth_monitor.get_current_usage()
+        )
+    
+    def reconcile_metrics(self):
+        """Resynchronise the metrics model with download_queue.
+        
+        Other processes (the API, other queue managers, maintenance) change
+        rows behind this instance's back; this periodic pass corrects any
+        drift in the counters and rolling windows.
+        """
         try:
+            now = datetime.now()
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Basic status counts
                 cursor.execute("""
                     SELECT status, COUNT(*) as count 
                     FROM download_queue 
                     GROUP BY status
                 """)
-                status_counts = dict(cursor.fetchall())
+                status_counts = {row['status']: row['count'] for row in cursor.fetchall()}
                 
-                # Total items
-                cursor.execute("SELECT COUNT(*) FROM download_queue")
-                total_items = cursor.fetchone()[0]
-                
-                # Average completion time (last 7 days)
+                # Completions in the throughput window
                 cursor.execute("""
-                    SELECT AVG(
-                        (julianday(completed_at) - julianday(started_at)) * 24 * 60 * 60
-                    ) as avg_seconds
-                    FROM download_queue 
+                    SELECT completed_at FROM download_queue 
                     WHERE status = 'completed'
-                    AND completed_at > datetime('now', '-7 days')
-                    AND started_at IS NOT NULL
-                """)
-                avg_completion_result = cursor.fetchone()[0]
+                    AND julianday(completed_at) > julianday(?)
+                """, ((now - timedelta(hours=1)).isoformat(),))
+                completions = [row['completed_at'] for row in cursor.fetchall()]
                 
-                # Success rate (last 24 hours)
+                # Outcomes in the success-rate window
                 cursor.execute("""
-                    SELECT 
-                        SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as success_rate
-                    FROM download_queue 
-                    WHERE updated_at > datetime('now', '-1 day')
-                    AND status IN ('completed', 'failed')
-                """)
-                success_rate_result = cursor.fetchone()[0]
-                
-                # Throughput last hour
-                cursor.execute("""
-                    SELECT COUNT(*) FROM download_queue 
-                    WHERE status = 'completed' 
-                    AND completed_at > datetime('now', '-1 hour')
-                """)
-                throughput_last_hour = cursor.fetchone()[0]
-                
-                # Estimate completion time for pending items
-                cursor.execute("""
-                    SELECT COUNT(*) FROM download_queue 
-                    WHERE status IN ('pending', 'downloading')
-                """)
-                pending_items = cursor.fetchone()[0]
-                
-                estimated_completion = None
-                if avg_completion_result and pending_items > 0:
-                    avg_time_seconds = avg_completion_result
-                    total_time_needed = (pending_items / max(1, self.max_concurrent_downloads)) * avg_time_seconds
-                    estimated_completion = datetime.now() + timedelta(seconds=total_time_needed)
-                
-                return QueueMetrics(
-                    total_items=total_items,
-                    pending=status_counts.get('pending', 0),
-                    downloading=status_counts.get('downloading', 0),
-                    completed=status_counts.get('completed', 0),
-                    failed=status_counts.get('failed', 0),
-                    cancelled=status_counts.get('cancelled', 0),
-                    paused=status_counts.get('paused', 0),
-                    avg_completion_time=avg_completion_result,
-                    success_rate=success_rate_result or 0.0,
-                    throughput_last_hour=throughput_last_hour,
-                    bandwidth_usage_mbps=self.bandwidth_monitor.get_current_usage(),
-                    estimated_completion_time=estimated_completion
-                )
-                
+                    SELECT updated_at, status FROM download_queue 
+                    WHERE status IN ('completed', 'failed')
+                    AND julianday(updated_at) > julianday(?)
+                """, ((now - timedelta(days=1)).isoformat(),))
+                outcomes = [(row['updated_at'], row['status'] == 'completed') for row in cursor.fetchall()]
+                
+                avg_completion = None
+                if self.metrics_model.avg_completion_time is None:
+                    cursor.execute("""
+                        SELECT AVG(
+                            (julianday(completed_at) - julianday(started_at)) * 24 * 60 * 60
+                        ) as avg_seconds
+                        FROM download_queue 
+                        WHERE status = 'completed'
+                        AND julianday(completed_at) > julianday(?)
+                        AND started_at IS NOT NULL
+                    """, ((now - timedelta(days=7)).isoformat(),))
+                    avg_completion = cursor.fetchone()[0]
+            
+            def epoch(value: str) -> float:
+                return datetime.fromisoformat(value).timestamp()
+            
+            self.metrics_model.reconcile(
+                status_counts,
+                [epoch(value) for value in completions if value],
+                [(epoch(value), succeeded) for value, succeeded in outcomes if value],
+                avg_completion
+            )
+            
         except Exception as e:
-            logger.error(f"Error getting queue metrics: {e}")
-            return QueueMetrics(0, 0, 0, 0, 0, 0, 0, None, 0.0, 0, 0.0, None)
+            logger.error(f"Error reconciling queue metrics: {e}")
     
     def get_pending_downloads(self, limit: int = None) -> List[DownloadTask]:
         """Get pending downloads with intelligent prioritization."""
@@ -327,13 +480,14 @@ class AdvancedQueueManager:
             return []
     
     def get_stale_downloads(self, threshold_minutes: int = 60) -> List[DownloadTask]:
-        """Find downloads stuck in downloading state."""
+        """Find unleased downloads stuck in downloading state (rows started before leases existed)."""
         try:
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("""
                     SELECT * FROM download_queue 
                     WHERE status = 'downloading' 
+                    AND lease_owner IS NULL
                     AND updated_at < datetime('now', '-{} minutes')
                 """.format(threshold_minutes))
                 
@@ -345,32 +499,40 @@ class AdvancedQueueManager:
             return []
     
     def get_failed_downloads_for_retry(self) -> List[DownloadTask]:
-        """Get failed downloads eligible for retry with smart logic."""
+        """Get failed downloads eligible for retry with smart logic.
+        
+        Only failures the retry manager has scheduled are considered, and
+        they pass through the same per-indexer budget and circuit gate.
+        """
         try:
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Consider retry cooldown and failure patterns
                 cursor.execute("""
                     SELECT * FROM download_queue 
                     WHERE status = 'failed' 
                     AND retry_count < max_retries
-                    AND updated_at < datetime('now', '-300 seconds')
+                    AND next_retry_at <= ?
                     ORDER BY 
                         (retry_count * 300) ASC,  -- Longer wait for more retries
                         priority ASC,
                         updated_at ASC
                     LIMIT 10
-                """)
+                """, (datetime.now().isoformat(),))
                 
                 rows = cursor.fetchall()
                 downloads = [self._row_to_download_task(row) for row in rows]
-                
-                # Filter based on failure pattern analysis
-                if self.smart_retry_enabled:
-                    downloads = self._filter_smart_retry(downloads)
-                
-                return downloads
+            
+            # Already admitted on an earlier pass and waiting for dispatch
+            downloads = [download for download in downloads if download.id not in self.scheduler]
+            
+            # Filter based on failure pattern analysis
+            if self.smart_retry_enabled:
+                downloads = self._filter_smart_retry(downloads)
+            
+            admitted, _ = self.retry_gate.admit([(download.id, download.indexer_id) for download in downloads])
+            admitted = set(admitted)
+            return [download for download in downloads if download.id in admitted]
                 
         except Exception as e:
             logger.error(f"Error getting failed downloads for retry: {e}")
@@ -396,11 +558,9 @@ class AdvancedQueueManager:
                     continue
             
             # Check error message patterns
-            if download.error_message:
-                if any(pattern in download.error_message.lower() for pattern in 
-                       ['404', 'not found', 'removed', 'deleted', 'unavailable']):
-                    logger.info(f"Skipping retry for download {download.id} due to permanent error")
-                    continue
+            if classify_download_failure(download.error_message).permanent:
+                logger.info(f"Skipping retry for download {download.id} due to permanent error")
+                continue
             
             filtered.append(download)
         
@@ -409,8 +569,14 @@ class AdvancedQueueManager:
     async def start_download(self, download: DownloadTask) -> bool:
         """Start a download with comprehensive error handling."""
         try:
-            # Update status to downloading
-            await self._update_download_status(download.id, QueueStatus.DOWNLOADING)
+            # Only start items this instance managed to claim; another instance
+            # or the API may have taken or cancelled them in the meantime
+            claimed = self._claim_download(download.id)
+            if claimed is None:
+                logger.info(f"Skipping download {download.id}: no longer available")
+                return False
+            self.metrics_model.record_transition(download.status.value, QueueStatus.DOWNLOADING.value)
+            download = claimed
             
             # Create download task
             task = asyncio.create_task(self._download_file(download))
@@ -424,52 +590,160 @@ class AdvancedQueueManager:
             await self._update_download_status(download.id, QueueStatus.FAILED, str(e))
             return False
     
+    def _claim_download(self, download_id: int) -> Optional[DownloadTask]:
+        """Atomically move a pending or failed item to downloading under this instance's lease.
+        
+        Returns the claimed row, or None if its status changed meanwhile.
+        Lease expiry is kept in SQLite's UTC clock so instances on other
+        hosts, time zones or sides of a DST change agree on it.
+        """
+        now = datetime.now()
+        with self.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE download_queue 
+                SET status = 'downloading', started_at = ?, updated_at = ?,
+                    lease_owner = ?, lease_expires_at = datetime('now', ?)
+                WHERE id = ? AND status IN ('pending', 'failed')
+                RETURNING *
+            """, (now.isoformat(), now.isoformat(), self.instance_id, self._lease_modifier(), download_id))
+            row = cursor.fetchone()
+            conn.commit()
+            return self._row_to_download_task(row) if row else None
+    
+    def _lease_modifier(self) -> str:
+        """SQLite datetime() modifier for one lease period from now."""
+        return f"+{int(self.lease_seconds)} seconds"
+    
+    def renew_leases(self) -> Set[int]:
+        """Extend leases on active downloads; returns the ids whose lease was lost."""
+        download_ids = list(self.active_downloads)
+        if not download_ids:
+            return set()
+        
+        placeholders = ','.join('?' * len(download_ids))
+        with self.get_database_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                UPDATE download_queue 
+                SET lease_expires_at = datetime('now', ?)
+                WHERE lease_owner = ? AND status = 'downloading' AND id IN ({placeholders})
+                RETURNING id
+            """, [self._lease_modifier(), self.instance_id] + download_ids)
+            renewed = {row['id'] for row in cursor.fetchall()}
+            conn.commit()
+        
+        return set(download_ids) - renewed
+    
+    def reclaim_expired_leases(self) -> List[int]:
+        """Return downloads whose owner stopped renewing its lease to the pending queue."""
+        with self.get_database_connection() as conn:
+            cursor = conn.cursor()
+            # datetime() also normalises leases written in the older isoformat layout
+            cursor.execute("""
+                UPDATE download_queue 
+                SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL, updated_at = ?
+                WHERE status = 'downloading' AND datetime(lease_expires_at) < datetime('now')
+                RETURNING id
+            """, (datetime.now().isoformat(),))
+            rows = cursor.fetchall()
+            conn.commit()
+        
+        for row in rows:
+            logger.warning(f"Reclaimed download {row['id']} from expired lease")
+            self.metrics_model.record_transition(QueueStatus.DOWNLOADING.value, QueueStatus.PENDING.value)
+        return [row['id'] for row in rows]
+    
+    async def _renew_leases_periodically(self):
+        """Heartbeat that keeps this instance's leases alive and stops downloads it no longer owns."""
+        loop = asyncio.get_running_loop()
+        
+        while self.running and not self.shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(self.shutdown_event.wait(), timeout=self.lease_renew_interval)
+            except asyncio.TimeoutError:
+                pass
+            if self.shutdown_event.is_set():
+                break
+            
+            try:
+                lost = await loop.run_in_executor(self.executor, self.renew_leases)
+                for download_id in lost:
+                    task = self.active_downloads.get(download_id)
+                    if task is not None:
+                        logger.warning(f"Lease lost for download {download_id}, stopping local transfer")
+                        self.lost_leases.add(download_id)
+                        task.cancel()
+            except Exception as e:
+                logger.error(f"Error renewing download leases: {e}")
+    
     async def _download_file(self, download: DownloadTask):
-        """Core download implementation with progress tracking."""
+        """Core download implementation with progress tracking and resume support."""
         start_time = datetime.now()
         temp_path = None
+        state_path = None
+        keep_partial = False
         
         try:
             # Determine download path
             download_dir = Path(self.config.get('downloads', {}).get('path', './downloads'))
             download_dir.mkdir(parents=True, exist_ok=True)
             
-            # Create temporary file
-            temp_path = download_dir / f"temp_{download.id}_{int(time.time())}.{download.file_format}"
+            # Partial data lives at a stable path so a later attempt can pick it up
+            temp_path = download_dir / f"temp_{download.id}.{download.file_format}.part"
+            state_path = temp_path.with_name(temp_path.name + '.json')
             final_path = download_dir / f"{self._sanitize_filename(download.title)}.{download.file_format}"
             
-            # Download with progress tracking
+            state = None
+            if self.resume_enabled:
+                state = self._load_partial_state(state_path, temp_path, download.download_url)
+            if state is None:
+                self._discard_partial(temp_path, state_path)
+            
             async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=300)) as session:
-                async with session.get(download.download_url) as response:
-                    if response.status != 200:
-                        raise Exception(f"HTTP {response.status}: {response.reason}")
-                    
-                    total_size = int(response.headers.get('content-length', 0))
-                    downloaded = 0
-                    
-                    async with aiofiles.open(temp_path, 'wb') as f:
-                        async for chunk in response.content.iter_chunked(8192):
-                            await f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            # Update progress
-                            if total_size > 0:
-                                progress = int((downloaded / total_size) * 100)
-                                await self._update_download_progress(download.id, progress)
-                            
-                            # Check bandwidth limits
-                            await self.bandwidth_monitor.throttle_if_needed()
-                            
-                            # Check for cancellation
-                            if self.shutdown_event.is_set():
-                                raise asyncio.CancelledError("Shutdown requested")
+                if state is None:
+                    state = {'url': download.download_url, 'validator': None, 'total_size': None, 'segments': None}
+                    if self.segmented_downloads:
+                        probe = await self._probe_range_support(session, download.download_url)
+                        if probe and probe['total_size'] >= self.segment_min_size_bytes:
+                            state['total_size'] = probe['total_size']
+                            state['validator'] = probe['validator']
+                            state['segments'] = self._plan_segments(probe['total_size'], self.segment_count)
+                else:
+                    logger.info(f"Resuming download {download.id} from partial data")
+                
+                keep_partial = self.resume_enabled
+                if state['segments']:
+                    transfer = await self._fetch_segmented(session, download, temp_path, state_path, state)
+                else:
+                    transfer = await self._fetch_single_stream(session, download, temp_path, state_path, state)
+            downloaded = transfer.bytes_written
             
             # Verify file integrity
+            total_size = state['total_size'] or 0
             if total_size > 0 and downloaded != total_size:
-                raise Exception(f"File size mismatch: expected {total_size}, got {downloaded}")
+                raise DownloadIntegrityError(f"File size mismatch: expected {total_size}, got {downloaded}")
+            
+            # Check the content against the requested format using bytes seen while writing
+            content_type = sniff_content_type(transfer.head)
+            if content_type == 'html':
+                raise DownloadIntegrityError(f"Server returned an HTML page instead of a {download.file_format} file")
+            expected = COMPATIBLE_CONTENT.get(download.file_format.lower())
+            format_mismatch = bool(expected and content_type and content_type not in expected)
+            if format_mismatch:
+                logger.warning(f"Download {download.id} looks like {content_type}, expected {download.file_format}")
+            
+            sha256 = transfer.sha256
+            if sha256 is None:
+                loop = asyncio.get_running_loop()
+                sha256, _ = await loop.run_in_executor(self.executor, ChunkWriter.hash_file, temp_path)
             
-            # Move to final location
-            shutil.move(str(temp_path), str(final_path))
+            # Move to final location; a rename when both live on the same filesystem
+            if temp_path.stat().st_dev == final_path.parent.stat().st_dev:
+                os.replace(temp_path, final_path)
+            else:
+                shutil.move(str(temp_path), str(final_path))
+            keep_partial = False
             
             # Update database
             completion_time = datetime.now()
@@ -483,9 +757,24 @@ class AdvancedQueueManager:
                         progress_percentage = 100,
                         download_path = ?,
                         completed_at = ?,
-                        updated_at = ?
-                    WHERE id = ?
-                """, (str(final_path), completion_time.isoformat(), completion_time.isoformat(), download.id))
+                        updated_at = ?,
+                        lease_owner = NULL,
+                        lease_expires_at = NULL
+                    WHERE id = ? AND (lease_owner IS NULL OR lease_owner = ?)
+                """, (str(final_path), completion_time.isoformat(), completion_time.isoformat(),
+                      download.id, self.instance_id))
+                
+                if cursor.rowcount == 0:
+                    logger.warning(f"Download {download.id} finished after its lease was reclaimed; not recording completion")
+                    return
+                
+                self.metrics_model.record_transition(QueueStatus.DOWNLOADING.value, QueueStatus.COMPLETED.value,
+                                                     duration=(completion_time - (download.started_at or start_time)).total_seconds())
+                
+                # Register the file with its checksum and hand it to the format validator
+                if download.book_id is not None:
+                    self._record_book_file(cursor, download, final_path, downloaded, sha256,
+                                           content_type, format_mismatch, completion_time)
                 
                 # Insert into history
                 cursor.execute("""
@@ -505,13 +794,27 @@ class AdvancedQueueManager:
             logger.info(f"Download completed: {download.title} (ID: {download.id}, Duration: {duration:.1f}s)")
             
         except asyncio.CancelledError:
-            logger.info(f"Download cancelled: {download.title} (ID: {download.id})")
-            await self._update_download_status(download.id, QueueStatus.CANCELLED)
+            if download.id in self.lost_leases:
+                # Another instance owns the row now; leave its status and files alone
+                keep_partial = True
+                logger.info(f"Download handed over to another instance: {download.title} (ID: {download.id})")
+            elif self.shutdown_event.is_set() and keep_partial:
+                # Leave partial data in place and requeue so the next run resumes it
+                logger.info(f"Download interrupted by shutdown, will resume: {download.title} (ID: {download.id})")
+                await self._update_download_status(download.id, QueueStatus.PENDING)
+            else:
+                keep_partial = False
+                logger.info(f"Download cancelled: {download.title} (ID: {download.id})")
+                await self._update_download_status(download.id, QueueStatus.CANCELLED)
             
         except Exception as e:
             error_msg = str(e)
             logger.error(f"Download failed: {download.title} (ID: {download.id}) - {error_msg}")
             
+            # Partial data that failed verification cannot be resumed
+            if isinstance(e, DownloadIntegrityError):
+                keep_partial = False
+            
             # Record failure pattern
             self._record_failure_pattern(download.indexer_id, error_msg)
             
@@ -519,19 +822,311 @@ class AdvancedQueueManager:
             if download.retry_count < download.max_retries:
                 await self._update_download_status(download.id, QueueStatus.FAILED, error_msg, increment_retry=True)
             else:
+                keep_partial = False
                 await self._update_download_status(download.id, QueueStatus.FAILED, error_msg)
             
         finally:
-            # Cleanup temporary file
-            if temp_path and temp_path.exists():
-                try:
-                    temp_path.unlink()
-                except Exception as e:
-                    logger.warning(f"Failed to cleanup temp file {temp_path}: {e}")
+            # Cleanup temporary file unless it is kept for a resumed attempt
+            if temp_path and not keep_partial:
+                self._discard_partial(temp_path, state_path)
+            
+            self.progress_reporter.finish(download.id)
+            self.lost_leases.discard(download.id)
             
-            # Remove from active downloads
+            # Remove from active downloads and let the dispatcher fill the freed slot
             if download.id in self.active_downloads:
                 del self.active_downloads[download.id]
+            self.scheduler.release(download.id)
+            self.dispatch_event.set()
+    
+    def _record_book_file(self, cursor: sqlite3.Cursor, download: DownloadTask, final_path: Path,
+                          file_size: int, sha256: str, content_type: Optional[str],
+                          format_mismatch: bool, completion_time: datetime):
+        """Upsert the book_files row for a finished download and queue its validation job."""
+        cursor.execute("SELECT id FROM book_formats WHERE LOWER(name) = LOWER(?)", (download.file_format,))
+        format_row = cursor.fetchone()
+        if format_row is None:
+            logger.warning(f"Unknown book format '{download.file_format}' for download {download.id}")
+            return
+        
+        cursor.execute("""
+            SELECT id FROM book_files WHERE book_id = ? AND format_id = ? AND file_path = ?
+        """, (download.book_id, format_row['id'], str(final_path)))
+        existing = cursor.fetchone()
+        
+        if existing:
+            book_file_id = existing['id']
+            cursor.execute("""
+                UPDATE book_files 
+                SET file_size_bytes = ?, source_url = ?, download_date = ?, checksum = ?
+                WHERE id = ?
+            """, (file_size, download.download_url, completion_time.isoformat(), sha256, book_file_id))
+        else:
+            cursor.execute("""
+                INSERT INTO book_files 
+                (book_id, format_id, file_path, file_size_bytes, source_url, download_date, checksum)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (download.book_id, format_row['id'], str(final_path), file_size,
+                  download.download_url, completion_time.isoformat(), sha256))
+            book_file_id = cursor.lastrowid
+        
+        cursor.execute("""
+            INSERT INTO validation_jobs 
+            (book_file_id, checksum, file_size_bytes, detected_format, format_mismatch)
+            VALUES (?, ?, ?, ?, ?)
+        """, (book_file_id, sha256, file_size, content_type, format_mismatch))
+    
+    async def _fetch_single_stream(self, session: aiohttp.ClientSession, download: DownloadTask,
+                                   temp_path: Path, state_path: Path, state: Dict) -> TransferResult:
+        """Download as one stream, continuing after any bytes already on disk via Range.
+        
+        The SHA-256 and leading bytes are captured as the data is written.
+        """
+        offset = 0
+        if temp_path.exists():
+            # Preallocated files are larger than the data written so far
+            offset = min(state.get('written', temp_path.stat().st_size), temp_path.stat().st_size)
+        
+        headers = {}
+        if offset > 0:
+            headers['Range'] = f"bytes={offset}-"
+            if state.get('validator'):
+                # Server answers 200 with the full body if the file changed since
+                headers['If-Range'] = state['validator']
+        
+        async with session.get(download.download_url, headers=headers) as response:
+            if response.status == 416 and offset and offset == state.get('total_size'):
+                writer = ChunkWriter(temp_path, resume_from=offset)
+                try:
+                    sha256 = await writer.close()
+                    writer.truncate(offset)
+                finally:
+                    await writer.abort()
+                return TransferResult(offset, sha256, bytes(writer.head))
+            
+            if response.status == 206 and offset:
+                total_size = self._parse_content_range_total(response.headers.get('content-range'))
+                if total_size is None and response.content_length is not None:
+                    total_size = offset + response.content_length
+            elif response.status == 200:
+                if offset:
+                    logger.info(f"Server ignored range request for download {download.id}, restarting")
+                offset = 0
+                total_size = response.content_length
+            else:
+                raise Exception(f"HTTP {response.status}: {response.reason}")
+            
+            state['total_size'] = total_size or None
+            state['validator'] = response.headers.get('etag') or response.headers.get('last-modified')
+            state['segments'] = None
+            state['written'] = offset
+            if self.resume_enabled:
+                self._save_partial_state(state_path, state)
+            
+            writer = ChunkWriter(temp_path, total_size=total_size, resume_from=offset)
+            try:
+                downloaded = offset
+                last_save = time.monotonic()
+                async for batch, nbytes in self._read_batches(response):
+                    await writer.write(batch, downloaded)
+                    downloaded += nbytes
+                    
+                    # Publish progress; database writes are coalesced by the reporter
+                    self.progress_reporter.report(download.id, downloaded, total_size or 0)
+                    
+                    # Charge the batch against global and per-indexer bandwidth budgets
+                    await self.bandwidth_monitor.throttle_if_needed(download.indexer_id, nbytes)
+                    
+                    now = time.monotonic()
+                    if self.resume_enabled and now - last_save >= 2.0:
+                        last_save = now
+                        state['written'] = writer.committed
+                        self._save_partial_state(state_path, state)
+                    
+                    # Check for cancellation
+                    if self.shutdown_event.is_set():
+                        raise asyncio.CancelledError("Shutdown requested")
+                
+                sha256 = await writer.close()
+                writer.truncate(downloaded)
+            finally:
+                await writer.abort()
+                if self.resume_enabled:
+                    state['written'] = writer.committed
+                    self._save_partial_state(state_path, state)
+        
+        return TransferResult(downloaded, sha256, bytes(writer.head))
+    
+    async def _read_batches(self, response: aiohttp.ClientResponse, limit: Optional[int] = None):
+        """Group network reads into write batches sized to roughly WRITE_BATCH_SECONDS of throughput.
+        
+        Yields (chunks, byte_count); chunks are handed to the writer as-is
+        rather than joined. Stops after limit bytes if given.
+        """
+        target = WRITE_CHUNK_MIN
+        batch: List[bytes] = []
+        batch_bytes = 0
+        started = time.monotonic()
+        
+        async for data in response.content.iter_any():
+            if limit is not None:
+                if limit <= 0:
+                    break
+                if len(data) > limit:
+                    data = data[:limit]
+                limit -= len(data)
+            
+            batch.append(data)
+            batch_bytes += len(data)
+            if batch_bytes < target:
+                continue
+            
+            now = time.monotonic()
+            rate = batch_bytes / max(now - started, 1e-3)
+            target = int(min(max(rate * WRITE_BATCH_SECONDS, WRITE_CHUNK_MIN), WRITE_CHUNK_MAX))
+            
+            yield batch, batch_bytes
+            batch, batch_bytes, started = [], 0, time.monotonic()
+        
+        if batch:
+            yield batch, batch_bytes
+    
+    async def _fetch_segmented(self, session: aiohttp.ClientSession, download: DownloadTask,
+                               temp_path: Path, state_path: Path, state: Dict) -> TransferResult:
+        """Download K byte ranges in parallel into a preallocated file, persisting per-segment progress.
+        
+        Segments arrive out of order, so the SHA-256 is computed by reading
+        the assembled file back once all segments are complete.
+        """
+        total_size = state['total_size']
+        segments = state['segments']
+        progress = {'downloaded': sum(segment[2] for segment in segments), 'last_save': time.monotonic()}
+        
+        writer = ChunkWriter(temp_path, total_size=total_size)
+        try:
+            async def fetch_segment(segment: List[int]):
+                start, end = segment[0], segment[1]
+                position = start + segment[2]
+                if position > end:
+                    return
+                
+                headers = {'Range': f"bytes={position}-{end}"}
+                if state.get('validator'):
+                    headers['If-Range'] = state['validator']
+                
+                def committed(nbytes: int):
+                    segment[2] += nbytes
+                
+                async with session.get(download.download_url, headers=headers) as response:
+                    if response.status == 200:
+                        raise DownloadIntegrityError("Remote file changed or range not honoured; restarting download")
+                    if response.status != 206:
+                        raise Exception(f"HTTP {response.status}: {response.reason}")
+                    
+                    async for batch, nbytes in self._read_batches(response, limit=end - position + 1):
+                        await writer.write(batch, position, on_written=committed)
+                        position += nbytes
+                        progress['downloaded'] += nbytes
+                        
+                        self.progress_reporter.report(download.id, progress['downloaded'], total_size)
+                        await self.bandwidth_monitor.throttle_if_needed(download.indexer_id, nbytes)
+                        
+                        now = time.monotonic()
+                        if now - progress['last_save'] >= 2.0:
+                            progress['last_save'] = now
+                            self._save_partial_state(state_path, state)
+                        
+                        if self.shutdown_event.is_set():
+                            raise asyncio.CancelledError("Shutdown requested")
+            
+            tasks = [asyncio.create_task(fetch_segment(segment)) for segment in segments]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+            
+            await writer.close()
+        finally:
+            await writer.abort()
+            if self.resume_enabled:
+                self._save_partial_state(state_path, state)
+        
+        loop = asyncio.get_running_loop()
+        sha256, head = await loop.run_in_executor(self.executor, ChunkWriter.hash_file, temp_path)
+        return TransferResult(progress['downloaded'], sha256, head)
+    
+    async def _probe_range_support(self, session: aiohttp.ClientSession, url: str) -> Optional[Dict]:
+        """HEAD the URL to learn its size and whether byte ranges are served."""
+        try:
+            async with session.head(url, allow_redirects=True) as response:
+                if response.status != 200:
+                    return None
+                if response.headers.get('accept-ranges', '').lower() != 'bytes':
+                    return None
+                if not response.content_length:
+                    return None
+                return {
+                    'total_size': response.content_length,
+                    'validator': response.headers.get('etag') or response.headers.get('last-modified')
+                }
+        except Exception as e:
+            logger.debug(f"Range probe failed for {url}: {e}")
+            return None
+    
+    @staticmethod
+    def _plan_segments(total_size: int, segment_count: int) -> List[List[int]]:
+        """Split [0, total_size) into inclusive [start, end, bytes_done] ranges."""
+        segment_size = -(-total_size // segment_count)
+        return [
+            [start, min(start + segment_size, total_size) - 1, 0]
+            for start in range(0, total_size, segment_size)
+        ]
+    
+    @staticmethod
+    def _parse_content_range_total(content_range: Optional[str]) -> Optional[int]:
+        """Extract the complete length from a 'bytes a-b/total' header."""
+        if not content_range or '/' not in content_range:
+            return None
+        total = content_range.rsplit('/', 1)[1].strip()
+        return int(total) if total.isdigit() else None
+    
+    def _load_partial_state(self, state_path: Path, temp_path: Path, url: str) -> Optional[Dict]:
+        """Load resume state for a partial download if it still matches the request."""
+        if not state_path.exists() or not temp_path.exists():
+            return None
+        
+        try:
+            with open(state_path, 'r') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable resume state {state_path}: {e}")
+            return None
+        
+        if state.get('url') != url:
+            return None
+        return state
+    
+    def _save_partial_state(self, state_path: Path, state: Dict):
+        """Persist resume state atomically next to the partial file."""
+        try:
+            temp_state = state_path.with_suffix('.tmp')
+            with open(temp_state, 'w') as f:
+                json.dump(state, f)
+            os.replace(temp_state, state_path)
+        except OSError as e:
+            logger.warning(f"Failed to save resume state {state_path}: {e}")
+    
+    def _discard_partial(self, temp_path: Path, state_path: Optional[Path]):
+        """Remove partial download data and its resume state."""
+        for path in (temp_path, state_path):
+            if path and path.exists():
+                try:
+                    path.unlink()
+                except Exception as e:
+                    logger.warning(f"Failed to cleanup temp file {path}: {e}")
     
     def _record_failure_pattern(self, indexer_id: int, error_message: str):
         """Record failure patterns for smart retry logic."""
@@ -559,12 +1154,20 @@ class AdvancedQueueManager:
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 
+                # Rows leased by another instance are left to their owner; leaving
+                # the downloading state releases this instance's lease
+                lease_clause = "AND (lease_owner IS NULL OR lease_owner = ?)"
+                release_lease = "" if status == QueueStatus.DOWNLOADING else ", lease_owner = NULL, lease_expires_at = NULL"
+                if status == QueueStatus.FAILED:
+                    # A new failure gets a fresh retry schedule from the retry manager
+                    release_lease += ", next_retry_at = NULL"
+                
                 if increment_retry:
-                    cursor.execute("""
+                    cursor.execute(f"""
                         UPDATE download_queue 
-                        SET status = ?, error_message = ?, retry_count = retry_count + 1, updated_at = ?
-                        WHERE id = ?
-                    """, (status.value, error_message, datetime.now().isoformat(), download_id))
+                        SET status = ?, error_message = ?, retry_count = retry_count + 1, updated_at = ?{release_lease}
+                        WHERE id = ? {lease_clause}
+                    """, (status.value, error_message, datetime.now().isoformat(), download_id, self.instance_id))
                 else:
                     update_fields = ["status = ?", "updated_at = ?"]
                     params = [status.value, datetime.now().isoformat()]
@@ -577,33 +1180,22 @@ class AdvancedQueueManager:
                         update_fields.append("started_at = ?")
                         params.append(datetime.now().isoformat())
                     
-                    params.append(download_id)
+                    params.extend([download_id, self.instance_id])
                     
                     cursor.execute(f"""
                         UPDATE download_queue 
-                        SET {', '.join(update_fields)}
-                        WHERE id = ?
+                        SET {', '.join(update_fields)}{release_lease}
+                        WHERE id = ? {lease_clause}
                     """, params)
                 
                 conn.commit()
                 
-        except Exception as e:
-            logger.error(f"Error updating download status: {e}")
-    
-    async def _update_download_progress(self, download_id: int, progress: int):
-        """Update download progress."""
-        try:
-            with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    UPDATE download_queue 
-                    SET progress_percentage = ?, updated_at = ?
-                    WHERE id = ?
-                """, (progress, datetime.now().isoformat(), download_id))
-                conn.commit()
+                # Downloads running in this process are known to be leaving 'downloading'
+                if cursor.rowcount and download_id in self.active_downloads:
+                    self.metrics_model.record_transition(QueueStatus.DOWNLOADING.value, status.value)
                 
         except Exception as e:
-            logger.error(f"Error updating download progress: {e}")
+            logger.error(f"Error updating download status: {e}")
     
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename for filesystem compatibility."""
@@ -642,40 +1234,178 @@ class AdvancedQueueManager:
             updated_at=datetime.fromisoformat(row['updated_at'])
         )
     
+    def notify_enqueued(self):
+        """Wake the dispatcher after new work was queued from this process."""
+        self._queue_changed = True
+        self.dispatch_event.set()
+    
+    def _latest_queue_change(self, conn: sqlite3.Connection) -> int:
+        """Id of the most recent download_queue_changes entry, including pruned ones."""
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'download_queue_changes'").fetchone()
+        return row[0] if row else 0
+    
+    def sync_scheduler(self):
+        """Bring the in-memory scheduler up to date with pending rows in download_queue.
+        
+        The first sync reads every pending row. Later ones only re-read the
+        rows logged in download_queue_changes since the previous sync, falling
+        back to a full read if those log entries were already pruned.
+        """
+        self._queue_changed = False
+        try:
+            with self.get_database_connection() as conn:
+                latest = self._latest_queue_change(conn)
+                since = self._scheduler_change_id
+                if since is not None and latest > since:
+                    (oldest,) = conn.execute("SELECT MIN(id) FROM download_queue_changes WHERE id > ?",
+                                             (since,)).fetchone()
+                    if oldest != since + 1:
+                        since = None
+                
+                if since is None:
+                    pending = None
+                elif latest == since:
+                    return
+                else:
+                    changed_ids = {row[0] for row in conn.execute("""
+                        SELECT DISTINCT download_id FROM download_queue_changes WHERE id > ? AND id <= ?
+                    """, (since, latest))}
+                    placeholders = ','.join('?' * len(changed_ids))
+                    pending = [self._row_to_download_task(row) for row in conn.execute(f"""
+                        SELECT dq.*, u.username, i.name as indexer_name
+                        FROM download_queue dq
+                        JOIN users u ON dq.user_id = u.id
+                        JOIN indexers i ON dq.indexer_id = i.id
+                        WHERE dq.status = 'pending' AND dq.id IN ({placeholders})
+                    """, tuple(changed_ids))]
+        except Exception as e:
+            logger.error(f"Error reading queue changes: {e}")
+            self._queue_changed = True
+            return
+        
+        if pending is None:
+            # The watermark is read first, so changes racing the full read are replayed next time
+            self.scheduler.sync(self.get_pending_downloads())
+        else:
+            self.scheduler.apply_changes(changed_ids, pending)
+        self._scheduler_change_id = latest
+    
     async def process_download_queue(self):
-        """Main download queue processing loop."""
+        """Event-driven dispatch loop.
+        
+        Wakes when a download slot is freed, new work is enqueued, or the
+        resource sampler lifts throttling, and starts items in the order
+        chosen by the fair scheduler. Pending rows are only re-read from the
+        database after it has been written to.
+        """
         logger.info("Starting download queue processing")
+        self.dispatch_event.set()
         
         while self.running and not self.shutdown_event.is_set():
             try:
-                # Get system resources
-                self.system_resources = await self.get_system_resources()
+                await self.dispatch_event.wait()
+                self.dispatch_event.clear()
                 
-                # Check if system resources allow more downloads
-                if self._should_throttle_downloads():
-                    logger.info("Throttling downloads due to system resources")
-                    await asyncio.sleep(30)
-                    continue
+                if self.shutdown_event.is_set():
+                    break
                 
-                # Get available download slots
-                available_slots = self.max_concurrent_downloads - len(self.active_downloads)
+                await self._dispatch_downloads()
                 
-                if available_slots > 0:
-                    # Get pending downloads
-                    pending_downloads = self.get_pending_downloads(limit=available_slots)
-                    
-                    # Start new downloads
-                    for download in pending_downloads:
-                        if available_slots > 0:
-                            await self.start_download(download)
-                            available_slots -= 1
-                        else:
-                            break
+            except Exception as e:
+                logger.error(f"Error in download queue processing: {e}")
+                await asyncio.sleep(1)
+    
+    async def _dispatch_downloads(self):
+        """Fill free download slots in fair-scheduler order."""
+        if self._should_throttle_downloads():
+            logger.info("Throttling downloads due to system resources")
+            return
+        
+        if self._queue_changed:
+            self.sync_scheduler()
+        
+        available_slots = self.max_concurrent_downloads - len(self.active_downloads)
+        
+        while available_slots > 0:
+            download = self.scheduler.pop_next()
+            if download is None:
+                break
+            
+            if await self.start_download(download):
+                available_slots -= 1
+            else:
+                self.scheduler.release(download.id)
+    
+    async def _resource_sampler(self):
+        """Background resource sampling so dispatch decisions never block on psutil."""
+        was_throttled = False
+        
+        while self.running and not self.shutdown_event.is_set():
+            try:
+                self.system_resources = await self.get_system_resources()
+                throttled = self._should_throttle_downloads()
+                if was_throttled and not throttled:
+                    self.dispatch_event.set()
+                was_throttled = throttled
+            except Exception as e:
+                logger.error(f"Error sampling system resources: {e}")
+            
+            try:
+                await asyncio.wait_for(self.shutdown_event.wait(), timeout=self.resource_sample_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    async def _watch_for_enqueues(self):
+        """Wake the dispatcher when another connection changes pending downloads.
+        
+        PRAGMA data_version changes whenever a different connection (e.g. the
+        API server enqueuing a download) commits, so checking it costs no
+        table access at all. Commits that did not touch pending rows, such
+        as this process's own progress and lease writes, leave the change
+        log's sequence alone and are ignored.
+        """
+        conn = self.get_database_connection()
+        try:
+            last_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            last_change = self._latest_queue_change(conn)
+            
+            while self.running and not self.shutdown_event.is_set():
+                try:
+                    await asyncio.wait_for(self.shutdown_event.wait(), timeout=self.enqueue_poll_interval)
+                except asyncio.TimeoutError:
+                    pass
                 
+                version = conn.execute("PRAGMA data_version").fetchone()[0]
+                if version == last_version:
+                    continue
+                last_version = version
+                
+                change = self._latest_queue_change(conn)
+                if change != last_change:
+                    last_change = change
+                    self._queue_changed = True
+                    if len(self.active_downloads) < self.max_concurrent_downloads:
+                        self.dispatch_event.set()
+        except Exception as e:
+            logger.error(f"Error watching for enqueued downloads: {e}")
+        finally:
+            conn.close()
+    
+    async def _periodic_retry_and_recovery(self):
+        """Feed retry-eligible failures into the scheduler and recover abandoned downloads."""
+        while self.running and not self.shutdown_event.is_set():
+            try:
                 # Process retries
                 failed_downloads = self.get_failed_downloads_for_retry()
-                for download in failed_downloads[:available_slots]:
-                    await self.start_download(download)
+                for download in failed_downloads:
+                    self.scheduler.push(download)
+                if failed_downloads:
+                    self.dispatch_event.set()
+                
+                # Return downloads abandoned by crashed or partitioned instances
+                if self.reclaim_expired_leases():
+                    self._queue_changed = True
+                    self.dispatch_event.set()
                 
                 # Handle stale downloads
                 stale_downloads = self.get_stale_downloads()
@@ -687,13 +1417,16 @@ class AdvancedQueueManager:
                     if download.id in self.active_downloads:
                         self.active_downloads[download.id].cancel()
                         del self.active_downloads[download.id]
-                
-                # Wait before next iteration
-                await asyncio.sleep(10)
+                if stale_downloads:
+                    self.dispatch_event.set()
                 
             except Exception as e:
-                logger.error(f"Error in download queue processing: {e}")
-                await asyncio.sleep(30)
+                logger.error(f"Error processing retries and stale downloads: {e}")
+            
+            try:
+                await asyncio.wait_for(self.shutdown_event.wait(), timeout=self.retry_check_interval)
+            except asyncio.TimeoutError:
+                pass
     
     def _should_throttle_downloads(self) -> bool:
         """Check if downloads should be throttled based on system resources."""
@@ -711,109 +1444,75 @@ class AdvancedQueueManager:
         return False
     
     async def cleanup_old_downloads(self, days_old: int = 30):
-        """Clean up old completed/cancelled downloads."""
+        """Archive old completed/cancelled downloads."""
         try:
+            loop = asyncio.get_event_loop()
+            
+            # Archive completed downloads
+            completed_archived = await loop.run_in_executor(
+                None, self.archiver.archive_rows, 'download_queue',
+                "status = 'completed' AND completed_at < datetime('now', ?)", (f'-{days_old} days',)
+            )
+            
+            # Archive cancelled downloads (shorter retention)
+            cancelled_archived = await loop.run_in_executor(
+                None, self.archiver.archive_rows, 'download_queue',
+                "status = 'cancelled' AND updated_at < datetime('now', '-7 days')"
+            )
+            
+            # Archive failed downloads that exceeded max retries
+            failed_archived = await loop.run_in_executor(
+                None, self.archiver.archive_rows, 'download_queue',
+                "status = 'failed' AND retry_count >= max_retries AND updated_at < datetime('now', '-3 days')"
+            )
+            
+            total_archived = completed_archived + cancelled_archived + failed_archived
+            if total_archived > 0:
+                logger.info(f"Archived {total_archived} old downloads "
+                           f"(completed: {completed_archived}, cancelled: {cancelled_archived}, failed: {failed_archived})")
+            
+            # Schedulers lagging further behind than this fall back to a full sync
             with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Clean up completed downloads
-                cursor.execute("""
-                    DELETE FROM download_queue 
-                    WHERE status = 'completed' 
-                    AND completed_at < datetime('now', '-{} days')
-                """.format(days_old))
-                
-                completed_deleted = cursor.rowcount
-                
-                # Clean up cancelled downloads (shorter retention)
-                cursor.execute("""
-                    DELETE FROM download_queue 
-                    WHERE status = 'cancelled' 
-                    AND updated_at < datetime('now', '-7 days')
-                """)
-                
-                cancelled_deleted = cursor.rowcount
-                
-                # Clean up failed downloads that exceeded max retries
-                cursor.execute("""
-                    DELETE FROM download_queue 
-                    WHERE status = 'failed' 
-                    AND retry_count >= max_retries
-                    AND updated_at < datetime('now', '-3 days')
-                """)
-                
-                failed_deleted = cursor.rowcount
-                
+                conn.execute("DELETE FROM download_queue_changes WHERE created_at < datetime('now', '-1 day')")
                 conn.commit()
                 
-                total_deleted = completed_deleted + cancelled_deleted + failed_deleted
-                if total_deleted > 0:
-                    logger.info(f"Cleaned up {total_deleted} old downloads "
-                               f"(completed: {completed_deleted}, cancelled: {cancelled_deleted}, failed: {failed_deleted})")
-                
         except Exception as e:
             logger.error(f"Error cleaning up old downloads: {e}")
     
     async def optimize_queue_priorities(self):
         """Optimize queue priorities based on various factors."""
         try:
-            with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                
-                updated_count = 0
-                
+            raise_priority = "priority = CASE WHEN priority > 1 THEN priority - 1 ELSE 1 END, updated_at = datetime('now')"
+            lower_priority = "priority = CASE WHEN priority < 10 THEN priority + 1 ELSE 10 END, updated_at = datetime('now')"
+            waiting_cutoff = (datetime.utcnow() - timedelta(hours=2)).strftime('%Y-%m-%d %H:%M:%S')
+
+            updates = [
                 # Boost priority for downloads waiting too long
-                cursor.execute("""
-                    UPDATE download_queue 
-                    SET priority = CASE 
-                        WHEN priority > 1 THEN priority - 1 
-                        ELSE 1 
-                    END,
-                    updated_at = datetime('now')
-                    WHERE status = 'pending' 
-                    AND created_at < datetime('now', '-2 hours')
-                    AND priority > 1
-                """)
-                
-                updated_count += cursor.rowcount
-                
+                (raise_priority, "status = 'pending' AND created_at < ? AND priority > 1", (waiting_cutoff,)),
                 # Lower priority for repeatedly failed downloads
-                cursor.execute("""
-                    UPDATE download_queue 
-                    SET priority = CASE 
-                        WHEN priority < 10 THEN priority + 1 
-                        ELSE 10 
-                    END,
-                    updated_at = datetime('now')
-                    WHERE status = 'failed' 
-                    AND retry_count >= 2
-                    AND priority < 10
-                """)
-                
-                updated_count += cursor.rowcount
-                
-                # Prioritize smaller files during high load
-                if len(self.active_downloads) >= self.max_concurrent_downloads * 0.8:
-                    cursor.execute("""
-                        UPDATE download_queue 
-                        SET priority = CASE 
-                            WHEN priority > 1 THEN priority - 1 
-                            ELSE 1 
-                        END,
-                        updated_at = datetime('now')
-                        WHERE status = 'pending' 
-                        AND file_size_bytes IS NOT NULL
-                        AND file_size_bytes < 10000000  -- 10MB
-                        AND priority > 1
-                    """)
-                    
-                    updated_count += cursor.rowcount
-                
-                conn.commit()
-                
-                if updated_count > 0:
-                    logger.info(f"Optimized priorities for {updated_count} downloads")
-                
+                (lower_priority, "status = 'failed' AND retry_count >= 2 AND priority < 10", ()),
+            ]
+
+            # Prioritize smaller files during high load
+            if len(self.active_downloads) >= self.max_concurrent_downloads * 0.8:
+                updates.append((
+                    raise_priority,
+                    "status = 'pending' AND file_size_bytes IS NOT NULL AND file_size_bytes < 10000000 AND priority > 1",
+                    ()
+                ))
+
+            # Chunked so the Go backend's writes are never stuck behind a long transaction
+            loop = asyncio.get_event_loop()
+            updated_count = 0
+            for set_clause, where, params in updates:
+                progress = await loop.run_in_executor(
+                    self.executor, self.bulk_executor.update, 'download_queue', set_clause, where, params
+                )
+                updated_count += progress.rows_affected
+
+            if updated_count > 0:
+                logger.info(f"Optimized priorities for {updated_count} downloads")
+
         except Exception as e:
             logger.error(f"Error optimizing queue priorities: {e}")
     
@@ -879,6 +1578,9 @@ class AdvancedQueueManager:
                 "metrics": asdict(metrics),
                 "system_resources": asdict(self.system_resources),
                 "active_downloads": len(self.active_downloads),
+                "bandwidth_by_indexer_mbps": self.bandwidth_monitor.get_indexer_usage(),
+                "scheduler": self.scheduler.get_status(),
+                "performance_history_hourly": self.performance_history.query(step_seconds=3600),
                 "analytics": {
                     "daily_trends": trends,
                     "indexer_performance": indexer_performance,
@@ -923,6 +1625,9 @@ class AdvancedQueueManager:
             await self._vacuum_database()
             maintenance_results["actions_taken"].append("Performed database vacuum")
             
+            # Cleanup deleted rows behind the metrics model's back
+            self.reconcile_metrics()
+            
             logger.info(f"Maintenance cycle completed. {len(maintenance_results['actions_taken'])} actions taken")
             
         except Exception as e:
@@ -986,6 +1691,7 @@ class AdvancedQueueManager:
         logger.info("Shutting down Advanced Queue Manager")
         self.running = False
         self.shutdown_event.set()
+        self.dispatch_event.set()
         
         # Cancel all active downloads
         for download_id, task in self.active_downloads.items():
@@ -1002,8 +1708,16 @@ class AdvancedQueueManager:
         
         logger.info("Advanced Queue Manager starting up")
         
+        # Hydrate the scheduler before the first dispatch
+        self.sync_scheduler()
+        
         tasks = [
             asyncio.create_task(self.process_download_queue()),
+            asyncio.create_task(self._resource_sampler()),
+            asyncio.create_task(self._watch_for_enqueues()),
+            asyncio.create_task(self._periodic_retry_and_recovery()),
+            asyncio.create_task(self._renew_leases_periodically()),
+            asyncio.create_task(self.progress_reporter.run(self.shutdown_event)),
             asyncio.create_task(self._periodic_maintenance()),
             asyncio.create_task(self._periodic_metrics_collection())
         ]
@@ -1031,40 +1745,750 @@ class AdvancedQueueManager:
             try:
                 await asyncio.sleep(self.metrics_collection_interval)
                 if not self.shutdown_event.is_set():
-                    metrics = self.get_queue_metrics()
-                    self.performance_history.append({
-                        "timestamp": datetime.now().isoformat(),
-                        "metrics": asdict(metrics)
-                    })
+                    if self.metrics_model.seconds_since_reconcile() >= self.metrics_reconcile_interval:
+                        loop = asyncio.get_running_loop()
+                        await loop.run_in_executor(self.executor, self.reconcile_metrics)
                     
-                    # Keep only last 24 hours of metrics
-                    cutoff = datetime.now() - timedelta(hours=24)
-                    self.performance_history = [
-                        m for m in self.performance_history
-                        if datetime.fromisoformat(m["timestamp"]) > cutoff
-                    ]
+                    # The ring overwrites its oldest sample, so no trimming is needed
+                    self.performance_history.append(self.get_queue_metrics())
                     
             except Exception as e:
                 logger.error(f"Error in metrics collection: {e}")
 
 
+class QueueMetricsModel:
+    """Queue metrics maintained incrementally from state transitions.
+    
+    Status counters move as this process claims and finishes downloads,
+    completions in the last hour sit in a deque of timestamps, and the
+    24-hour success rate is kept in a ring of per-minute buckets with
+    running totals, so every read is O(1) amortised. Completion time is an
+    EWMA. reconcile() replaces the whole state with values read from SQL.
+    """
+    
+    THROUGHPUT_WINDOW = 3600
+    OUTCOME_WINDOW = 86400
+    OUTCOME_BUCKET = 60
+    
+    def __init__(self, ewma_alpha: float = 0.2):
+        self.ewma_alpha = ewma_alpha
+        self.status_counts: Dict[str, int] = {}
+        self.avg_completion_time: Optional[float] = None
+        self.last_reconciled: Optional[float] = None
+        
+        self._completions: deque = deque()
+        self._slots = self.OUTCOME_WINDOW // self.OUTCOME_BUCKET
+        self._reset_outcomes()
+    
+    def _reset_outcomes(self):
+        self._succeeded = [0] * self._slots
+        self._failed = [0] * self._slots
+        self._succeeded_total = 0
+        self._failed_total = 0
+        self._head_bucket: Optional[int] = None
+    
+    def _advance(self, now: float):
+        """Move the ring head to the current minute, expiring buckets that fell out of the window."""
+        current = int(now // self.OUTCOME_BUCKET)
+        if self._head_bucket is None:
+            self._head_bucket = current
+            return
+        if current <= self._head_bucket:
+            return
+        
+        # At most one full lap of the ring, however long we have been idle
+        for bucket_id in range(max(self._head_bucket + 1, current - self._slots + 1), current + 1):
+            slot = bucket_id % self._slots
+            self._succeeded_total -= self._succeeded[slot]
+            self._failed_total -= self._failed[slot]
+            self._succeeded[slot] = self._failed[slot] = 0
+        self._head_bucket = current
+    
+    def _record_outcome(self, succeeded: bool, when: float):
+        self._advance(when)
+        bucket_id = int(when // self.OUTCOME_BUCKET)
+        if bucket_id <= self._head_bucket - self._slots:
+            return
+        slot = bucket_id % self._slots
+        if succeeded:
+            self._succeeded[slot] += 1
+            self._succeeded_total += 1
+        else:
+            self._failed[slot] += 1
+            self._failed_total += 1
+    
+    def record_transition(self, old_status: Optional[str], new_status: str,
+                          duration: Optional[float] = None, now: Optional[float] = None):
+        """Apply one status change made by this process."""
+        now = now or time.time()
+        if old_status and self.status_counts.get(old_status, 0) > 0:
+            self.status_counts[old_status] -= 1
+        self.status_counts[new_status] = self.status_counts.get(new_status, 0) + 1
+        
+        if new_status == 'completed':
+            self._completions.append(now)
+            self._record_outcome(True, now)
+            if duration is not None:
+                if self.avg_completion_time is None:
+                    self.avg_completion_time = duration
+                else:
+                    self.avg_completion_time += self.ewma_alpha * (duration - self.avg_completion_time)
+        elif new_status == 'failed':
+            self._record_outcome(False, now)
+    
+    def reconcile(self, status_counts: Dict[str, int], completions: List[float],
+                  outcomes: List[Tuple[float, bool]], avg_completion_time: Optional[float] = None):
+        """Replace counters and windows with authoritative values."""
+        self.status_counts = dict(status_counts)
+        self._completions = deque(sorted(completions))
+        
+        self._reset_outcomes()
+        now = time.time()
+        self._advance(now)
+        for when, succeeded in outcomes:
+            if now - self.OUTCOME_WINDOW < when <= now:
+                self._record_outcome(succeeded, when)
+        
+        if self.avg_completion_time is None:
+            self.avg_completion_time = avg_completion_time
+        self.last_reconciled = time.monotonic()
+    
+    def seconds_since_reconcile(self) -> float:
+        if self.last_reconciled is None:
+            return float('inf')
+        return time.monotonic() - self.last_reconciled
+    
+    def throughput_last_hour(self, now: Optional[float] = None) -> int:
+        now = now or time.time()
+        while self._completions and self._completions[0] <= now - self.THROUGHPUT_WINDOW:
+            self._completions.popleft()
+        return len(self._completions)
+    
+    def success_rate(self, now: Optional[float] = None) -> float:
+        self._advance(now or time.time())
+        finished = self._succeeded_total + self._failed_total
+        return self._succeeded_total * 100.0 / finished if finished else 0.0
+    
+    def snapshot(self, max_concurrent: int, bandwidth_mbps: float) -> QueueMetrics:
+        now = time.time()
+        counts = self.status_counts
+        
+        estimated_completion = None
+        outstanding = counts.get('pending', 0) + counts.get('downloading', 0)
+        if self.avg_completion_time and outstanding > 0:
+            total_time_needed = (outstanding / max(1, max_concurrent)) * self.avg_completion_time
+            estimated_completion = datetime.now() + timedelta(seconds=total_time_needed)
+        
+        return QueueMetrics(
+            total_items=sum(counts.values()),
+            pending=counts.get('pending', 0),
+            downloading=counts.get('downloading', 0),
+            completed=counts.get('completed', 0),
+            failed=counts.get('failed', 0),
+            cancelled=counts.get('cancelled', 0),
+            paused=counts.get('paused', 0),
+            avg_completion_time=self.avg_completion_time,
+            success_rate=self.success_rate(now),
+            throughput_last_hour=self.throughput_last_hour(now),
+            bandwidth_usage_mbps=bandwidth_mbps,
+            estimated_completion_time=estimated_completion
+        )
+
+
+class MetricsHistory:
+    """Fixed-size ring of numeric QueueMetrics samples.
+    
+    Each field is a column in an array('d') with epoch-second timestamps,
+    so a day of per-minute samples takes about 140 KB and appending
+    overwrites the oldest slot instead of rebuilding a list. Missing values
+    (e.g. no average completion time yet) are stored as NaN.
+    """
+    
+    FIELDS = (
+        'total_items', 'pending', 'downloading', 'completed', 'failed', 'cancelled', 'paused',
+        'avg_completion_time', 'success_rate', 'throughput_last_hour', 'bandwidth_usage_mbps'
+    )
+    
+    def __init__(self, capacity: int = 1441):
+        self.capacity = capacity
+        self._timestamps = array.array('d', [0.0]) * capacity
+        self._columns = {field: array.array('d', [0.0]) * capacity for field in self.FIELDS}
+        self._next = 0
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def append(self, metrics: QueueMetrics, timestamp: Optional[float] = None):
+        slot = self._next
+        self._timestamps[slot] = timestamp if timestamp is not None else time.time()
+        for field, column in self._columns.items():
+            value = getattr(metrics, field)
+            column[slot] = math.nan if value is None else float(value)
+        
+        self._next = (slot + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+    
+    def _slots(self):
+        """Slot indices from oldest to newest."""
+        start = (self._next - self._size) % self.capacity
+        for i in range(self._size):
+            yield (start + i) % self.capacity
+    
+    def query(self, start: Optional[float] = None, end: Optional[float] = None,
+              step_seconds: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Samples between start and end (epoch seconds), optionally averaged into step-sized buckets."""
+        rows: List[Dict[str, Any]] = []
+        bucket_key = None
+        sums: Dict[str, float] = {}
+        counts: Dict[str, int] = {}
+        
+        def emit(timestamp: float, values: Dict[str, float], n: Dict[str, int]):
+            row: Dict[str, Any] = {'timestamp': timestamp}
+            for field in self.FIELDS:
+                row[field] = values[field] / n[field] if n.get(field) else None
+            rows.append(row)
+        
+        for slot in self._slots():
+            timestamp = self._timestamps[slot]
+            if (start is not None and timestamp < start) or (end is not None and timestamp > end):
+                continue
+            
+            if not step_seconds:
+                emit(timestamp, {f: self._columns[f][slot] for f in self.FIELDS},
+                     {f: 0 if math.isnan(self._columns[f][slot]) else 1 for f in self.FIELDS})
+                continue
+            
+            key = timestamp // step_seconds
+            if key != bucket_key:
+                if bucket_key is not None:
+                    emit(bucket_key * step_seconds, sums, counts)
+                bucket_key = key
+                sums = {f: 0.0 for f in self.FIELDS}
+                counts = {f: 0 for f in self.FIELDS}
+            for field in self.FIELDS:
+                value = self._columns[field][slot]
+                if not math.isnan(value):
+                    sums[field] += value
+                    counts[field] += 1
+        
+        if step_seconds and bucket_key is not None:
+            emit(bucket_key * step_seconds, sums, counts)
+        return rows
+
+
+class FairScheduler:
+    """In-memory dispatch order for queued downloads.
+    
+    Each user's items sit in per-indexer heaps ordered like the SQL queue
+    (priority, first attempts before retries, then age). Users are served by
+    weighted fair queueing: each dispatch advances the user's virtual time by
+    1/weight and the user with the lowest virtual time goes next, so a user
+    with a deep backlog cannot starve everyone else. Indexers at their
+    concurrency cap are passed over until one of their downloads finishes.
+    """
+    
+    def __init__(self, user_weights: Optional[Dict] = None, per_indexer_max: Optional[int] = None,
+                 indexer_limits: Optional[Dict] = None):
+        self.user_weights = {int(k): float(v) for k, v in (user_weights or {}).items()}
+        self.per_indexer_max = per_indexer_max
+        self.indexer_limits = {int(k): int(v) for k, v in (indexer_limits or {}).items()}
+        
+        self._queues: Dict[int, Dict[int, List[list]]] = {}
+        self._entries: Dict[int, list] = {}
+        self._user_pending: Dict[int, int] = {}
+        self._virtual_time: Dict[int, float] = {}
+        self._global_virtual_time = 0.0
+        self._running: Dict[int, int] = {}
+        self._indexer_active: Dict[int, int] = {}
+    
+    @staticmethod
+    def _order_key(download: DownloadTask) -> Tuple:
+        return (download.priority, 0 if download.retry_count == 0 else 1, download.created_at, download.id)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, download_id: int) -> bool:
+        return download_id in self._entries
+    
+    def _indexer_limit(self, indexer_id: int) -> Optional[int]:
+        return self.indexer_limits.get(indexer_id, self.per_indexer_max)
+    
+    def _indexer_has_capacity(self, indexer_id: int) -> bool:
+        limit = self._indexer_limit(indexer_id)
+        return limit is None or self._indexer_active.get(indexer_id, 0) < limit
+    
+    def push(self, download: DownloadTask):
+        """Queue a download, or re-order it if its priority changed."""
+        if download.id in self._running:
+            return
+        
+        key = self._order_key(download)
+        current = self._entries.get(download.id)
+        if current is not None:
+            if current[0] == key:
+                current[1] = download
+                return
+            self.discard(download.id)
+        
+        user_id = download.user_id
+        if not self._user_pending.get(user_id):
+            # A user returning from idle starts at the current virtual time
+            # instead of cashing in credit accumulated while absent
+            self._virtual_time[user_id] = max(self._virtual_time.get(user_id, 0.0), self._global_virtual_time)
+        
+        entry = [key, download, True]
+        self._entries[download.id] = entry
+        self._user_pending[user_id] = self._user_pending.get(user_id, 0) + 1
+        heapq.heappush(self._queues.setdefault(user_id, {}).setdefault(download.indexer_id, []), entry)
+    
+    def discard(self, download_id: int):
+        """Drop a queued download; its heap slot is removed lazily."""
+        entry = self._entries.pop(download_id, None)
+        if entry is None:
+            return
+        entry[2] = False
+        user_id = entry[1].user_id
+        self._user_pending[user_id] -= 1
+        if not self._user_pending[user_id]:
+            del self._user_pending[user_id]
+            del self._queues[user_id]
+    
+    def apply_changes(self, changed_ids: Set[int], pending: List[DownloadTask]):
+        """Apply a partial update: changed_ids were touched, pending are those still pending."""
+        pending_ids = {download.id for download in pending}
+        for download_id in changed_ids - pending_ids:
+            entry = self._entries.get(download_id)
+            if entry is not None and entry[1].status == QueueStatus.PENDING:
+                self.discard(download_id)
+        for download in pending:
+            self.push(download)
+    
+    def sync(self, pending: List[DownloadTask]):
+        """Reconcile with the authoritative list of pending rows."""
+        pending_ids = {download.id for download in pending}
+        for download_id, entry in list(self._entries.items()):
+            # Retry candidates are pushed separately and are not 'pending' in SQL
+            if entry[1].status == QueueStatus.PENDING and download_id not in pending_ids:
+                self.discard(download_id)
+        for download in pending:
+            self.push(download)
+    
+    def _head(self, heap: List[list]) -> Optional[list]:
+        while heap and not heap[0][2]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+    
+    def pop_next(self) -> Optional[DownloadTask]:
+        """Take the next download to start, or None if nothing is eligible."""
+        for user_id in sorted(self._user_pending, key=lambda u: (self._virtual_time[u], u)):
+            best = None
+            for indexer_id, heap in self._queues[user_id].items():
+                head = self._head(heap)
+                if head is None or not self._indexer_has_capacity(indexer_id):
+                    continue
+                if best is None or head[0] < best[0]:
+                    best = head
+            
+            if best is None:
+                continue
+            
+            download = best[1]
+            self.discard(download.id)
+            self._running[download.id] = download.indexer_id
+            self._indexer_active[download.indexer_id] = self._indexer_active.get(download.indexer_id, 0) + 1
+            
+            self._global_virtual_time = self._virtual_time[user_id]
+            self._virtual_time[user_id] += 1.0 / self.user_weights.get(user_id, 1.0)
+            return download
+        
+        return None
+    
+    def release(self, download_id: int):
+        """Free the indexer slot held by a started download."""
+        indexer_id = self._running.pop(download_id, None)
+        if indexer_id is not None:
+            self._indexer_active[indexer_id] -= 1
+    
+    def get_status(self) -> Dict[str, Any]:
+        return {
+            'queued': len(self._entries),
+            'queued_by_user': dict(self._user_pending),
+            'active_by_indexer': {k: v for k, v in self._indexer_active.items() if v}
+        }
+
+
+class ChunkWriter:
+    """Writes download data on a dedicated thread, hashing it inline.
+    
+    Batches of chunks are written with pwritev, so the event loop never
+    blocks on disk and received buffers are never joined. Data landing in
+    order from the start of the file is fed to SHA-256 as it is written;
+    out-of-order writes (segmented downloads) disable the inline digest.
+    At most max_pending batches are in flight, which bounds memory use.
+    """
+    
+    def __init__(self, path: Path, total_size: Optional[int] = None, resume_from: int = 0,
+                 max_pending: int = 4):
+        flags = os.O_RDWR | os.O_CREAT
+        if total_size is None and not resume_from:
+            flags |= os.O_TRUNC
+        self.fd = os.open(path, flags, 0o644)
+        self.max_pending = max_pending
+        self.committed = resume_from
+        
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='download-writer')
+        self._pending: deque = deque()
+        self._hasher = hashlib.sha256()
+        self._hashed_to = 0
+        self._hash_valid = True
+        self._closed = False
+        self.head = bytearray()
+        
+        if resume_from:
+            self._pending.append(self._thread.submit(self._hash_existing, resume_from))
+        if total_size:
+            self._pending.append(self._thread.submit(self._preallocate, total_size))
+    
+    def _hash_existing(self, length: int):
+        """Hash data kept from an earlier attempt so the digest covers the whole file."""
+        while self._hashed_to < length:
+            data = os.pread(self.fd, min(WRITE_CHUNK_MAX, length - self._hashed_to), self._hashed_to)
+            if not data:
+                self._hash_valid = False
+                return
+            if self._hashed_to < SNIFF_BYTES:
+                self.head += data[:SNIFF_BYTES - self._hashed_to]
+            self._hasher.update(data)
+            self._hashed_to += len(data)
+    
+    def _preallocate(self, total_size: int):
+        """Reserve disk blocks up front to avoid fragmentation and late ENOSPC."""
+        if os.fstat(self.fd).st_size > total_size:
+            os.ftruncate(self.fd, total_size)
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self.fd, 0, total_size)
+                return
+            except OSError:
+                pass
+        if os.fstat(self.fd).st_size < total_size:
+            os.ftruncate(self.fd, total_size)
+    
+    def _write(self, chunks: List[bytes], offset: int, on_written):
+        if hasattr(os, 'pwritev'):
+            written = os.pwritev(self.fd, chunks, offset)
+            expected = sum(len(chunk) for chunk in chunks)
+            if written < expected:
+                data = b''.join(chunks)
+                while written < expected:
+                    written += os.pwrite(self.fd, data[written:], offset + written)
+        else:
+            data = b''.join(chunks)
+            written = 0
+            while written < len(data):
+                written += os.pwrite(self.fd, data[written:], offset + written)
+        
+        if offset == 0:
+            for chunk in chunks:
+                if len(self.head) >= SNIFF_BYTES:
+                    break
+                self.head += chunk[:SNIFF_BYTES - len(self.head)]
+        
+        if self._hash_valid and offset == self._hashed_to:
+            for chunk in chunks:
+                self._hasher.update(chunk)
+            self._hashed_to += written
+        else:
+            self._hash_valid = False
+        
+        self.committed = max(self.committed, offset + written)
+        if on_written is not None:
+            on_written(written)
+    
+    async def write(self, chunks: List[bytes], offset: int, on_written=None):
+        """Queue a batch for writing at offset; waits only when too many batches are in flight."""
+        self._pending.append(self._thread.submit(self._write, chunks, offset, on_written))
+        while len(self._pending) > self.max_pending:
+            await asyncio.wrap_future(self._pending.popleft())
+    
+    async def _drain(self):
+        while self._pending:
+            await asyncio.wrap_future(self._pending.popleft())
+    
+    async def close(self) -> Optional[str]:
+        """Wait for outstanding writes and return the hex digest if it covers the whole file."""
+        await self._drain()
+        return self._hasher.hexdigest() if self._hash_valid else None
+    
+    def truncate(self, length: int):
+        """Drop any preallocated space beyond the data actually received."""
+        if os.fstat(self.fd).st_size > length:
+            os.ftruncate(self.fd, length)
+    
+    async def abort(self):
+        """Release the file and writer thread, letting in-flight writes finish first."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await asyncio.shield(asyncio.gather(
+                *(asyncio.wrap_future(f) for f in self._pending), return_exceptions=True
+            ))
+        finally:
+            self._pending.clear()
+            self._thread.shutdown(wait=True)
+            os.close(self.fd)
+    
+    @staticmethod
+    def hash_file(path: Path) -> Tuple[str, bytes]:
+        """SHA-256 and leading bytes of a file on disk, for data that could not be hashed inline."""
+        hasher = hashlib.sha256()
+        head = b''
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(WRITE_CHUNK_MAX), b''):
+                if not head:
+                    head = block[:SNIFF_BYTES]
+                hasher.update(block)
+        return hasher.hexdigest(), head
+
+
+class ProgressReporter:
+    """Coalesces download progress updates into periodic batched writes.
+    
+    report() is called for every chunk but only marks a download dirty when
+    its whole-percent progress changes, or when heartbeat_seconds have passed
+    so updated_at keeps moving for slow transfers. A single background task
+    writes all dirty downloads in one transaction every flush_interval_ms.
+    The in-memory view returned by get_live_progress is always current.
+    """
+    
+    def __init__(self, connection_factory, executor: ThreadPoolExecutor,
+                 flush_interval_ms: int = 1000, heartbeat_seconds: float = 30):
+        self.connection_factory = connection_factory
+        self.executor = executor
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.heartbeat_seconds = heartbeat_seconds
+        
+        self.live: Dict[int, Dict[str, Any]] = {}
+        self._dirty: Dict[int, int] = {}
+    
+    def report(self, download_id: int, downloaded: int, total: int):
+        """Record progress for a download; cheap enough to call for every chunk."""
+        now = time.monotonic()
+        state = self.live.get(download_id)
+        if state is None:
+            state = self.live[download_id] = {
+                'downloaded_bytes': 0,
+                'total_bytes': total or None,
+                'percentage': 0,
+                'started': now,
+                'last_emitted': now,
+                'emitted_percentage': -1
+            }
+        
+        state['downloaded_bytes'] = downloaded
+        state['updated'] = now
+        if total > 0:
+            state['percentage'] = min(100, int(downloaded * 100 / total))
+        
+        if (state['percentage'] != state['emitted_percentage'] or 
+                now - state['last_emitted'] >= self.heartbeat_seconds):
+            state['emitted_percentage'] = state['percentage']
+            state['last_emitted'] = now
+            self._dirty[download_id] = state['percentage']
+    
+    def finish(self, download_id: int):
+        """Forget a download whose final state is written elsewhere."""
+        self.live.pop(download_id, None)
+        self._dirty.pop(download_id, None)
+    
+    def get_live_progress(self, download_id: Optional[int] = None) -> Dict:
+        """In-memory progress snapshot for consumers needing sub-second freshness."""
+        now = time.monotonic()
+        
+        def view(state: Dict[str, Any]) -> Dict[str, Any]:
+            elapsed = max(now - state['started'], 1e-6)
+            return {
+                'downloaded_bytes': state['downloaded_bytes'],
+                'total_bytes': state['total_bytes'],
+                'percentage': state['percentage'],
+                'bytes_per_second': state['downloaded_bytes'] / elapsed
+            }
+        
+        if download_id is not None:
+            state = self.live.get(download_id)
+            return view(state) if state else {}
+        return {did: view(state) for did, state in self.live.items()}
+    
+    def _write_batch(self, rows: List[Tuple[int, str, int]]):
+        with self.connection_factory() as conn:
+            conn.executemany("""
+                UPDATE download_queue 
+                SET progress_percentage = ?, updated_at = ?
+                WHERE id = ? AND status = 'downloading'
+            """, rows)
+    
+    async def flush(self):
+        """Write all pending progress changes in a single transaction."""
+        if not self._dirty:
+            return
+        
+        dirty, self._dirty = self._dirty, {}
+        timestamp = datetime.now().isoformat()
+        rows = [(percentage, timestamp, download_id) for download_id, percentage in dirty.items()]
+        
+        try:
+            try:
+                loop = asyncio.get_running_loop()
+                await loop.run_in_executor(self.executor, self._write_batch, rows)
+            except RuntimeError:
+                # Executor already shut down (final flush during shutdown)
+                self._write_batch(rows)
+        except Exception as e:
+            logger.error(f"Error writing download progress: {e}")
+            # Newer reports since the swap take precedence over the failed batch
+            for download_id, percentage in dirty.items():
+                if download_id in self.live:
+                    self._dirty.setdefault(download_id, percentage)
+    
+    async def run(self, shutdown_event: asyncio.Event):
+        """Flush loop; performs a final flush on shutdown."""
+        while not shutdown_event.is_set():
+            try:
+                await asyncio.wait_for(shutdown_event.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+
+class TokenBucket:
+    """Token bucket that hands out byte reservations at a fixed rate.
+    
+    Reservations may drive the balance negative; the caller then waits for
+    the debt to be repaid, which keeps long-run throughput at the configured
+    rate while still allowing bursts up to the bucket capacity.
+    """
+    
+    def __init__(self, rate_bytes_per_sec: float, burst_seconds: float = 1.0):
+        self.rate = rate_bytes_per_sec
+        self.capacity = max(rate_bytes_per_sec * burst_seconds, 64 * 1024)
+        self.tokens = self.capacity
+        self.last_refill = time.monotonic()
+    
+    def reserve(self, nbytes: int, now: float) -> float:
+        """Take nbytes from the bucket and return how long to wait before sending them."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        self.tokens -= nbytes
+        
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class RateMeter:
+    """Exponentially weighted moving average of a byte rate."""
+    
+    def __init__(self, time_constant: float = 5.0, sample_interval: float = 0.5):
+        self.time_constant = time_constant
+        self.sample_interval = sample_interval
+        self.rate = 0.0
+        self.pending_bytes = 0
+        self.window_start = time.monotonic()
+    
+    def add(self, nbytes: int, now: float):
+        self.pending_bytes += nbytes
+        self._fold(now)
+    
+    def current(self, now: float) -> float:
+        """Current rate in bytes/second, decaying towards zero while idle."""
+        self._fold(now)
+        return self.rate
+    
+    def _fold(self, now: float):
+        elapsed = now - self.window_start
+        if elapsed < self.sample_interval:
+            return
+        
+        sample = self.pending_bytes / elapsed
+        alpha = 1.0 - math.exp(-elapsed / self.time_constant)
+        self.rate += alpha * (sample - self.rate)
+        self.pending_bytes = 0
+        self.window_start = now
+
+
 class BandwidthMonitor:
-    """Monitor and control bandwidth usage for downloads."""
+    """Monitor and control bandwidth usage for downloads.
     
-    def __init__(self):
-        self.current_usage = 0.0
-        self.last_check = time.time()
+    Shaping is hierarchical: every chunk is charged against the global bucket
+    and against its indexer's bucket, and the download waits for whichever
+    is further in debt. Limits are in megabits per second; 0/None disables
+    a level.
+    """
+    
+    def __init__(self, global_limit_mbps: Optional[float] = None,
+                 per_indexer_limit_mbps: Optional[float] = None,
+                 indexer_limits_mbps: Optional[Dict[int, float]] = None):
+        self.global_bucket = self._make_bucket(global_limit_mbps)
+        self.per_indexer_limit_mbps = per_indexer_limit_mbps
+        self.indexer_limits_mbps = {int(k): v for k, v in (indexer_limits_mbps or {}).items()}
+        self.indexer_buckets: Dict[int, Optional[TokenBucket]] = {}
+        
+        self.global_meter = RateMeter()
+        self.indexer_meters: Dict[int, RateMeter] = {}
         self.bytes_transferred = 0
     
+    @staticmethod
+    def _make_bucket(limit_mbps: Optional[float]) -> Optional[TokenBucket]:
+        if not limit_mbps or limit_mbps <= 0:
+            return None
+        return TokenBucket(limit_mbps * 1_000_000 / 8)
+    
+    def _indexer_bucket(self, indexer_id: int) -> Optional[TokenBucket]:
+        if indexer_id not in self.indexer_buckets:
+            limit = self.indexer_limits_mbps.get(indexer_id, self.per_indexer_limit_mbps)
+            self.indexer_buckets[indexer_id] = self._make_bucket(limit)
+        return self.indexer_buckets[indexer_id]
+    
     def get_current_usage(self) -> float:
         """Get current bandwidth usage in Mbps."""
-        return self.current_usage
+        return self.global_meter.current(time.monotonic()) * 8 / 1_000_000
+    
+    def get_indexer_usage(self) -> Dict[int, float]:
+        """Get current bandwidth usage per indexer in Mbps."""
+        now = time.monotonic()
+        return {
+            indexer_id: meter.current(now) * 8 / 1_000_000
+            for indexer_id, meter in self.indexer_meters.items()
+        }
     
-    async def throttle_if_needed(self):
-        """Throttle if bandwidth limit is exceeded."""
-        # This is a simplified implementation
-        # In a real scenario, you'd implement proper bandwidth monitoring
-        pass
+    async def throttle_if_needed(self, indexer_id: Optional[int] = None, nbytes: int = 0):
+        """Account for nbytes received and sleep if a bandwidth limit is exceeded."""
+        if nbytes <= 0:
+            return
+        
+        now = time.monotonic()
+        self.bytes_transferred += nbytes
+        self.global_meter.add(nbytes, now)
+        
+        delay = 0.0
+        if self.global_bucket:
+            delay = self.global_bucket.reserve(nbytes, now)
+        
+        if indexer_id is not None:
+            meter = self.indexer_meters.get(indexer_id)
+            if meter is None:
+                meter = self.indexer_meters[indexer_id] = RateMeter()
+            meter.add(nbytes, now)
+            
+            bucket = self._indexer_bucket(indexer_id)
+            if bucket:
+                delay = max(delay, bucket.reserve(nbytes, now))
+        
+        if delay > 0:
+            await asyncio.sleep(delay)
 
 
 def main():
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+FolioFox Failure Classifier
+Shared, compiled classification of download failure messages and log error lines.
+"""
+
+import re
+from collections import OrderedDict, defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Ordered failure categories; when a message matches several, the first wins.
+# Values line up with RetryReason in retry_manager.py.
+DOWNLOAD_FAILURE_RULES: List[Tuple[str, List[str]]] = [
+    ('network_error', ['connection refused', 'network unreachable', 'dns lookup failed', 'connection reset']),
+    ('timeout', ['timeout', 'deadline exceeded', 'request timeout']),
+    ('server_error', ['500', '502', '503', '504', 'internal server error', 'bad gateway']),
+    ('rate_limited', ['429', 'rate limit', 'too many requests', 'quota exceeded']),
+    ('indexer_down', ['indexer unavailable', 'indexer offline', 'indexer maintenance']),
+    ('file_corrupted', ['checksum mismatch', 'corrupted file', 'invalid file format']),
+    ('disk_full', ['no space left', 'disk full', 'insufficient space']),
+    ('permission_error', ['permission denied', 'access denied', 'forbidden']),
+]
+
+# Messages that mean the file is gone for good, whatever else they mention
+PERMANENT_FAILURE_KEYWORDS = ['404', 'not found', 'removed', 'deleted', 'unavailable']
+
+# Log error signatures: (label, anchor literal, extractor); the extractor only
+# runs when its anchor occurs in the line
+LOG_ERROR_RULES: List[Tuple[str, str, str]] = [
+    ('FileNotFoundError', 'filenotfounderror', r'FileNotFoundError.*?([a-zA-Z0-9_/\\.]+)'),
+    ('ConnectionError', 'connectionerror', r'ConnectionError.*?(connection|timeout|refused)'),
+    ('PermissionError', 'permissionerror', r'PermissionError.*?(permission|access)'),
+    ('ValueError', 'valueerror', r'ValueError.*?(invalid|value|format)'),
+    ('KeyError', 'keyerror', r'KeyError.*?[\'"]([a-zA-Z0-9_]+)[\'"]'),
+    ('AttributeError', 'attributeerror', r'AttributeError.*?[\'"]([a-zA-Z0-9_]+)[\'"]'),
+    ('ImportError', 'importerror', r'ImportError.*?[\'"]([a-zA-Z0-9_.]+)[\'"]'),
+    ('SQLite', 'sqlite', r'SQLite.*?(database|locked|corrupt)'),
+    ('HTTP', 'http', r'HTTP.*?(\d{3})'),
+    ('Timeout', 'timeout', r'Timeout.*?(timeout|expired)'),
+]
+
+# Tokens treated as variable parts of an error message: anything with a
+# digit, URLs, paths and long hex strings
+PARAMETER_MARK = '<*>'
+_VARIABLE_TOKEN = re.compile(r'\d|://|^[/\\~]|^[\'"]?[0-9a-f]{8,}', re.IGNORECASE)
+
+_LOG_TIMESTAMP = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+_LOG_LEVEL = re.compile(r'(DEBUG|INFO|WARNING|ERROR|CRITICAL)')
+
+
+@dataclass(frozen=True)
+class FailureClassification:
+    category: Optional[str]
+    permanent: bool
+
+
+class KeywordClassifier:
+    """Finds which labelled keyword groups occur in a text with one regex scan.
+
+    All keywords are compiled into a single case-insensitive alternation
+    inside a lookahead, so one finditer pass reports every keyword at every
+    position, including overlapping ones such as 'unavailable' inside
+    'indexer unavailable'. Results for recently seen texts are memoised.
+    """
+
+    def __init__(self, rules: Sequence[Tuple[str, Sequence[str]]], cache_size: int = 4096):
+        self.labels = [label for label, _ in rules]
+        self._keyword_ranks: Dict[str, List[int]] = {}
+        for rank, (_, keywords) in enumerate(rules):
+            for keyword in keywords:
+                self._keyword_ranks.setdefault(keyword.lower(), []).append(rank)
+
+        # Longest first so a keyword is preferred over its own prefix
+        alternation = '|'.join(re.escape(k) for k in sorted(self._keyword_ranks, key=len, reverse=True))
+        self._pattern = re.compile(f'(?=({alternation}))', re.IGNORECASE)
+
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, Tuple[int, ...]]' = OrderedDict()
+
+    def ranks(self, text: str) -> Tuple[int, ...]:
+        """Indices of the rules whose keywords occur in text, in rule order."""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+
+        hits = set()
+        for match in self._pattern.finditer(text):
+            hits.update(self._keyword_ranks[match.group(1).lower()])
+        result = tuple(sorted(hits))
+
+        self._cache[text] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result
+
+    def classify(self, text: str) -> Optional[str]:
+        """Label of the highest-priority rule matching text."""
+        ranks = self.ranks(text)
+        return self.labels[ranks[0]] if ranks else None
+
+
+@dataclass
+class ErrorTemplate:
+    template_id: Optional[int]
+    tokens: List[str]
+    
+    @property
+    def text(self) -> str:
+        return ' '.join(self.tokens)
+
+
+class ErrorTemplateMiner:
+    """Online, Drain-style clustering of error messages into templates.
+
+    Messages are split on whitespace and obviously variable tokens are
+    masked. Candidate templates are bucketed by token count and leading
+    token; a message joins the most similar template in its bucket when more
+    than similarity_threshold of the constant positions agree, and positions
+    that differ become parameters. Parameter positions never count as
+    agreeing, so two short messages cannot merge on a shared parameter.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.6):
+        self.similarity_threshold = similarity_threshold
+        self._buckets: Dict[Tuple[int, str], List[ErrorTemplate]] = defaultdict(list)
+
+    @staticmethod
+    def _bucket_key(tokens: List[str]) -> Tuple[int, str]:
+        return len(tokens), tokens[0] if tokens else ''
+
+    def load(self, template_id: int, text: str):
+        """Restore a previously mined template."""
+        tokens = text.split()
+        self._buckets[self._bucket_key(tokens)].append(ErrorTemplate(template_id, tokens))
+
+    def add(self, message: str) -> Tuple[ErrorTemplate, List[str], bool]:
+        """Match a message to a template, creating or generalising one as needed.
+
+        Returns the template, the message's values for its parameters and
+        whether the template is new or its text changed.
+        """
+        original = message.split()
+        masked = [PARAMETER_MARK if _VARIABLE_TOKEN.search(token) else token for token in original]
+        bucket = self._buckets[self._bucket_key(masked)]
+
+        best, best_similarity = None, -1.0
+        for template in bucket:
+            pairs = list(zip(template.tokens, masked))
+            compared = sum(1 for a, b in pairs if a != PARAMETER_MARK or b != PARAMETER_MARK)
+            matching = sum(1 for a, b in pairs if a == b != PARAMETER_MARK)
+            similarity = matching / compared if compared else 1.0
+            if similarity > best_similarity:
+                best, best_similarity = template, similarity
+
+        if best is not None and best_similarity > self.similarity_threshold:
+            merged = [a if a == b else PARAMETER_MARK for a, b in zip(best.tokens, masked)]
+            changed = merged != best.tokens
+            best.tokens = merged
+            template = best
+        else:
+            template = ErrorTemplate(None, masked)
+            bucket.append(template)
+            changed = True
+
+        parameters = [value for value, token in zip(original, template.tokens) if token == PARAMETER_MARK]
+        return template, parameters, changed
+
+
+_download_classifier = KeywordClassifier(
+    DOWNLOAD_FAILURE_RULES + [('permanent', PERMANENT_FAILURE_KEYWORDS)]
+)
+_PERMANENT_RANK = len(DOWNLOAD_FAILURE_RULES)
+
+_log_classifier = KeywordClassifier([(label, [anchor]) for label, anchor, _ in LOG_ERROR_RULES])
+_log_extractors = [re.compile(pattern, re.IGNORECASE) for _, _, pattern in LOG_ERROR_RULES]
+
+
+def classify_download_failure(message: Optional[str]) -> FailureClassification:
+    """Categorise a download error message and flag errors that should never be retried."""
+    if not message:
+        return FailureClassification(None, False)
+
+    ranks = _download_classifier.ranks(message)
+    category = None
+    if ranks and ranks[0] != _PERMANENT_RANK:
+        category = DOWNLOAD_FAILURE_RULES[ranks[0]][0]
+    return FailureClassification(category, _PERMANENT_RANK in ranks)
+
+
+def extract_error_signature(line: str) -> str:
+    """Reduce a log line to a stable error signature such as 'HTTP: 503'."""
+    cleaned_line = _LOG_LEVEL.sub('', _LOG_TIMESTAMP.sub('', line))
+
+    for rank in _log_classifier.ranks(cleaned_line):
+        match = _log_extractors[rank].search(cleaned_line)
+        if match:
+            return f"{LOG_ERROR_RULES[rank][0]}: {match.group(1) if match.lastindex else 'generic'}"
+
+    # Generic error classification
+    if 'error' in cleaned_line.lower():
+        words = cleaned_line.lower().split()
+        error_idx = next((i for i, word in enumerate(words) if 'error' in word), -1)
+        if error_idx >= 0 and error_idx < len(words) - 1:
+            return f"Error: {words[error_idx + 1]}"
+
+    return "Generic Error"
@@ -20,6 +20,11 @@ import requests
 from dataclasses import dataclass
 from enum import Enum
 
+sys.path.append(str(Path(__file__).parent.parent / 'system_maintenance'))
+from archive_manager import ArchiveManager
+from chunked_executor import ChunkedExecutor
+from report_sink import ReportSink
+
 # Logging configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -68,6 +73,13 @@ class QueueStats:
     avg_completion_time: Optional[float]
     success_rate: float
 
+@dataclass
+class QueueSnapshot:
+    stats: QueueStats
+    stale_downloads: int
+    failed_ready_for_retry: int
+    taken_at: datetime
+
 class QueueMonitor:
     """Main class for monitoring and managing the download queue."""
     
@@ -83,6 +95,19 @@ class QueueMonitor:
         self.queue_size_alert_threshold = 100
         self.failed_download_alert_threshold = 10
         
+        # Old queue rows are moved to monthly archive partitions rather than deleted
+        self.archiver = ArchiveManager(
+            self.db_path,
+            self.config.get('database', {}).get('archive_dir', './data/archive'),
+            chunk_size=self.config.get('database', {}).get('archive_chunk_size', 500)
+        )
+        
+        # Bulk maintenance statements run in short chunks to keep the write lock free
+        self.bulk_executor = ChunkedExecutor.from_config(self.db_path, self.config.get('database', {}))
+        
+        # Reports are appended to a rotating, compressed store
+        self.report_sink = ReportSink.from_config('queue_report', self.config.get('monitoring', {}).get('reports', {}))
+        
     def _load_config(self, config_path: str) -> Dict:
         """Load configuration from YAML file."""
         try:
@@ -108,21 +133,38 @@ class QueueMonitor:
     
     def get_queue_stats(self) -> QueueStats:
         """Get comprehensive statistics about the download queue."""
+        return self.get_queue_snapshot().stats
+    
+    def get_queue_snapshot(self) -> QueueSnapshot:
+        """Read every queue counter in one read transaction.
+        
+        Status counts, the 24h success rate and the stale count come from a
+        single conditional aggregation that SQLite answers from the
+        (status, updated_at, priority) covering index; completion time and
+        retry-ready failures only read their own status/updated_at range.
+        """
         try:
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Get status counts
-                cursor.execute("""
-                    SELECT status, COUNT(*) as count 
-                    FROM download_queue 
-                    GROUP BY status
-                """)
-                status_counts = dict(cursor.fetchall())
+                # Keep all counters consistent with each other
+                cursor.execute("BEGIN")
                 
-                # Get total items
-                cursor.execute("SELECT COUNT(*) FROM download_queue")
-                total_items = cursor.fetchone()[0]
+                cursor.execute("""
+                    SELECT 
+                        COUNT(*) as total_items,
+                        COALESCE(SUM(status = 'pending'), 0) as pending,
+                        COALESCE(SUM(status = 'downloading'), 0) as downloading,
+                        COALESCE(SUM(status = 'completed'), 0) as completed,
+                        COALESCE(SUM(status = 'failed'), 0) as failed,
+                        COALESCE(SUM(status = 'cancelled'), 0) as cancelled,
+                        COALESCE(SUM(status = 'paused'), 0) as paused,
+                        COALESCE(SUM(updated_at > datetime('now', '-1 day')), 0) as recent_items,
+                        COALESCE(SUM(status = 'completed' AND updated_at > datetime('now', '-1 day')), 0) as recent_completed,
+                        COALESCE(SUM(status = 'downloading' AND updated_at < datetime('now', ?)), 0) as stale_downloads
+                    FROM download_queue
+                """, (f'-{self.stale_download_threshold} seconds',))
+                counters = cursor.fetchone()
                 
                 # Calculate average completion time for successful downloads
                 cursor.execute("""
@@ -136,29 +178,39 @@ class QueueMonitor:
                 avg_completion_result = cursor.fetchone()[0]
                 avg_completion_time = avg_completion_result * 60 if avg_completion_result else None  # Convert to seconds
                 
-                # Calculate success rate (last 24 hours)
                 cursor.execute("""
-                    SELECT 
-                        SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) * 100.0 / COUNT(*) as success_rate
-                    FROM download_queue 
-                    WHERE updated_at > datetime('now', '-1 day')
+                    SELECT COUNT(*) FROM download_queue 
+                    WHERE status = 'failed' 
+                    AND updated_at < datetime('now', '-300 seconds')
+                    AND retry_count < max_retries
                 """)
-                success_rate_result = cursor.fetchone()[0]
-                success_rate = success_rate_result if success_rate_result else 0.0
+                failed_ready_for_retry = cursor.fetchone()[0]
+                
+                # Success rate over the last 24 hours
+                success_rate = 0.0
+                if counters['recent_items']:
+                    success_rate = counters['recent_completed'] * 100.0 / counters['recent_items']
                 
-                return QueueStats(
-                    total_items=total_items,
-                    pending=status_counts.get('pending', 0),
-                    downloading=status_counts.get('downloading', 0),
-                    completed=status_counts.get('completed', 0),
-                    failed=status_counts.get('failed', 0),
-                    cancelled=status_counts.get('cancelled', 0),
-                    paused=status_counts.get('paused', 0),
+                stats = QueueStats(
+                    total_items=counters['total_items'],
+                    pending=counters['pending'],
+                    downloading=counters['downloading'],
+                    completed=counters['completed'],
+                    failed=counters['failed'],
+                    cancelled=counters['cancelled'],
+                    paused=counters['paused'],
                     avg_completion_time=avg_completion_time,
                     success_rate=success_rate
                 )
+                
+                return QueueSnapshot(
+                    stats=stats,
+                    stale_downloads=counters['stale_downloads'],
+                    failed_ready_for_retry=failed_ready_for_retry,
+                    taken_at=datetime.now()
+                )
         except Exception as e:
-            logger.error(f"Error getting queue stats: {e}")
+            logger.error(f"Error getting queue snapshot: {e}")
             raise
     
     def get_stale_downloads(self) -> List[DownloadItem]:
@@ -198,10 +250,11 @@ class QueueMonitor:
             logger.error(f"Error finding downloads for retry: {e}")
             return []
     
-    def get_queue_health_issues(self) -> List[str]:
+    def get_queue_health_issues(self, snapshot: Optional[QueueSnapshot] = None) -> List[str]:
         """Identify potential health issues with the queue."""
         issues = []
-        stats = self.get_queue_stats()
+        snapshot = snapshot or self.get_queue_snapshot()
+        stats = snapshot.stats
         
         # Check for large queue backlog
         if stats.pending > self.queue_size_alert_threshold:
@@ -216,9 +269,8 @@ class QueueMonitor:
             issues.append(f"High number of failed downloads: {stats.failed}")
         
         # Check for stale downloads
-        stale_downloads = self.get_stale_downloads()
-        if stale_downloads:
-            issues.append(f"Found {len(stale_downloads)} stale downloads")
+        if snapshot.stale_downloads:
+            issues.append(f"Found {snapshot.stale_downloads} stale downloads")
         
         return issues
     
@@ -260,23 +312,17 @@ class QueueMonitor:
             return False
     
     def cleanup_old_completed_downloads(self, days_old: int = 30) -> int:
-        """Clean up old completed downloads from the queue table."""
+        """Move old completed downloads from the queue table to the archive."""
         try:
-            with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    DELETE FROM download_queue 
-                    WHERE status = 'completed' 
-                    AND updated_at < datetime('now', '-{} days')
-                """.format(days_old))
-                
-                deleted_count = cursor.rowcount
-                conn.commit()
-                
-                if deleted_count > 0:
-                    logger.info(f"Cleaned up {deleted_count} old completed downloads")
-                
-                return deleted_count
+            cutoff = (datetime.utcnow() - timedelta(days=days_old)).strftime('%Y-%m-%d %H:%M:%S')
+            archived_count = self.archiver.archive_rows(
+                'download_queue', "status = 'completed' AND updated_at < ?", (cutoff,)
+            )
+
+            if archived_count > 0:
+                logger.info(f"Archived {archived_count} old completed downloads")
+
+            return archived_count
         except Exception as e:
             logger.error(f"Error cleaning up old downloads: {e}")
             return 0
@@ -285,54 +331,36 @@ class QueueMonitor:
         """Optimize queue priorities based on various factors."""
         try:
             updated_count = 0
-            with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Boost priority for downloads that have been pending for a while
-                cursor.execute("""
-                    UPDATE download_queue 
-                    SET priority = CASE 
-                        WHEN priority > 1 THEN priority - 1 
-                        ELSE 1 
-                    END,
-                    updated_at = datetime('now')
-                    WHERE status = 'pending' 
-                    AND created_at < datetime('now', '-1 hour')
-                    AND priority > 1
-                """)
-                
-                updated_count += cursor.rowcount
-                
-                # Lower priority for repeatedly failed downloads
-                cursor.execute("""
-                    UPDATE download_queue 
-                    SET priority = CASE 
-                        WHEN priority < 10 THEN priority + 1 
-                        ELSE 10 
-                    END,
-                    updated_at = datetime('now')
-                    WHERE status = 'failed' 
-                    AND retry_count >= 2
-                    AND priority < 10
-                """)
-                
-                updated_count += cursor.rowcount
-                conn.commit()
-                
-                if updated_count > 0:
-                    logger.info(f"Optimized priorities for {updated_count} downloads")
-                
-                return updated_count
+            pending_cutoff = (datetime.utcnow() - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S')
+
+            # Boost priority for downloads that have been pending for a while
+            updated_count += self.bulk_executor.update(
+                'download_queue',
+                "priority = CASE WHEN priority > 1 THEN priority - 1 ELSE 1 END, updated_at = datetime('now')",
+                "status = 'pending' AND created_at < ? AND priority > 1",
+                (pending_cutoff,)
+            ).rows_affected
+
+            # Lower priority for repeatedly failed downloads
+            updated_count += self.bulk_executor.update(
+                'download_queue',
+                "priority = CASE WHEN priority < 10 THEN priority + 1 ELSE 10 END, updated_at = datetime('now')",
+                "status = 'failed' AND retry_count >= 2 AND priority < 10"
+            ).rows_affected
+
+            if updated_count > 0:
+                logger.info(f"Optimized priorities for {updated_count} downloads")
+
+            return updated_count
         except Exception as e:
             logger.error(f"Error optimizing queue priorities: {e}")
             return 0
     
     def generate_report(self) -> Dict:
         """Generate a comprehensive queue status report."""
-        stats = self.get_queue_stats()
-        stale_downloads = self.get_stale_downloads()
-        failed_for_retry = self.get_failed_downloads_for_retry()
-        health_issues = self.get_queue_health_issues()
+        snapshot = self.get_queue_snapshot()
+        stats = snapshot.stats
+        health_issues = self.get_queue_health_issues(snapshot)
         
         report = {
             "timestamp": datetime.now().isoformat(),
@@ -352,18 +380,18 @@ class QueueMonitor:
                 }
             },
             "issues": {
-                "stale_downloads": len(stale_downloads),
-                "failed_ready_for_retry": len(failed_for_retry),
+                "stale_downloads": snapshot.stale_downloads,
+                "failed_ready_for_retry": snapshot.failed_ready_for_retry,
                 "health_issues": health_issues
             },
             "recommendations": []
         }
         
         # Add recommendations based on findings
-        if stale_downloads:
+        if snapshot.stale_downloads:
             report["recommendations"].append("Cancel or restart stale downloads")
         
-        if failed_for_retry:
+        if snapshot.failed_ready_for_retry:
             report["recommendations"].append("Retry failed downloads that haven't exceeded max attempts")
         
         if stats.pending > 50:
@@ -449,11 +477,8 @@ class QueueMonitor:
                     report["issues"]["failed_ready_for_retry"] > 0):
                     self.run_maintenance_cycle()
                 
-                # Save report to file
-                report_path = Path(f"/var/log/foliofox/queue_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-                report_path.parent.mkdir(parents=True, exist_ok=True)
-                with open(report_path, 'w') as f:
-                    json.dump(report, f, indent=2)
+                # Save report
+                self.report_sink.append(report)
                 
             except Exception as e:
                 logger.error(f"Error in monitoring loop: {e}")
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+FolioFox Retry Gate
+Per-indexer retry budgets gated on the circuit breaker state published by the failover manager.
+"""
+
+import logging
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger('foliofox.retry_gate')
+
+
+class RetryBudget:
+    """Token bucket and in-flight cap for retries against one indexer."""
+
+    def __init__(self, tokens_per_second: float, burst: int, max_in_flight: int):
+        self.tokens_per_second = tokens_per_second
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.tokens_per_second)
+        self.updated = now
+
+    def drain(self):
+        """Empty the bucket so retries after an outage start at the refill rate."""
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+
+    def admit(self, wanted: int, in_flight: int) -> int:
+        """Take tokens for up to wanted retries and return how many may go now."""
+        self._refill()
+        allowed = min(wanted, int(self.tokens), max(0, self.max_in_flight - in_flight))
+        self.tokens -= allowed
+        return allowed
+
+    def spacing(self) -> float:
+        """Seconds between retries released at the refill rate."""
+        return 1.0 / self.tokens_per_second
+
+
+class RetryGate:
+    """Decides which due retries may run now and pushes the rest back.
+
+    Every process that starts retries goes through a gate. Token buckets are
+    per process, but the in-flight cap is counted from download_queue, so it
+    holds across processes. Circuit states older than circuit_stale_seconds
+    are ignored, so an indexer is not throttled forever when the failover
+    manager stops publishing.
+    """
+
+    def __init__(self, connection_factory: Callable[[], sqlite3.Connection],
+                 tokens_per_second: float = 0.5, burst: int = 10, max_in_flight: int = 20,
+                 circuit_stale_seconds: int = 300):
+        self.connection_factory = connection_factory
+        self.tokens_per_second = tokens_per_second
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.circuit_stale_seconds = circuit_stale_seconds
+        self.budgets: Dict[int, RetryBudget] = {}
+
+    @classmethod
+    def from_config(cls, connection_factory: Callable[[], sqlite3.Connection], config: Dict) -> 'RetryGate':
+        """Build a gate from a downloads.retry_budget config section."""
+        return cls(
+            connection_factory,
+            tokens_per_second=config.get('tokens_per_second', 0.5),
+            burst=config.get('burst', 10),
+            max_in_flight=config.get('max_in_flight', 20),
+            circuit_stale_seconds=config.get('circuit_stale_seconds', 300)
+        )
+
+    def get_budget(self, indexer_id: int) -> RetryBudget:
+        if indexer_id not in self.budgets:
+            self.budgets[indexer_id] = RetryBudget(self.tokens_per_second, self.burst, self.max_in_flight)
+        return self.budgets[indexer_id]
+
+    def admit(self, candidates: List[Tuple[int, int]]) -> Tuple[List[int], List[Tuple[int, datetime]]]:
+        """Split (download_id, indexer_id) candidates into admitted ids and deferrals.
+
+        Retries for an indexer whose circuit is open are pushed back as a
+        group to when the circuit lets a probe through; a half-open circuit
+        gets a single probe. Deferred retries are spaced out at the budget's
+        refill rate so a recovering indexer is not hit all at once. Deferrals
+        are written to next_retry_at before returning.
+        """
+        if not candidates:
+            return [], []
+
+        circuit_states = self.load_indexer_circuit_states()
+        in_flight = self.count_in_flight_retries()
+        now = datetime.now()
+
+        by_indexer: Dict[int, List[int]] = {}
+        for download_id, indexer_id in candidates:
+            by_indexer.setdefault(indexer_id, []).append(download_id)
+
+        admitted: List[int] = []
+        deferrals: List[Tuple[int, datetime]] = []
+        for indexer_id, group in by_indexer.items():
+            budget = self.get_budget(indexer_id)
+            state, retry_after = circuit_states.get(indexer_id, ("CLOSED", None))
+            release_from, first_slot = now, 1
+
+            if state == "OPEN" and retry_after and retry_after > now:
+                budget.drain()
+                allowed = 0
+                release_from, first_slot = retry_after, 0
+            elif state in ("OPEN", "HALF_OPEN"):
+                budget.drain()
+                allowed = 1 if in_flight.get(indexer_id, 0) == 0 else 0
+            else:
+                allowed = budget.admit(len(group), in_flight.get(indexer_id, 0))
+
+            admitted.extend(group[:allowed])
+            for slot, download_id in enumerate(group[allowed:], start=first_slot):
+                deferrals.append((download_id, release_from + timedelta(seconds=slot * budget.spacing())))
+
+            if len(group) > allowed:
+                logger.info(f"Deferred {len(group) - allowed} retries for indexer {indexer_id} (circuit {state})")
+
+        self.defer(deferrals)
+        return admitted, deferrals
+
+    def load_indexer_circuit_states(self) -> Dict[int, Tuple[str, Optional[datetime]]]:
+        """Recent non-closed circuit breaker states published by the failover manager."""
+        try:
+            with self.connection_factory() as conn:
+                rows = conn.execute("""
+                    SELECT indexer_id, state, retry_after, updated_at
+                    FROM indexer_circuit_state
+                    WHERE state != 'CLOSED'
+                """).fetchall()
+        except Exception as e:
+            logger.error(f"Error loading indexer circuit states: {e}")
+            return {}
+
+        # Published with Python timestamps, so compare them in Python
+        fresh_after = datetime.now() - timedelta(seconds=self.circuit_stale_seconds)
+        states = {}
+        for indexer_id, state, retry_after, updated_at in rows:
+            if not updated_at or datetime.fromisoformat(updated_at) < fresh_after:
+                continue
+            states[indexer_id] = (state, datetime.fromisoformat(retry_after) if retry_after else None)
+        return states
+
+    def count_in_flight_retries(self) -> Dict[int, int]:
+        """Retried downloads per indexer that are queued or downloading again."""
+        try:
+            with self.connection_factory() as conn:
+                rows = conn.execute("""
+                    SELECT indexer_id, COUNT(*)
+                    FROM download_queue
+                    WHERE status IN ('pending', 'downloading')
+                    AND retry_count > 0
+                    GROUP BY indexer_id
+                """).fetchall()
+                return {indexer_id: in_flight for indexer_id, in_flight in rows}
+        except Exception as e:
+            logger.error(f"Error counting in-flight retries: {e}")
+            return {}
+
+    def defer(self, deferrals: List[Tuple[int, datetime]]):
+        """Move deferred retries to their new due times."""
+        if not deferrals:
+            return
+
+        try:
+            with self.connection_factory() as conn:
+                conn.executemany("""
+                    UPDATE download_queue
+                    SET next_retry_at = ?
+                    WHERE id = ? AND status = 'failed'
+                """, [(due.isoformat(), download_id) for download_id, due in deferrals])
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error deferring retries: {e}")
@@ -5,18 +5,27 @@ Intelligent retry logic for failed downloads with exponential backoff and failur
 """
 
 import argparse
+import heapq
 import json
 import logging
+import random
 import sqlite3
+import sys
 import time
 from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
 import hashlib
 
+sys.path.append(str(Path(__file__).parent))
+from failure_classifier import ErrorTemplateMiner, classify_download_failure
+from retry_gate import RetryGate
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,6 +37,12 @@ logging.basicConfig(
 )
 logger = logging.getLogger('foliofox.retry_manager')
 
+# The batch endpoint rejects requests with more than 100 ids
+MAX_RETRY_BATCH_SIZE = 100
+
+class RetryDispatchAuthError(Exception):
+    """The API rejected the configured credentials; no retry can be dispatched."""
+
 class RetryReason(Enum):
     NETWORK_ERROR = "network_error"
     TIMEOUT = "timeout"
@@ -63,6 +78,54 @@ class FailedDownload:
     last_attempt: datetime
     created_at: datetime
     priority: int
+    next_retry_at: Optional[datetime] = None
+
+class RetryTimer:
+    """Min-heap of (due time, download id) for scheduled retries.
+    
+    Loaded from the persisted next_retry_at column, it lets a long-running
+    retry loop sleep until the earliest retry is due instead of rescanning
+    every failed row.
+    """
+    
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._due: Dict[int, float] = {}
+    
+    def __len__(self) -> int:
+        return len(self._due)
+    
+    def schedule(self, download_id: int, due: datetime):
+        """Add or move a download's retry; superseded heap entries are skipped lazily."""
+        timestamp = due.timestamp()
+        if self._due.get(download_id) == timestamp:
+            return
+        self._due[download_id] = timestamp
+        heapq.heappush(self._heap, (timestamp, download_id))
+    
+    def cancel(self, download_id: int):
+        self._due.pop(download_id, None)
+    
+    def _discard_stale(self):
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+    
+    def next_due(self) -> Optional[float]:
+        """Epoch time of the earliest scheduled retry."""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+    
+    def pop_due(self, now: Optional[float] = None) -> List[int]:
+        """Remove and return every download whose retry time has passed."""
+        now = now or time.time()
+        due = []
+        while True:
+            self._discard_stale()
+            if not self._heap or self._heap[0][0] > now:
+                return due
+            _, download_id = heapq.heappop(self._heap)
+            del self._due[download_id]
+            due.append(download_id)
 
 class RetryManager:
     """Manages intelligent retry logic for failed downloads."""
@@ -74,6 +137,29 @@ class RetryManager:
         
         self.retry_config = RetryConfig()
         self.failure_patterns = self._initialize_failure_patterns()
+        self.retry_timer = RetryTimer()
+        
+        downloads_config = self.config.get('downloads', {})
+        self.retry_batch_size = min(downloads_config.get('retry_batch_size', MAX_RETRY_BATCH_SIZE), MAX_RETRY_BATCH_SIZE)
+        self.retry_dispatch_concurrency = max(1, downloads_config.get('retry_dispatch_concurrency', 4))
+        
+        # Per-indexer retry budgets, held back further while an indexer's circuit is open
+        self.retry_gate = RetryGate.from_config(self.get_database_connection, downloads_config.get('retry_budget', {}))
+        
+        # Failure message templates, loaded from the database on first use
+        self.template_miner: Optional[ErrorTemplateMiner] = None
+        
+        # One keep-alive pool shared by all dispatch workers
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=self.retry_dispatch_concurrency))
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.retry_dispatch_concurrency))
+        
+        # The batch endpoint sits behind the API's JWT middleware
+        api_token = self.config.get('server', {}).get('api_token')
+        if api_token:
+            self.session.headers['Authorization'] = f"Bearer {api_token}"
+        else:
+            logger.warning("No server.api_token configured; the API will reject retry requests")
         
     def _load_config(self, config_path: str) -> Dict:
         """Load configuration from YAML file."""
@@ -89,45 +175,37 @@ class RetryManager:
             return {}
     
     def _initialize_failure_patterns(self) -> Dict[RetryReason, Dict]:
-        """Initialize patterns for categorizing failure reasons."""
+        """Initialize retry behaviour per failure reason; the message patterns live in failure_classifier."""
         return {
             RetryReason.NETWORK_ERROR: {
-                'patterns': ['connection refused', 'network unreachable', 'dns lookup failed', 'connection reset'],
                 'retry_multiplier': 1.5,
                 'immediate_retry': False
             },
             RetryReason.TIMEOUT: {
-                'patterns': ['timeout', 'deadline exceeded', 'request timeout'],
                 'retry_multiplier': 1.2,
                 'immediate_retry': False
             },
             RetryReason.SERVER_ERROR: {
-                'patterns': ['500', '502', '503', '504', 'internal server error', 'bad gateway'],
                 'retry_multiplier': 2.0,
                 'immediate_retry': False
             },
             RetryReason.RATE_LIMITED: {
-                'patterns': ['429', 'rate limit', 'too many requests', 'quota exceeded'],
                 'retry_multiplier': 3.0,
                 'immediate_retry': False
             },
             RetryReason.INDEXER_DOWN: {
-                'patterns': ['indexer unavailable', 'indexer offline', 'indexer maintenance'],
                 'retry_multiplier': 2.5,
                 'immediate_retry': False
             },
             RetryReason.FILE_CORRUPTED: {
-                'patterns': ['checksum mismatch', 'corrupted file', 'invalid file format'],
                 'retry_multiplier': 1.0,
                 'immediate_retry': True
             },
             RetryReason.DISK_FULL: {
-                'patterns': ['no space left', 'disk full', 'insufficient space'],
                 'retry_multiplier': 1.0,
                 'immediate_retry': False
             },
             RetryReason.PERMISSION_ERROR: {
-                'patterns': ['permission denied', 'access denied', 'forbidden'],
                 'retry_multiplier': 1.0,
                 'immediate_retry': False
             }
@@ -138,6 +216,7 @@ class RetryManager:
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA foreign_keys=ON")
             return conn
         except sqlite3.Error as e:
             logger.error(f"Database connection error: {e}")
@@ -145,17 +224,8 @@ class RetryManager:
     
     def categorize_failure(self, error_message: str) -> RetryReason:
         """Categorize failure based on error message patterns."""
-        if not error_message:
-            return RetryReason.UNKNOWN
-        
-        error_lower = error_message.lower()
-        
-        for reason, config in self.failure_patterns.items():
-            for pattern in config['patterns']:
-                if pattern in error_lower:
-                    return reason
-        
-        return RetryReason.UNKNOWN
+        category = classify_download_failure(error_message).category
+        return RetryReason(category) if category else RetryReason.UNKNOWN
     
     def calculate_retry_delay(self, retry_count: int, failure_reason: RetryReason) -> int:
         """Calculate the delay before next retry attempt."""
@@ -177,7 +247,6 @@ class RetryManager:
         )
         
         # Add jitter (±20%)
-        import random
         jitter = random.uniform(0.8, 1.2)
         return int(delay * jitter)
     
@@ -189,7 +258,7 @@ class RetryManager:
                 cursor.execute("""
                     SELECT id, user_id, indexer_id, title, author_name, download_url, 
                            file_format, retry_count, max_retries, error_message, 
-                           updated_at, created_at, priority
+                           updated_at, created_at, priority, next_retry_at
                     FROM download_queue 
                     WHERE status = 'failed' 
                     AND retry_count < max_retries
@@ -202,119 +271,258 @@ class RetryManager:
             logger.error(f"Error getting failed downloads: {e}")
             return []
     
-    def get_retry_candidates(self) -> List[Tuple[FailedDownload, int]]:
-        """Get downloads ready for retry with their calculated delays."""
-        failed_downloads = self.get_failed_downloads()
-        candidates = []
+    def schedule_new_failures(self) -> int:
+        """Compute and persist next_retry_at for failures that have not been scheduled yet.
         
-        current_time = datetime.now()
+        Each failure is categorised, recorded against its message template
+        and given its jittered delay exactly once; the queue manager clears
+        next_retry_at whenever a download fails again, so the next attempt
+        gets a fresh schedule. Failures that exhausted their retries are
+        stamped too so they are recorded only once; every reader of
+        next_retry_at also requires retry_count < max_retries.
+        """
+        try:
+            with self.get_database_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id, indexer_id, retry_count, max_retries, error_message, updated_at
+                    FROM download_queue 
+                    WHERE status = 'failed' 
+                    AND next_retry_at IS NULL
+                """)
+                
+                rows = cursor.fetchall()
+                self.record_failure_templates(cursor, rows)
+                
+                schedule = []
+                timers = []
+                for row in rows:
+                    failure_reason = self.categorize_failure(row['error_message'] or "")
+                    delay = self.calculate_retry_delay(row['retry_count'], failure_reason)
+                    next_retry_at = datetime.fromisoformat(row['updated_at']) + timedelta(seconds=delay)
+                    schedule.append((next_retry_at.isoformat(), row['id']))
+                    if row['retry_count'] < row['max_retries']:
+                        timers.append((row['id'], next_retry_at))
+                
+                if schedule:
+                    cursor.executemany("""
+                        UPDATE download_queue SET next_retry_at = ?
+                        WHERE id = ? AND status = 'failed' AND next_retry_at IS NULL
+                    """, schedule)
+                    conn.commit()
+                    logger.info(f"Scheduled retries for {len(schedule)} new failures")
+                
+                for download_id, due in timers:
+                    self.retry_timer.schedule(download_id, due)
+                
+                return len(schedule)
+        except Exception as e:
+            # The rollback discards inserted template ids and merged texts;
+            # reload the miner from failure_templates on the next pass
+            self.template_miner = None
+            logger.error(f"Error scheduling new failures: {e}")
+            return 0
+    
+    def record_failure_templates(self, cursor: sqlite3.Cursor, rows: List[sqlite3.Row]):
+        """Match failure messages to templates and append a failure event for each.
         
-        for download in failed_downloads:
-            failure_reason = self.categorize_failure(download.error_message or "")
-            retry_delay = self.calculate_retry_delay(download.retry_count, failure_reason)
+        Hourly counters per template, indexer and category are kept by a
+        trigger on download_failure_events.
+        """
+        if self.template_miner is None:
+            self.template_miner = ErrorTemplateMiner()
+            cursor.execute("SELECT id, template FROM failure_templates ORDER BY id")
+            for template_row in cursor.fetchall():
+                self.template_miner.load(template_row['id'], template_row['template'])
+        
+        now = datetime.now().isoformat()
+        events = []
+        for row in rows:
+            message = row['error_message'] or ""
+            template, parameters, changed = self.template_miner.add(message)
             
-            # Check if enough time has passed since last attempt
-            time_since_last_attempt = (current_time - download.last_attempt).total_seconds()
+            if template.template_id is None:
+                cursor.execute("""
+                    INSERT INTO failure_templates (template, created_at, updated_at)
+                    VALUES (?, ?, ?)
+                """, (template.text, now, now))
+                template.template_id = cursor.lastrowid
+            elif changed:
+                cursor.execute("""
+                    UPDATE failure_templates SET template = ?, updated_at = ? WHERE id = ?
+                """, (template.text, now, template.template_id))
             
-            if time_since_last_attempt >= retry_delay:
-                candidates.append((download, retry_delay))
-                logger.info(
-                    f"Download {download.id} ready for retry (attempt {download.retry_count + 1})"
-                    f" - Reason: {failure_reason.value}, Delay was: {retry_delay}s"
-                )
+            events.append((
+                row['id'], template.template_id, row['indexer_id'],
+                self.categorize_failure(message).value, json.dumps(parameters),
+                row['retry_count'], row['updated_at']
+            ))
+        
+        if events:
+            cursor.executemany("""
+                INSERT INTO download_failure_events 
+                (download_id, template_id, indexer_id, category, parameters, retry_count, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, events)
+    
+    def load_retry_schedule(self, horizon_seconds: Optional[int] = None) -> int:
+        """Fill the retry timer from persisted next_retry_at values."""
+        try:
+            with self.get_database_connection() as conn:
+                cursor = conn.cursor()
+                query = """
+                    SELECT id, next_retry_at FROM download_queue 
+                    WHERE status = 'failed' 
+                    AND next_retry_at IS NOT NULL
+                    AND retry_count < max_retries
+                """
+                params: List = []
+                if horizon_seconds is not None:
+                    query += " AND next_retry_at <= ?"
+                    params.append((datetime.now() + timedelta(seconds=horizon_seconds)).isoformat())
+                
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                for row in rows:
+                    self.retry_timer.schedule(row['id'], datetime.fromisoformat(row['next_retry_at']))
+                return len(rows)
+        except Exception as e:
+            logger.error(f"Error loading retry schedule: {e}")
+            return 0
+    
+    def get_retry_candidates(self) -> List[Tuple[FailedDownload, int]]:
+        """Get downloads whose scheduled retry time has passed, with the delay they waited."""
+        self.schedule_new_failures()
+        
+        try:
+            with self.get_database_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT id, user_id, indexer_id, title, author_name, download_url, 
+                           file_format, retry_count, max_retries, error_message, 
+                           updated_at, created_at, priority, next_retry_at
+                    FROM download_queue 
+                    WHERE status = 'failed' 
+                    AND next_retry_at <= ?
+                    AND retry_count < max_retries
+                    ORDER BY next_retry_at ASC, priority ASC
+                """, (datetime.now().isoformat(),))
+                
+                rows = cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Error getting retry candidates: {e}")
+            return []
+        
+        candidates = []
+        for row in rows:
+            download = self._row_to_failed_download(row)
+            retry_delay = int((download.next_retry_at - download.last_attempt).total_seconds())
+            candidates.append((download, retry_delay))
+            self.retry_timer.cancel(download.id)
+            logger.info(
+                f"Download {download.id} ready for retry (attempt {download.retry_count + 1})"
+                f" - Reason: {self.categorize_failure(download.error_message or '').value}, Delay was: {retry_delay}s"
+            )
         
         return candidates
     
+    def apply_retry_budgets(self, candidates: List[Tuple[FailedDownload, int]]) -> List[Tuple[FailedDownload, int]]:
+        """Admit the retries each indexer's budget and circuit allow and defer the rest."""
+        admitted_ids, deferrals = self.retry_gate.admit([(download.id, download.indexer_id) for download, _ in candidates])
+        
+        for download_id, due in deferrals:
+            self.retry_timer.schedule(download_id, due)
+        
+        admitted = set(admitted_ids)
+        return [candidate for candidate in candidates if candidate[0].id in admitted]
+    
     def retry_download(self, download_id: int) -> bool:
         """Retry a specific download."""
+        return self.retry_downloads([download_id]).get(download_id, False)
+    
+    def retry_downloads(self, download_ids: List[int]) -> Dict[int, bool]:
+        """Queue retries for many downloads through the batch endpoint.
+        
+        Ids are sent in chunks of retry_batch_size over a pooled session,
+        with at most retry_dispatch_concurrency requests in flight. Raises
+        RetryDispatchAuthError when the API rejects the credentials.
+        """
+        if not download_ids:
+            return {}
+        
+        batches = [download_ids[i:i + self.retry_batch_size]
+                   for i in range(0, len(download_ids), self.retry_batch_size)]
+        
+        results: Dict[int, bool] = {}
+        with ThreadPoolExecutor(max_workers=min(self.retry_dispatch_concurrency, len(batches))) as executor:
+            for batch_results in executor.map(self._post_retry_batch, batches):
+                results.update(batch_results)
+        
+        successful = sum(1 for ok in results.values() if ok)
+        logger.info(f"Queued {successful}/{len(download_ids)} retries in {len(batches)} batch requests")
+        return results
+    
+    def _post_retry_batch(self, download_ids: List[int]) -> Dict[int, bool]:
+        """Send one batch retry request and return the per-download outcome."""
+        results = {download_id: False for download_id in download_ids}
+        
         try:
-            response = requests.post(
-                f"{self.api_base_url}/api/downloads/{download_id}/retry",
+            response = self.session.post(
+                f"{self.api_base_url}/api/v1/downloads/queue/batch",
+                json={"action": "retry", "download_ids": download_ids},
                 timeout=30
             )
             
-            if response.status_code == 200:
-                logger.info(f"Successfully queued retry for download {download_id}")
-                return True
-            else:
-                logger.error(f"Failed to retry download {download_id}: HTTP {response.status_code}")
+            if response.status_code in (401, 403):
+                raise RetryDispatchAuthError(
+                    f"Retry batch rejected with HTTP {response.status_code}; check server.api_token"
+                )
+            
+            if response.status_code != 200:
+                logger.error(f"Failed to retry batch of {len(download_ids)} downloads: HTTP {response.status_code}")
                 if response.text:
                     logger.error(f"Response: {response.text}")
-                return False
+                return results
+            
+            for item in response.json().get('results', []):
+                download_id = item.get('download_id')
+                if download_id in results:
+                    results[download_id] = bool(item.get('success'))
+                    if not item.get('success'):
+                        logger.error(f"Failed to retry download {download_id}: {item.get('error')}")
+        except RetryDispatchAuthError:
+            raise
         except Exception as e:
-            logger.error(f"Error retrying download {download_id}: {e}")
-            return False
+            logger.error(f"Error retrying batch of {len(download_ids)} downloads: {e}")
+        
+        return results
     
     def update_retry_metadata(self, download_id: int, failure_reason: RetryReason, 
                              next_retry_at: datetime):
         """Update retry metadata in the database."""
+        self.record_retry_events([(download_id, failure_reason, next_retry_at)])
+    
+    def record_retry_events(self, events: List[Tuple[int, RetryReason, datetime]]):
+        """Append retry events; the per-download summary is maintained by a trigger."""
+        if not events:
+            return
+        
         try:
+            now = datetime.now().isoformat()
             with self.get_database_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Check if retry_metadata table exists, create if not
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS download_retry_metadata (
-                        download_id INTEGER PRIMARY KEY,
-                        failure_reason TEXT,
-                        retry_history TEXT,
-                        next_retry_at TEXT,
-                        total_retry_time INTEGER DEFAULT 0,
-                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (download_id) REFERENCES download_queue (id)
-                    )
-                """)
-                
-                # Get existing retry history
-                cursor.execute("""
-                    SELECT retry_history, total_retry_time 
-                    FROM download_retry_metadata 
-                    WHERE download_id = ?
-                """, (download_id,))
-                
-                existing = cursor.fetchone()
-                retry_history = []
-                total_retry_time = 0
-                
-                if existing:
-                    retry_history = json.loads(existing[0] or "[]")
-                    total_retry_time = existing[1] or 0
-                
-                # Add current retry to history
-                retry_entry = {
-                    "timestamp": datetime.now().isoformat(),
-                    "reason": failure_reason.value,
-                    "next_retry_at": next_retry_at.isoformat()
-                }
-                retry_history.append(retry_entry)
-                
-                # Calculate time spent on retries
-                if len(retry_history) > 1:
-                    last_retry = datetime.fromisoformat(retry_history[-2]["timestamp"])
-                    current_retry = datetime.fromisoformat(retry_entry["timestamp"])
-                    total_retry_time += int((current_retry - last_retry).total_seconds())
-                
-                # Update or insert retry metadata
-                cursor.execute("""
-                    INSERT OR REPLACE INTO download_retry_metadata 
-                    (download_id, failure_reason, retry_history, next_retry_at, 
-                     total_retry_time, updated_at)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    download_id,
-                    failure_reason.value,
-                    json.dumps(retry_history),
-                    next_retry_at.isoformat(),
-                    total_retry_time,
-                    datetime.now().isoformat()
-                ))
-                
+                conn.executemany("""
+                    INSERT INTO download_retry_events 
+                    (download_id, failure_reason, next_retry_at, created_at)
+                    VALUES (?, ?, ?, ?)
+                """, [
+                    (download_id, failure_reason.value, next_retry_at.isoformat(), now)
+                    for download_id, failure_reason, next_retry_at in events
+                ])
                 conn.commit()
-                logger.debug(f"Updated retry metadata for download {download_id}")
+                logger.debug(f"Recorded {len(events)} retry events")
                 
         except Exception as e:
-            logger.error(f"Error updating retry metadata for download {download_id}: {e}")
+            logger.error(f"Error recording retry events: {e}")
     
     def analyze_failure_patterns(self) -> Dict:
         """Analyze failure patterns to identify common issues."""
@@ -322,25 +530,26 @@ class RetryManager:
             with self.get_database_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Get failure statistics
+                # Get failure statistics from the hourly template counters
+                since = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d %H:00:00')
                 cursor.execute("""
-                    SELECT error_message, COUNT(*) as count,
-                           AVG(retry_count) as avg_retries
-                    FROM download_queue 
-                    WHERE status = 'failed' 
-                    AND updated_at > datetime('now', '-7 days')
-                    AND error_message IS NOT NULL
-                    GROUP BY error_message
+                    SELECT t.id as template_id, t.template, s.category,
+                           SUM(s.failures) as count,
+                           SUM(s.total_retry_count) * 1.0 / SUM(s.failures) as avg_retries,
+                           COUNT(DISTINCT s.indexer_id) as indexers
+                    FROM failure_template_stats s
+                    JOIN failure_templates t ON t.id = s.template_id
+                    WHERE s.hour >= ?
+                    GROUP BY t.id, s.category
                     ORDER BY count DESC
-                    LIMIT 20
-                """)
+                """, (since,))
                 
                 failures = cursor.fetchall()
                 
                 # Categorize failures
                 analysis = {
                     "timeframe": "last 7 days",
-                    "total_failures": sum(row[1] for row in failures),
+                    "total_failures": sum(row['count'] for row in failures),
                     "categories": {},
                     "top_errors": [],
                     "recommendations": []
@@ -348,20 +557,43 @@ class RetryManager:
                 
                 category_counts = {}
                 
-                for error_msg, count, avg_retries in failures:
-                    reason = self.categorize_failure(error_msg)
-                    category_counts[reason.value] = category_counts.get(reason.value, 0) + count
-                    
+                for row in failures:
+                    category_counts[row['category']] = category_counts.get(row['category'], 0) + row['count']
+                
+                for row in failures[:20]:
                     analysis["top_errors"].append({
-                        "error": error_msg,
-                        "count": count,
-                        "category": reason.value,
-                        "avg_retries": round(avg_retries, 2)
+                        "template_id": row['template_id'],
+                        "error": row['template'],
+                        "count": row['count'],
+                        "category": row['category'],
+                        "indexers": row['indexers'],
+                        "avg_retries": round(row['avg_retries'], 2)
                     })
                 
                 analysis["categories"] = dict(sorted(category_counts.items(), 
                                                    key=lambda x: x[1], reverse=True))
                 
+                # Retry activity per reason
+                cursor.execute("""
+                    SELECT e.failure_reason, COUNT(*) as retries,
+                           COUNT(DISTINCT e.download_id) as downloads,
+                           AVG(s.total_retry_time) as avg_retry_time
+                    FROM download_retry_events e
+                    JOIN download_retry_summary s ON s.download_id = e.download_id
+                    WHERE e.created_at > ?
+                    GROUP BY e.failure_reason
+                    ORDER BY retries DESC
+                """, ((datetime.now() - timedelta(days=7)).isoformat(),))
+                
+                analysis["retry_activity"] = {
+                    row['failure_reason']: {
+                        "retries": row['retries'],
+                        "downloads": row['downloads'],
+                        "avg_retry_time": round(row['avg_retry_time'] or 0, 1)
+                    }
+                    for row in cursor.fetchall()
+                }
+                
                 # Generate recommendations
                 if category_counts.get(RetryReason.RATE_LIMITED.value, 0) > 10:
                     analysis["recommendations"].append(
@@ -438,28 +670,29 @@ class RetryManager:
         
         try:
             # Get retry candidates
-            candidates = self.get_retry_candidates()
+            candidates = self.apply_retry_budgets(self.get_retry_candidates())
+            dispatched = self.retry_downloads([download.id for download, _ in candidates])
             
+            retry_events = []
             for download, delay in candidates:
                 try:
-                    if self.retry_download(download.id):
+                    if dispatched.get(download.id):
                         cycle_results["retries_successful"] += 1
                         
-                        # Update retry metadata
                         failure_reason = self.categorize_failure(download.error_message or "")
                         next_retry = datetime.now() + timedelta(seconds=delay)
-                        self.update_retry_metadata(download.id, failure_reason, next_retry)
+                        retry_events.append((download.id, failure_reason, next_retry))
                     
                     cycle_results["retries_attempted"] += 1
                     
-                    # Small delay between retries to avoid overwhelming the system
-                    time.sleep(2)
-                    
                 except Exception as e:
                     error_msg = f"Error retrying download {download.id}: {e}"
                     logger.error(error_msg)
                     cycle_results["errors"].append(error_msg)
             
+            # Update retry metadata
+            self.record_retry_events(retry_events)
+            
             # Clean up excessive failures
             cycle_results["failures_cleaned"] = self.cleanup_excessive_failures()
             
@@ -476,6 +709,30 @@ class RetryManager:
         
         return cycle_results
     
+    def run_scheduled(self, poll_interval: int = 60):
+        """Run retry cycles as retries come due.
+        
+        The timer heap tells the loop when the earliest retry is due; new
+        failures are picked up every poll_interval seconds. Each wake-up
+        only reads rows whose next_retry_at has passed.
+        """
+        logger.info("Starting scheduled retry loop")
+        self.load_retry_schedule()
+        
+        while True:
+            self.schedule_new_failures()
+            
+            next_due = self.retry_timer.next_due()
+            if next_due is not None and next_due <= time.time():
+                self.retry_timer.pop_due()
+                self.run_retry_cycle()
+                continue
+            
+            sleep_for = poll_interval
+            if next_due is not None:
+                sleep_for = min(poll_interval, max(1, next_due - time.time()))
+            time.sleep(sleep_for)
+    
     def _row_to_failed_download(self, row: sqlite3.Row) -> FailedDownload:
         """Convert database row to FailedDownload object."""
         return FailedDownload(
@@ -491,7 +748,8 @@ class RetryManager:
             error_message=row['error_message'],
             last_attempt=datetime.fromisoformat(row['updated_at']),
             created_at=datetime.fromisoformat(row['created_at']),
-            priority=row['priority']
+            priority=row['priority'],
+            next_retry_at=datetime.fromisoformat(row['next_retry_at']) if row['next_retry_at'] else None
         )
     
     def _archive_failed_download(self, conn: sqlite3.Connection, download_id: int):
@@ -524,8 +782,10 @@ class RetryManager:
 def main():
     parser = argparse.ArgumentParser(description='FolioFox Download Retry Manager')
     parser.add_argument('--config', default='./config/config.yaml', help='Configuration file path')
-    parser.add_argument('--mode', choices=['retry', 'analyze', 'cleanup'], default='retry',
+    parser.add_argument('--mode', choices=['retry', 'daemon', 'analyze', 'cleanup'], default='retry',
                        help='Operation mode')
+    parser.add_argument('--poll-interval', type=int, default=60,
+                       help='Seconds between checks for new failures in daemon mode')
     parser.add_argument('--max-retries', type=int, help='Override max retries')
     parser.add_argument('--cleanup-age', type=int, default=7, 
                        help='Age in days for cleaning up excessive failures')
@@ -541,6 +801,12 @@ def main():
         # Analyze failure patterns
         analysis = manager.analyze_failure_patterns()
         print(json.dumps(analysis, indent=2))
+    elif args.mode == 'daemon':
+        # Retry downloads as their scheduled times come due
+        try:
+            manager.run_scheduled(args.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Retry manager stopped by user")
     elif args.mode == 'cleanup':
         # Clean up excessive failures
         cleaned = manager.cleanup_excessive_failures(args.cleanup_age)
@@ -21,6 +21,9 @@ import yaml
 from collections import defaultdict, deque
 import statistics
 
+sys.path.append(str(Path(__file__).parent.parent / 'system_maintenance'))
+from report_sink import ReportSink
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -242,6 +245,9 @@ class FailoverManager:
             'last_request_time': None
         })
         
+        # Reports are appended to a rotating, compressed store
+        self.report_sink = ReportSink.from_config('failover_report', self.config.get('monitoring', {}).get('reports', {}))
+        
         self.running = False
         
     def _load_config(self, config_path: str) -> Dict:
@@ -576,6 +582,40 @@ class FailoverManager:
                 
             except Exception as e:
                 logger.error(f"Error processing health check for indexer {indexer_id}: {e}")
+        
+        self._store_circuit_states()
+    
+    def _store_circuit_states(self):
+        """Publish circuit breaker state for other components, such as the retry manager."""
+        try:
+            now = datetime.now()
+            rows = []
+            for indexer_id, cb in self.circuit_breakers.items():
+                retry_after = None
+                if cb.state == "OPEN" and cb.last_failure_time:
+                    retry_after = (cb.last_failure_time + timedelta(seconds=cb.recovery_timeout)).isoformat()
+                rows.append((
+                    indexer_id, cb.state, cb.failure_count,
+                    cb.last_failure_time.isoformat() if cb.last_failure_time else None,
+                    retry_after, now.isoformat()
+                ))
+            
+            with self.get_database_connection() as conn:
+                conn.executemany("""
+                    INSERT INTO indexer_circuit_state 
+                    (indexer_id, state, failure_count, last_failure_at, retry_after, updated_at)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(indexer_id) DO UPDATE SET
+                        state = excluded.state,
+                        failure_count = excluded.failure_count,
+                        last_failure_at = excluded.last_failure_at,
+                        retry_after = excluded.retry_after,
+                        updated_at = excluded.updated_at
+                """, rows)
+                conn.commit()
+                
+        except Exception as e:
+            logger.error(f"Error storing circuit breaker state: {e}")
     
     async def _store_health_check_result(self, health_metrics: HealthMetrics):
         """Store health check result in database."""
@@ -683,6 +723,7 @@ class FailoverManager:
         if health_metrics.status == IndexerStatus.HEALTHY:
             # Reset circuit breaker
             self.circuit_breakers[indexer_id].record_success()
+            self._store_circuit_states()
             
             # Update status
             await self._update_indexer_status(indexer_id, 'recovered', 'Automatic recovery')
@@ -939,11 +980,7 @@ class FailoverManager:
                 
                 # Generate and save report
                 report = self.generate_failover_report()
-                report_path = Path(f"/var/log/foliofox/failover_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-                report_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(report_path, 'w') as f:
-                    json.dump(report, f, indent=2, default=str)
+                self.report_sink.append(report)
                 
                 # Log summary
                 summary = report['summary']
@@ -21,6 +21,9 @@ import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
+sys.path.append(str(Path(__file__).parent.parent / 'system_maintenance'))
+from report_sink import ReportSink
+
 # Logging configuration
 logging.basicConfig(
     level=logging.INFO,
@@ -109,6 +112,9 @@ class HealthMonitor:
         self.metrics_cache: Dict[int, IndexerMetrics] = {}
         self.alert_cooldowns: Dict[int, datetime] = {}
         
+        # Reports are appended to a rotating, compressed store
+        self.report_sink = ReportSink.from_config('health_report', self.config.get('monitoring', {}).get('reports', {}))
+        
     def _load_config(self, config_path: str) -> Dict:
         """Load configuration from YAML file."""
         try:
@@ -848,11 +854,7 @@ The indexer has recovered and is now healthy.
                     
                     # Generate and save report
                     report = self.generate_health_report()
-                    report_path = Path(f"/var/log/foliofox/health_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
-                    report_path.parent.mkdir(parents=True, exist_ok=True)
-                    
-                    with open(report_path, 'w') as f:
-                        json.dump(report, f, indent=2)
+                    self.report_sink.append(report)
                     
                     # Log summary
                     summary = report["summary"]
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+FolioFox Archive Manager
+Moves old download rows into monthly partition tables kept in attached archive databases.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger('foliofox.archive_manager')
+
+# Archivable tables: (timestamp expression that picks the partition, column indexed in partitions)
+ARCHIVE_TABLES: Dict[str, Tuple[str, str]] = {
+    'download_queue': ("COALESCE(completed_at, updated_at, created_at)", 'updated_at'),
+    'download_history': ("completed_at", 'completed_at'),
+}
+
+# SQLite allows ten attached databases by default; one is kept in reserve
+MAX_ATTACHED_ARCHIVES = 9
+
+_PARTITION_NAME = re.compile(r'^(?P<table>\w+)_(?P<year>\d{4})_(?P<month>\d{2})$')
+
+
+class ArchiveManager:
+    """Moves rows out of hot tables into per-month archive partitions.
+
+    Each year has its own archive database file holding one table per
+    month and source table, e.g. download_history_2025_03 in
+    foliofox_archive_2025.db. Rows are moved in chunks of chunk_size so
+    the main database's write lock is only held briefly.
+
+    SQLite does not commit across attached WAL databases atomically, so
+    each chunk is first copied and committed in the archive, then deleted
+    from the main database in a second transaction. A crash in between
+    leaves rows in both places, and the next run copies them again
+    (INSERT OR REPLACE) before deleting.
+    """
+
+    def __init__(self, db_path: str, archive_dir: str, chunk_size: int = 500,
+                 pause_seconds: float = 0.05):
+        self.db_path = db_path
+        self.archive_dir = Path(archive_dir)
+        self.chunk_size = chunk_size
+        self.pause_seconds = pause_seconds
+
+    def _connect(self) -> sqlite3.Connection:
+        # Autocommit so every chunk controls its own transaction. Foreign keys
+        # are enforced so deletes cascade to retry and failure events.
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _archive_path(self, year: str) -> Path:
+        return self.archive_dir / f"foliofox_archive_{year}.db"
+
+    def _attach(self, conn: sqlite3.Connection, year: str) -> str:
+        schema = f"archive_{year}"
+        attached = {row['name'] for row in conn.execute("PRAGMA database_list")}
+        if schema not in attached:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            conn.execute("ATTACH DATABASE ? AS " + schema, (str(self._archive_path(year)),))
+        return schema
+
+    def _columns(self, conn: sqlite3.Connection, table: str, schema: str = 'main') -> List[sqlite3.Row]:
+        return conn.execute(f"PRAGMA {schema}.table_info({table})").fetchall()
+
+    def _ensure_partition(self, conn: sqlite3.Connection, schema: str, table: str, partition: str):
+        """Create a partition table shaped like the source table, adding new columns if needed."""
+        source_columns = self._columns(conn, table)
+        existing = {row['name'] for row in self._columns(conn, partition, schema)}
+
+        if not existing:
+            column_defs = ', '.join(
+                f"{row['name']} {row['type']}" + (" PRIMARY KEY" if row['pk'] else "")
+                for row in source_columns
+            )
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {schema}.{partition} ({column_defs})")
+            index_column = ARCHIVE_TABLES[table][1]
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {schema}.idx_{partition}_{index_column} "
+                f"ON {partition}({index_column})"
+            )
+            return
+
+        for row in source_columns:
+            if row['name'] not in existing:
+                conn.execute(f"ALTER TABLE {schema}.{partition} ADD COLUMN {row['name']} {row['type']}")
+
+    def archive_rows(self, table: str, where: str, params: Tuple = ()) -> int:
+        """Move rows of table matching where into their monthly partitions.
+
+        Returns the number of rows moved. where is evaluated against the
+        main table on every chunk, so it should use fixed cutoffs.
+        """
+        if table not in ARCHIVE_TABLES:
+            raise ValueError(f"Table {table} is not archivable")
+
+        partition_key = ARCHIVE_TABLES[table][0]
+        moved = 0
+        conn = self._connect()
+        try:
+            columns = ', '.join(row['name'] for row in self._columns(conn, table))
+            while True:
+                rows = conn.execute(f"""
+                    SELECT id, strftime('%Y_%m', {partition_key}) as month
+                    FROM {table}
+                    WHERE {where}
+                    ORDER BY id
+                    LIMIT ?
+                """, (*params, self.chunk_size)).fetchall()
+                if not rows:
+                    break
+
+                by_month: Dict[str, List[int]] = {}
+                for row in rows:
+                    by_month.setdefault(row['month'] or '0000_00', []).append(row['id'])
+
+                # ATTACH and DDL cannot run inside the chunk's transaction
+                targets = []
+                for month, ids in by_month.items():
+                    schema = self._attach(conn, month[:4])
+                    partition = f"{table}_{month}"
+                    self._ensure_partition(conn, schema, table, partition)
+                    targets.append((schema, partition, ids))
+
+                # Copy first and commit, so the rows are durable in the archive
+                # before they leave the main database
+                conn.execute("BEGIN")
+                try:
+                    for schema, partition, ids in targets:
+                        placeholders = ','.join('?' * len(ids))
+                        conn.execute(f"""
+                            INSERT OR REPLACE INTO {schema}.{partition} ({columns})
+                            SELECT {columns} FROM main.{table} WHERE id IN ({placeholders})
+                        """, ids)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+                # Rows that changed since the copy no longer match and stay put
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for _, _, ids in targets:
+                        placeholders = ','.join('?' * len(ids))
+                        moved += conn.execute(
+                            f"DELETE FROM main.{table} WHERE id IN ({placeholders}) AND ({where})",
+                            (*ids, *params)
+                        ).rowcount
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+
+                if len(rows) < self.chunk_size:
+                    break
+                time.sleep(self.pause_seconds)
+
+            if moved:
+                logger.info(f"Archived {moved} rows from {table}")
+        finally:
+            conn.close()
+
+        return moved
+
+    def archive_years(self) -> List[str]:
+        """Years that have an archive database, oldest first."""
+        years = []
+        for path in self.archive_dir.glob("foliofox_archive_*.db"):
+            year = path.stem.rsplit('_', 1)[-1]
+            if year.isdigit():
+                years.append(year)
+        return sorted(years)
+
+    def open_reporting_connection(self, years: Optional[Iterable[str]] = None) -> sqlite3.Connection:
+        """Open a read connection with <table>_all views over hot and archived rows.
+
+        Only the most recent MAX_ATTACHED_ARCHIVES years can be attached at
+        once; pass years to choose which.
+        """
+        years = sorted(years) if years is not None else self.archive_years()[-MAX_ATTACHED_ARCHIVES:]
+        if len(years) > MAX_ATTACHED_ARCHIVES:
+            raise ValueError(f"At most {MAX_ATTACHED_ARCHIVES} archive years can be attached")
+
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True, timeout=30.0)
+        conn.row_factory = sqlite3.Row
+        for year in years:
+            path = self._archive_path(year)
+            if path.exists():
+                conn.execute(f"ATTACH DATABASE ? AS archive_{year}", (f"file:{path}?mode=ro",))
+
+        for table in ARCHIVE_TABLES:
+            columns = [row['name'] for row in self._columns(conn, table)]
+            selects = [f"SELECT {', '.join(columns)} FROM main.{table}"]
+
+            for year in years:
+                schema = f"archive_{year}"
+                partitions = conn.execute(
+                    f"SELECT name FROM {schema}.sqlite_master WHERE type = 'table' AND name LIKE ? ORDER BY name",
+                    (f"{table}_%",)
+                ).fetchall() if self._archive_path(year).exists() else []
+
+                for partition_row in partitions:
+                    match = _PARTITION_NAME.match(partition_row['name'])
+                    if not match or match.group('table') != table:
+                        continue
+                    present = {row['name'] for row in self._columns(conn, partition_row['name'], schema)}
+                    select_list = ', '.join(c if c in present else f"NULL AS {c}" for c in columns)
+                    selects.append(f"SELECT {select_list} FROM {schema}.{partition_row['name']}")
+
+            conn.execute(f"CREATE TEMP VIEW {table}_all AS " + " UNION ALL ".join(selects))
+
+        return conn
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+FolioFox Chunked Executor
+Runs bulk UPDATE/DELETE statements in short rowid-range transactions.
+"""
+
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger('foliofox.chunked_executor')
+
+
+@dataclass
+class ChunkProgress:
+    label: str
+    rows_affected: int
+    chunks: int
+    next_rowid: Optional[int]  # Where to resume; None once the whole range is done
+    max_rowid: int
+    elapsed_seconds: float
+    longest_lock_ms: float
+
+    @property
+    def completed(self) -> bool:
+        return self.next_rowid is None
+
+
+class ChunkedExecutor:
+    """Applies a bulk UPDATE or DELETE one rowid range at a time.
+
+    Each range runs in its own BEGIN IMMEDIATE transaction and the executor
+    sleeps briefly between ranges so other writers, such as the Go backend,
+    can take the write lock. The range size adapts to keep every
+    transaction under max_lock_ms. A run stops at time_budget_seconds; the
+    next run of the same statement resumes from where it stopped.
+
+    Statements are NOT INDEXED so every chunk is a rowid range scan; left to
+    itself the planner prefers an index on the predicate, which rescans every
+    matching row on every chunk.
+    """
+
+    def __init__(self, db_path: str, chunk_rows: int = 500, min_chunk_rows: int = 50,
+                 max_chunk_rows: int = 5000, max_lock_ms: float = 5.0,
+                 pause_seconds: float = 0.005, time_budget_seconds: Optional[float] = 30.0,
+                 progress_interval_seconds: float = 5.0):
+        self.db_path = db_path
+        self.chunk_rows = chunk_rows
+        self.min_chunk_rows = min_chunk_rows
+        self.max_chunk_rows = max_chunk_rows
+        self.max_lock_ms = max_lock_ms
+        self.pause_seconds = pause_seconds
+        self.time_budget_seconds = time_budget_seconds
+        self.progress_interval_seconds = progress_interval_seconds
+
+        # Where each statement stopped when it ran out of time budget
+        self._resume_rowids: Dict[str, int] = {}
+
+    @classmethod
+    def from_config(cls, db_path: str, config: Dict) -> 'ChunkedExecutor':
+        """Build an executor from the database config section."""
+        return cls(
+            db_path,
+            chunk_rows=config.get('bulk_chunk_rows', 500),
+            max_lock_ms=config.get('bulk_max_lock_ms', 5.0),
+            pause_seconds=config.get('bulk_pause_seconds', 0.005),
+            time_budget_seconds=config.get('bulk_time_budget_seconds', 30.0)
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def update(self, table: str, set_clause: str, where: str, params: Tuple = (),
+               set_params: Tuple = (),
+               progress_callback: Optional[Callable[[ChunkProgress], None]] = None) -> ChunkProgress:
+        """UPDATE table SET set_clause WHERE where, in rowid chunks.
+
+        where should use fixed cutoffs: it is evaluated again on every chunk.
+        """
+        statement = f"UPDATE {table} NOT INDEXED SET {set_clause} WHERE rowid >= ? AND rowid < ? AND ({where})"
+        return self._run(table, f"update {table}", statement, set_params, params, progress_callback)
+
+    def delete(self, table: str, where: str, params: Tuple = (),
+               progress_callback: Optional[Callable[[ChunkProgress], None]] = None) -> ChunkProgress:
+        """DELETE FROM table WHERE where, in rowid chunks."""
+        statement = f"DELETE FROM {table} NOT INDEXED WHERE rowid >= ? AND rowid < ? AND ({where})"
+        return self._run(table, f"delete from {table}", statement, (), params, progress_callback)
+
+    def _run(self, table: str, label: str, statement: str, set_params: Tuple, params: Tuple,
+             progress_callback: Optional[Callable[[ChunkProgress], None]]) -> ChunkProgress:
+        started = time.monotonic()
+        conn = self._connect()
+        try:
+            min_rowid, max_rowid = conn.execute(f"SELECT MIN(rowid), MAX(rowid) FROM {table}").fetchone()
+            progress = ChunkProgress(label, 0, 0, None, max_rowid or 0, 0.0, 0.0)
+            if min_rowid is None:
+                return progress
+
+            rowid = max(min_rowid, self._resume_rowids.pop(statement, min_rowid))
+            chunk_rows = self.chunk_rows
+            last_report = started
+
+            while rowid <= max_rowid:
+                # Time only the lock hold, not the wait for another writer's lock
+                conn.execute("BEGIN IMMEDIATE")
+                lock_started = time.monotonic()
+                try:
+                    cursor = conn.execute(statement, (*set_params, rowid, rowid + chunk_rows, *params))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                lock_ms = (time.monotonic() - lock_started) * 1000
+
+                progress.rows_affected += max(cursor.rowcount, 0)
+                progress.chunks += 1
+                progress.longest_lock_ms = max(progress.longest_lock_ms, lock_ms)
+                rowid += chunk_rows
+
+                # Keep transactions short: shrink fast, grow slowly
+                if lock_ms > self.max_lock_ms:
+                    chunk_rows = max(self.min_chunk_rows, chunk_rows // 2)
+                elif lock_ms < self.max_lock_ms / 4:
+                    chunk_rows = min(self.max_chunk_rows, int(chunk_rows * 1.25) + 1)
+
+                now = time.monotonic()
+                progress.elapsed_seconds = now - started
+                progress.next_rowid = rowid if rowid <= max_rowid else None
+
+                if progress_callback and (now - last_report >= self.progress_interval_seconds or progress.completed):
+                    progress_callback(progress)
+                if now - last_report >= self.progress_interval_seconds:
+                    logger.info(f"{label}: {progress.rows_affected} rows in {progress.chunks} chunks, "
+                               f"at rowid {rowid} of {max_rowid}")
+                    last_report = now
+
+                if progress.completed:
+                    break
+                if self.time_budget_seconds is not None and progress.elapsed_seconds >= self.time_budget_seconds:
+                    logger.info(f"{label}: time budget reached, next run resumes from rowid {rowid}")
+                    self._resume_rowids[statement] = rowid
+                    break
+
+                # Yield the write lock to other connections
+                time.sleep(self.pause_seconds)
+
+            return progress
+        finally:
+            conn.close()
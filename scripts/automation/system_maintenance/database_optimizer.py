@@ -22,6 +22,9 @@ from enum import Enum
 import yaml
 import psutil
 
+sys.path.append(str(Path(__file__).parent))
+from archive_manager import ArchiveManager
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -111,6 +114,13 @@ class DatabaseOptimizer:
         self.enable_performance_monitoring = self.config.get('monitoring', {}).get('enable_performance_monitoring', True)
         self.query_timeout_seconds = self.config.get('monitoring', {}).get('query_timeout_seconds', 300)
         
+        # Old download history is moved to monthly archive partitions rather than deleted
+        self.archiver = ArchiveManager(
+            self.db_path,
+            self.config.get('database', {}).get('archive_dir', './data/archive'),
+            chunk_size=self.config.get('database', {}).get('archive_chunk_size', 500)
+        )
+        
         # Create directories
         self.backup_dir.mkdir(exist_ok=True, parents=True)
         
@@ -139,7 +149,7 @@ class DatabaseOptimizer:
     def _get_default_config(self) -> Dict:
         """Return default database optimization configuration."""
         return {
-            'database': {'path': './data/foliofox.db'},
+            'database': {'path': './data/foliofox.db', 'archive_dir': './data/archive', 'archive_chunk_size': 500},
             'maintenance': {
                 'auto_vacuum_threshold_mb': 100,
                 'fragmentation_threshold_percent': 25,
@@ -508,17 +518,6 @@ class DatabaseOptimizer:
                 total_rows_deleted += health_deleted
                 cleanup_operations.append(f"Deleted {health_deleted} old health check records")
                 
-                # Clean up completed downloads older than retention period
-                download_cutoff = (datetime.now() - timedelta(days=self.cleanup_retention_days)).isoformat()
-                cursor.execute("""
-                    DELETE FROM download_history 
-                    WHERE completed_at < ? AND final_status = 'completed'
-                """, (download_cutoff,))
-                
-                downloads_deleted = cursor.rowcount
-                total_rows_deleted += downloads_deleted
-                cleanup_operations.append(f"Deleted {downloads_deleted} old download history records")
-                
                 # Clean up old maintenance task records
                 cursor.execute("""
                     DELETE FROM maintenance_tasks 
@@ -531,6 +530,14 @@ class DatabaseOptimizer:
                 
                 conn.commit()
             
+            # Archive completed downloads older than retention period, in chunks
+            download_cutoff = (datetime.now() - timedelta(days=self.cleanup_retention_days)).isoformat()
+            downloads_archived = self.archiver.archive_rows(
+                'download_history', "completed_at < ? AND final_status = 'completed'", (download_cutoff,)
+            )
+            total_rows_deleted += downloads_archived
+            cleanup_operations.append(f"Archived {downloads_archived} old download history records")
+            
             task.status = OptimizationStatus.SUCCESS
             task.rows_affected = total_rows_deleted
             task.details['cleanup_operations'] = cleanup_operations
@@ -24,6 +24,9 @@ import yaml
 import sqlite3
 from collections import defaultdict, Counter
 
+sys.path.append(str(Path(__file__).parent.parent / 'download_queue'))
+from failure_classifier import extract_error_signature
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -675,37 +678,7 @@ class LogManager:
     
     def _extract_error_pattern(self, line: str) -> Optional[str]:
         """Extract meaningful error pattern from log line."""
-        # Remove timestamps and log levels for pattern matching
-        cleaned_line = re.sub(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}', '', line)
-        cleaned_line = re.sub(r'(DEBUG|INFO|WARNING|ERROR|CRITICAL)', '', cleaned_line)
-        
-        # Common error patterns
-        patterns = [
-            r'FileNotFoundError.*?([a-zA-Z0-9_/\\.]+)',
-            r'ConnectionError.*?(connection|timeout|refused)',
-            r'PermissionError.*?(permission|access)',
-            r'ValueError.*?(invalid|value|format)',
-            r'KeyError.*?[\'"]([a-zA-Z0-9_]+)[\'"]',
-            r'AttributeError.*?[\'"]([a-zA-Z0-9_]+)[\'"]',
-            r'ImportError.*?[\'"]([a-zA-Z0-9_.]+)[\'"]',
-            r'SQLite.*?(database|locked|corrupt)',
-            r'HTTP.*?(\d{3})',
-            r'Timeout.*?(timeout|expired)'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, cleaned_line, re.IGNORECASE)
-            if match:
-                return f"{pattern.split('.*?')[0].rstrip('.*?')}: {match.group(1) if match.lastindex else 'generic'}"
-        
-        # Generic error classification
-        if 'error' in cleaned_line.lower():
-            words = cleaned_line.lower().split()
-            error_idx = next((i for i, word in enumerate(words) if 'error' in word), -1)
-            if error_idx >= 0 and error_idx < len(words) - 1:
-                return f"Error: {words[error_idx + 1]}"
-        
-        return "Generic Error"
+        return extract_error_signature(line)
     
     def _extract_warning_pattern(self, line: str) -> Optional[str]:
         """Extract meaningful warning pattern from log line."""
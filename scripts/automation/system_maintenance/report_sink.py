@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+FolioFox Report Sink
+Rotating, compressed, line-delimited storage for periodic monitor reports.
+"""
+
+import gzip
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('foliofox.report_sink')
+
+SEGMENT_TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+
+class ReportSink:
+    """Appends reports as JSON lines to time-stamped segment files.
+
+    The active segment is plain text so appends stay cheap; once it passes
+    max_segment_bytes or segment_seconds it is gzip-compressed and a new one
+    is started. Segment names carry their start time, so range reads only
+    open segments that can overlap the range. Compressed segments beyond
+    retention_days or max_total_bytes are deleted, oldest first.
+    """
+
+    def __init__(self, directory: str, name: str,
+                 max_segment_bytes: int = 8 * 1024 * 1024,
+                 segment_seconds: int = 86400,
+                 max_total_bytes: int = 512 * 1024 * 1024,
+                 retention_days: int = 30):
+        self.directory = Path(directory)
+        self.name = name
+        self.max_segment_bytes = max_segment_bytes
+        self.segment_seconds = segment_seconds
+        self.max_total_bytes = max_total_bytes
+        self.retention_days = retention_days
+
+        self._active_path: Optional[Path] = None
+        self._active_started: Optional[datetime] = None
+
+    @classmethod
+    def from_config(cls, name: str, config: Dict) -> 'ReportSink':
+        """Build a sink from a monitoring.reports config section."""
+        return cls(
+            config.get('directory', '/var/log/foliofox/reports'),
+            name,
+            max_segment_bytes=config.get('max_segment_bytes', 8 * 1024 * 1024),
+            segment_seconds=config.get('segment_seconds', 86400),
+            max_total_bytes=config.get('max_total_bytes', 512 * 1024 * 1024),
+            retention_days=config.get('retention_days', 30)
+        )
+
+    def _segment_path(self, started: datetime, compressed: bool = False) -> Path:
+        suffix = '.jsonl.gz' if compressed else '.jsonl'
+        return self.directory / f"{self.name}-{started.strftime(SEGMENT_TIME_FORMAT)}{suffix}"
+
+    def _segments(self) -> List[Tuple[datetime, Path]]:
+        """All segments of this sink, oldest first."""
+        segments = []
+        for path in self.directory.glob(f"{self.name}-*.jsonl*"):
+            stamp = path.name[len(self.name) + 1:].split('.', 1)[0]
+            try:
+                segments.append((datetime.strptime(stamp, SEGMENT_TIME_FORMAT), path))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def _open_active(self, now: datetime):
+        """Resume an uncompressed segment left by a previous run, or start one."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        for started, path in reversed(self._segments()):
+            if path.suffix == '.jsonl':
+                self._active_path, self._active_started = path, started
+                return
+        self._active_path, self._active_started = self._segment_path(now), now
+
+    def append(self, report: Dict, timestamp: Optional[datetime] = None):
+        """Append one report, rotating the active segment when it is full or old."""
+        timestamp = timestamp or datetime.now()
+        if self._active_path is None:
+            self._open_active(timestamp)
+
+        if self._active_path.exists() and (
+            self._active_path.stat().st_size >= self.max_segment_bytes or
+            (timestamp - self._active_started).total_seconds() >= self.segment_seconds
+        ):
+            self.rotate(timestamp)
+
+        line = json.dumps({'timestamp': timestamp.isoformat(), 'report': report},
+                          separators=(',', ':'), default=str)
+        with open(self._active_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+    def rotate(self, now: Optional[datetime] = None):
+        """Compress the active segment and start a new one."""
+        now = now or datetime.now()
+        if self._active_path is not None and self._active_path.exists():
+            compressed_path = self._segment_path(self._active_started, compressed=True)
+            try:
+                with open(self._active_path, 'rb') as src, gzip.open(compressed_path, 'wb') as dst:
+                    while True:
+                        chunk = src.read(1024 * 1024)
+                        if not chunk:
+                            break
+                        dst.write(chunk)
+                os.remove(self._active_path)
+            except OSError as e:
+                logger.error(f"Error compressing report segment {self._active_path}: {e}")
+
+        self._active_path, self._active_started = self._segment_path(now), now
+        self.apply_retention(now)
+
+    def apply_retention(self, now: Optional[datetime] = None) -> int:
+        """Delete compressed segments past the age or total size limits."""
+        now = now or datetime.now()
+        cutoff = now - timedelta(days=self.retention_days)
+        compressed = [(started, path) for started, path in self._segments() if path.suffix == '.gz']
+
+        total_bytes = sum(path.stat().st_size for _, path in compressed)
+        removed = 0
+        for index, (started, path) in enumerate(compressed):
+            # A segment is older than the cutoff once its successor started before it
+            ends = compressed[index + 1][0] if index + 1 < len(compressed) else self._active_started or now
+            if ends >= cutoff and total_bytes <= self.max_total_bytes:
+                break
+            try:
+                total_bytes -= path.stat().st_size
+                path.unlink()
+                removed += 1
+            except OSError as e:
+                logger.error(f"Error removing report segment {path}: {e}")
+
+        if removed:
+            logger.info(f"Removed {removed} expired {self.name} report segments")
+        return removed
+
+    def read_range(self, start: datetime, end: Optional[datetime] = None) -> Iterator[Dict]:
+        """Yield stored records with start <= timestamp <= end, oldest first."""
+        end = end or datetime.now()
+        segments = self._segments()
+        for index, (started, path) in enumerate(segments):
+            next_started = segments[index + 1][0] if index + 1 < len(segments) else None
+            if started > end or (next_started is not None and next_started < start):
+                continue
+
+            opener = gzip.open if path.suffix == '.gz' else open
+            try:
+                with opener(path, 'rt', encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            continue  # Partially written line
+                        timestamp = datetime.fromisoformat(record['timestamp'])
+                        if start <= timestamp <= end:
+                            yield record
+            except (OSError, EOFError) as e:
+                logger.error(f"Error reading report segment {path}: {e}")
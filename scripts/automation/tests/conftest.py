@@ -0,0 +1,29 @@
+"""Shared helpers for the automation script tests."""
+
+import importlib
+import logging
+import sys
+from pathlib import Path
+from unittest import mock
+
+AUTOMATION_DIR = Path(__file__).resolve().parent.parent
+MIGRATIONS_DIR = AUTOMATION_DIR.parent.parent / 'database' / 'migrations'
+
+
+def import_script(package: str, module: str):
+    """Import a script module the way its siblings do.
+
+    The scripts log to files under /var/log/foliofox at import time; those
+    handlers are replaced so tests run without that directory.
+    """
+    package_dir = str(AUTOMATION_DIR / package)
+    if package_dir not in sys.path:
+        sys.path.insert(0, package_dir)
+    with mock.patch('logging.FileHandler', lambda *args, **kwargs: logging.NullHandler()):
+        return importlib.import_module(module)
+
+
+def apply_migrations(conn):
+    """Create the schema by applying every up migration in order."""
+    for path in sorted(MIGRATIONS_DIR.glob('*.up.sql')):
+        conn.executescript(path.read_text())
@@ -0,0 +1,91 @@
+"""Moving queue and history rows into archive partitions."""
+
+import sqlite3
+
+import pytest
+
+from conftest import apply_migrations, import_script
+
+archive_manager = import_script('system_maintenance', 'archive_manager')
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'foliofox.db'
+    conn = sqlite3.connect(path)
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'u', 'u@example.com', 'x')")
+    conn.execute("INSERT INTO indexers (id, name, base_url, indexer_type) VALUES (1, 'i', 'http://i', 'public')")
+    for download_id in range(1, 6):
+        conn.execute("""
+            INSERT INTO download_queue (id, user_id, indexer_id, title, download_url, file_format,
+                                        status, completed_at, updated_at)
+            VALUES (?, 1, 1, ?, 'http://i/f', 'epub', 'completed', '2024-03-10 12:00:00', '2024-03-10 12:00:00')
+        """, (download_id, f'Book {download_id}'))
+        conn.execute("""
+            INSERT INTO download_history (queue_id, user_id, indexer_id, title, file_format, final_status, completed_at)
+            VALUES (?, 1, 1, ?, 'epub', 'completed', datetime('now'))
+        """, (download_id, f'Book {download_id}'))
+        conn.execute("INSERT INTO download_retry_events (download_id, failure_reason) VALUES (?, 'timeout')",
+                     (download_id,))
+    conn.execute("INSERT INTO failure_templates (id, template) VALUES (1, 'Connection <*>')")
+    conn.execute("""
+        INSERT INTO download_failure_events (download_id, template_id, indexer_id, category)
+        VALUES (1, 1, 1, 'network_error')
+    """)
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+def test_archiving_queue_rows_cascades_to_events_and_keeps_history(db_path, tmp_path):
+    archiver = archive_manager.ArchiveManager(db_path, str(tmp_path / 'archive'), chunk_size=2, pause_seconds=0)
+
+    moved = archiver.archive_rows('download_queue', "status = 'completed'")
+
+    assert moved == 5
+    conn = sqlite3.connect(db_path)
+    assert count(conn, 'download_queue') == 0
+    assert count(conn, 'download_retry_events') == 0
+    assert count(conn, 'download_retry_summary') == 0
+    assert count(conn, 'download_failure_events') == 0
+    assert count(conn, 'download_history') == 5
+    assert count(conn, 'failure_template_stats') == 1
+
+    reporting = archiver.open_reporting_connection()
+    assert count(reporting, 'download_queue_all') == 5
+    assert reporting.execute("""
+        SELECT COUNT(*) FROM download_history h JOIN download_queue_all q ON q.id = h.queue_id
+    """).fetchone()[0] == 5
+
+
+def test_rows_copied_before_a_failed_delete_are_moved_on_the_next_run(db_path, tmp_path, monkeypatch):
+    archiver = archive_manager.ArchiveManager(db_path, str(tmp_path / 'archive'), chunk_size=10, pause_seconds=0)
+    connect = archiver._connect
+
+    def connect_failing_deletes():
+        # Stands in for a crash after the archive copy committed
+        conn = connect()
+        conn.execute("""
+            CREATE TEMP TRIGGER fail_delete BEFORE DELETE ON main.download_queue
+            BEGIN SELECT RAISE(ABORT, 'interrupted'); END
+        """)
+        return conn
+
+    monkeypatch.setattr(archiver, '_connect', connect_failing_deletes)
+    with pytest.raises(sqlite3.IntegrityError):
+        archiver.archive_rows('download_queue', "status = 'completed'")
+
+    conn = sqlite3.connect(db_path)
+    archive = sqlite3.connect(tmp_path / 'archive' / 'foliofox_archive_2024.db')
+    assert count(conn, 'download_queue') == 5
+    assert count(archive, 'download_queue_2024_03') == 5
+
+    monkeypatch.setattr(archiver, '_connect', connect)
+    assert archiver.archive_rows('download_queue', "status = 'completed'") == 5
+    assert count(conn, 'download_queue') == 0
+    assert count(archive, 'download_queue_2024_03') == 5
@@ -0,0 +1,69 @@
+"""Chunked UPDATE/DELETE execution over rowid ranges."""
+
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from conftest import import_script
+
+chunked_executor = import_script('system_maintenance', 'chunked_executor')
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'items.db'
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, status TEXT, priority INTEGER)")
+    conn.executemany("INSERT INTO items (status, priority) VALUES (?, 5)",
+                     [('pending' if i % 2 else 'failed',) for i in range(2000)])
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_update_applies_predicate_to_every_chunk(db_path):
+    executor = chunked_executor.ChunkedExecutor(db_path, chunk_rows=100, pause_seconds=0)
+
+    progress = executor.update('items', "priority = priority + ?", "status = ?", ('failed',), set_params=(1,))
+
+    assert progress.completed
+    assert progress.rows_affected == 1000
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT status, priority, COUNT(*) FROM items GROUP BY 1, 2 ORDER BY 1").fetchall() == [
+        ('failed', 6, 1000), ('pending', 5, 1000)
+    ]
+
+
+def test_runs_cut_short_by_the_time_budget_resume_where_they_stopped(db_path):
+    executor = chunked_executor.ChunkedExecutor(db_path, chunk_rows=100, max_chunk_rows=100,
+                                                pause_seconds=0, time_budget_seconds=0)
+
+    runs = []
+    while not runs or not runs[-1].completed:
+        runs.append(executor.update('items', "priority = priority + 1", "status = 'pending'"))
+
+    assert len(runs) == 20
+    assert sum(run.rows_affected for run in runs) == 1000
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT DISTINCT priority FROM items WHERE status = 'pending'").fetchall() == [(6,)]
+
+    # A completed sweep starts over from the first row
+    assert executor.update('items', "priority = priority + 1", "status = 'pending'").next_rowid == 101
+
+
+def test_lock_time_excludes_waiting_for_another_writer(db_path):
+    executor = chunked_executor.ChunkedExecutor(db_path, chunk_rows=5000, pause_seconds=0)
+    holder = sqlite3.connect(db_path, isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, lambda: holder.execute("COMMIT"))
+    release.start()
+
+    started = time.monotonic()
+    progress = executor.update('items', "priority = 1", "status = 'pending'")
+    release.join()
+
+    assert time.monotonic() - started >= 0.25
+    assert progress.longest_lock_ms < 200
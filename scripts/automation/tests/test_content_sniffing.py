@@ -0,0 +1,33 @@
+"""Identifying downloaded content from its leading bytes."""
+
+import pytest
+
+pytest.importorskip('aiohttp')
+pytest.importorskip('psutil')
+pytest.importorskip('yaml')
+
+from conftest import import_script
+
+advanced_queue_manager = import_script('download_queue', 'advanced_queue_manager')
+sniff_content_type = advanced_queue_manager.sniff_content_type
+
+
+@pytest.mark.parametrize('head', [
+    b'<!DOCTYPE html><html><head><title>Login</title>',
+    b'\xef\xbb\xbf\r\n  <html lang="en">',
+    b'\n\n<HTML>',
+])
+def test_html_pages_are_recognised(head):
+    assert sniff_content_type(head) == 'html'
+
+
+@pytest.mark.parametrize('head', [
+    b'Chapter 1\n\nEvery page starts with a <head> element.',
+    b'<?xml version="1.0"?><FictionBook><description><head>',
+])
+def test_documents_mentioning_head_are_not_html(head):
+    assert sniff_content_type(head) != 'html'
+
+
+def test_bom_is_only_skipped_as_a_whole():
+    assert sniff_content_type(b'\xbb\xbf<html>') != 'html'
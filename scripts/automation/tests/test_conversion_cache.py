@@ -0,0 +1,129 @@
+"""Conversion cache entries and the persistent conversion job queue."""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+
+import pytest
+
+pytest.importorskip('yaml')
+pytest.importorskip('PIL')
+
+from conftest import apply_migrations, import_script
+
+format_validator = import_script('book_processing', 'format_validator')
+
+
+@pytest.fixture
+def validator(tmp_path):
+    db_path = tmp_path / 'foliofox.db'
+    conn = sqlite3.connect(db_path)
+    apply_migrations(conn)
+    conn.close()
+
+    config = tmp_path / 'config.yaml'
+    config.write_text(json.dumps({
+        'database': {'path': str(db_path)},
+        'processing': {'temp_dir': str(tmp_path / 'temp'), 'backup_originals': False},
+        'conversion': {'cache_dir': str(tmp_path / 'cache')},
+    }))
+    return format_validator.FormatValidator(str(config))
+
+
+def test_output_served_from_the_cache_is_independent_of_the_entry(validator, tmp_path):
+    cached = tmp_path / 'cached.epub'
+    cached.write_bytes(b'converted book')
+    output = tmp_path / 'output.epub'
+
+    validator._materialize_file(cached, output)
+    output.write_bytes(b'edited by the user')
+
+    assert cached.read_bytes() == b'converted book'
+    assert cached.stat().st_ino != output.stat().st_ino
+
+
+def test_submit_reuses_a_pending_job(validator):
+    scheduler = format_validator.ConversionScheduler(validator)
+
+    first = scheduler.submit('/books/a.mobi', format_validator.BookFormat.EPUB, {'compress': True})
+    second = scheduler.submit('/books/a.mobi', format_validator.BookFormat.EPUB, {'compress': True})
+
+    assert first == second
+    assert scheduler._claim_next_job()['id'] == first
+
+
+def make_scheduler(validator, instance_id):
+    scheduler = format_validator.ConversionScheduler(validator, max_workers=1)
+    scheduler.instance_id = instance_id
+    return scheduler
+
+
+def test_overlapping_runs_keep_to_their_own_jobs(validator, monkeypatch):
+    first = make_scheduler(validator, 'run-a')
+    second = make_scheduler(validator, 'run-b')
+    for name in ('a', 'b', 'c'):
+        first.submit(f'/books/{name}.mobi', format_validator.BookFormat.EPUB)
+
+    converted = []
+
+    async def convert_file(source_path, target_format, options=None):
+        converted.append(source_path)
+        await asyncio.sleep(0.05)
+        return format_validator.ConversionResult(
+            source_path=source_path, target_path=source_path.replace('.mobi', '.epub'),
+            source_format=format_validator.BookFormat.MOBI, target_format=target_format,
+            status=format_validator.ConversionStatus.SUCCESS, file_size_before=1, file_size_after=1,
+            quality_score=1.0, conversion_time_seconds=0.05, errors=[]
+        )
+
+    monkeypatch.setattr(validator, 'convert_file', convert_file)
+    monkeypatch.setattr(validator, 'probe_conversion_tools', lambda: {'calibre': True})
+
+    async def overlap():
+        earlier = asyncio.create_task(first.run_pending())
+        await asyncio.sleep(0.01)
+        return await asyncio.gather(earlier, second.run_pending())
+
+    summaries = asyncio.run(overlap())
+
+    assert sorted(converted) == ['/books/a.mobi', '/books/b.mobi', '/books/c.mobi']
+    assert sum(summary['succeeded'] for summary in summaries) == 3
+
+
+def test_only_expired_job_leases_are_reclaimed(validator):
+    first = make_scheduler(validator, 'run-a')
+    second = make_scheduler(validator, 'run-b')
+    job_id = first.submit('/books/a.mobi', format_validator.BookFormat.EPUB)
+    assert first._claim_next_job()['id'] == job_id
+
+    assert second.reclaim_expired_leases() == 0
+    assert second._claim_next_job() is None
+
+    with validator.get_database_connection() as conn:
+        conn.execute("UPDATE conversion_jobs SET lease_expires_at = datetime('now', '-1 seconds')")
+        conn.commit()
+
+    assert second.reclaim_expired_leases() == 1
+    assert second._claim_next_job()['id'] == job_id
+
+    # The earlier run can neither renew nor record the job any more
+    first._active_jobs[job_id] = None
+    assert first.renew_leases() == {job_id}
+    result = format_validator.ConversionResult(
+        source_path='/books/a.mobi', target_path='/books/a.epub',
+        source_format=format_validator.BookFormat.MOBI, target_format=format_validator.BookFormat.EPUB,
+        status=format_validator.ConversionStatus.SUCCESS, file_size_before=1, file_size_after=1,
+        quality_score=1.0, conversion_time_seconds=0.0, errors=[]
+    )
+    assert not first._finish_job(job_id, result)
+    assert second._finish_job(job_id, result)
+
+
+def test_checksum_covers_files_larger_than_one_read(validator, tmp_path):
+    source = tmp_path / 'book.pdf'
+    source.write_bytes(b'x' * (3 * 1024 * 1024 + 17))
+
+    checksum = asyncio.run(validator._calculate_checksum(source))
+
+    assert checksum == hashlib.sha256(source.read_bytes()).hexdigest()
@@ -0,0 +1,88 @@
+"""Download leases shared by queue manager instances."""
+
+import json
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('aiohttp')
+pytest.importorskip('psutil')
+pytest.importorskip('yaml')
+
+from conftest import apply_migrations, import_script
+
+advanced_queue_manager = import_script('download_queue', 'advanced_queue_manager')
+
+
+@pytest.fixture
+def local_timezone(monkeypatch):
+    """Switch the process time zone; the original zone is restored afterwards."""
+    def switch(zone):
+        monkeypatch.setenv('TZ', zone)
+        time.tzset()
+    yield switch
+    monkeypatch.undo()
+    time.tzset()
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    db_path = tmp_path / 'foliofox.db'
+    conn = sqlite3.connect(db_path)
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'u', 'u@example.com', 'x')")
+    conn.execute("INSERT INTO indexers (id, name, base_url, indexer_type) VALUES (1, 'i', 'http://i', 'public')")
+    conn.execute("""
+        INSERT INTO download_queue (id, user_id, indexer_id, title, download_url, file_format, status)
+        VALUES (1, 1, 1, 'Book', 'http://i/f', 'epub', 'pending')
+    """)
+    conn.commit()
+    conn.close()
+
+    path = tmp_path / 'config.yaml'
+    path.write_text(json.dumps({
+        'database': {'path': str(db_path)},
+        'downloads': {'path': str(tmp_path / 'downloads'), 'lease_seconds': 120},
+    }))
+    return str(path)
+
+
+def make_instance(config_path, instance_id):
+    manager = advanced_queue_manager.AdvancedQueueManager(config_path)
+    manager.instance_id = instance_id
+    return manager
+
+
+def test_leases_are_comparable_across_time_zones(config_path, local_timezone):
+    local_timezone('Pacific/Auckland')
+    owner = make_instance(config_path, 'host-a')
+    assert owner._claim_download(1) is not None
+
+    local_timezone('America/Los_Angeles')
+    other = make_instance(config_path, 'host-b')
+    assert other.reclaim_expired_leases() == []
+
+    with owner.get_database_connection() as conn:
+        expires_at = datetime.fromisoformat(conn.execute(
+            "SELECT lease_expires_at FROM download_queue WHERE id = 1"
+        ).fetchone()[0])
+    assert abs(expires_at - (datetime.utcnow() + timedelta(seconds=120))) < timedelta(seconds=5)
+
+
+def test_only_expired_leases_are_reclaimed(config_path):
+    owner = make_instance(config_path, 'host-a')
+    other = make_instance(config_path, 'host-b')
+    owner._claim_download(1)
+    owner.active_downloads[1] = None
+
+    assert owner.renew_leases() == set()
+    assert other.reclaim_expired_leases() == []
+
+    with owner.get_database_connection() as conn:
+        conn.execute("UPDATE download_queue SET lease_expires_at = datetime('now', '-1 seconds') WHERE id = 1")
+        conn.commit()
+
+    assert other.reclaim_expired_leases() == [1]
+    assert owner.renew_leases() == {1}
@@ -0,0 +1,42 @@
+"""Error message template mining."""
+
+from conftest import import_script
+
+failure_classifier = import_script('download_queue', 'failure_classifier')
+
+
+def mine(*messages):
+    miner = failure_classifier.ErrorTemplateMiner()
+    return [' '.join(miner.add(message)[0].tokens) for message in messages]
+
+
+def test_messages_differing_in_their_only_constant_word_stay_apart():
+    assert mine('Connection timeout', 'Connection refused') == ['Connection timeout', 'Connection refused']
+
+
+def test_status_codes_do_not_count_towards_similarity():
+    assert mine('HTTP 404 not found', 'HTTP 503 service unavailable') == [
+        'HTTP <*> not found', 'HTTP <*> service unavailable'
+    ]
+
+
+def test_messages_differing_in_one_value_share_a_template():
+    miner = failure_classifier.ErrorTemplateMiner()
+    miner.add('Read timed out after 30s from mirror alpha')
+
+    template, parameters, changed = miner.add('Read timed out after 30s from mirror beta')
+
+    assert ' '.join(template.tokens) == 'Read timed out after <*> from mirror <*>'
+    assert parameters == ['30s', 'beta']
+    assert changed
+
+
+def test_repeated_message_matches_its_template_unchanged():
+    miner = failure_classifier.ErrorTemplateMiner()
+    first, _, _ = miner.add('HTTP 503 service unavailable')
+
+    template, parameters, changed = miner.add('HTTP 502 service unavailable')
+
+    assert template is first
+    assert parameters == ['502']
+    assert not changed
@@ -0,0 +1,65 @@
+"""Failure templates recorded while scheduling new failures."""
+
+import json
+import sqlite3
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('yaml')
+
+from conftest import apply_migrations, import_script
+
+retry_manager = import_script('download_queue', 'retry_manager')
+
+
+@pytest.fixture
+def manager(tmp_path):
+    db_path = tmp_path / 'foliofox.db'
+    conn = sqlite3.connect(db_path)
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'u', 'u@example.com', 'x')")
+    conn.execute("INSERT INTO indexers (id, name, base_url, indexer_type) VALUES (1, 'i', 'http://i', 'public')")
+    conn.executemany("""
+        INSERT INTO download_queue (id, user_id, indexer_id, title, download_url, file_format,
+                                    status, error_message, updated_at)
+        VALUES (?, 1, 1, 'Book', 'http://i/f', 'epub', 'failed', ?, '2026-01-01T00:00:00')
+    """, [
+        (1, 'Read timed out after 30s from mirror alpha'),
+        (2, 'HTTP <*> service unavailable'),
+    ])
+    conn.commit()
+    conn.close()
+
+    config = tmp_path / 'config.yaml'
+    config.write_text(json.dumps({
+        'database': {'path': str(db_path)},
+        'server': {'api_token': 't'},
+    }))
+    return retry_manager.RetryManager(str(config))
+
+
+def test_rolled_back_templates_are_not_reused(manager, monkeypatch):
+    def fail(retry_count, failure_reason):
+        raise RuntimeError("scheduling failed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(manager, 'calculate_retry_delay', fail)
+        assert manager.schedule_new_failures() == 0
+
+    with manager.get_database_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM failure_templates").fetchone()[0] == 0
+
+    assert manager.schedule_new_failures() == 2
+
+    with manager.get_database_connection() as conn:
+        events = conn.execute("""
+            SELECT e.download_id, t.template
+            FROM download_failure_events e
+            JOIN failure_templates t ON t.id = e.template_id
+            ORDER BY e.download_id
+        """).fetchall()
+    assert [tuple(event) for event in events] == [
+        (1, 'Read timed out after <*> from mirror alpha'),
+        (2, 'HTTP <*> service unavailable'),
+    ]
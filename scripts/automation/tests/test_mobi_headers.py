@@ -0,0 +1,99 @@
+"""PalmDB/MOBI/EXTH header parsing against spec-conformant fixtures."""
+
+import asyncio
+import json
+import struct
+
+import pytest
+
+pytest.importorskip('yaml')
+pytest.importorskip('PIL')
+
+from conftest import import_script
+
+format_validator = import_script('book_processing', 'format_validator')
+
+MOBI_HEADER_LENGTH = 0xE8
+
+
+def build_mobi(palm_name: bytes, full_name: bytes, author: bytes = b'', language: int = 9) -> bytes:
+    """Build a two-record MOBI file; offsets follow the MobileRead MOBI spec.
+
+    Record 0 holds the PalmDOC header, the MOBI header (starting at record
+    0 offset 16), an optional EXTH block and the full name.
+    """
+    text = b'<html><body>Hello</body></html>'
+
+    exth = b''
+    if author:
+        record = struct.pack('>II', 100, 8 + len(author)) + author
+        exth = b'EXTH' + struct.pack('>II', 12 + len(record), 1) + record
+        exth += b'\x00' * (-len(exth) % 4)
+
+    full_name_offset = 16 + MOBI_HEADER_LENGTH + len(exth)
+    record0 = bytearray(full_name_offset + len(full_name) + 2)
+
+    # PalmDOC header: compression, unused, text length, record count, record size, encryption
+    struct.pack_into('>HHIHHH', record0, 0, 1, 0, len(text), 1, 4096, 0)
+
+    record0[16:20] = b'MOBI'
+    struct.pack_into('>I', record0, 0x14, MOBI_HEADER_LENGTH)
+    struct.pack_into('>I', record0, 0x18, 2)           # MOBI type: book
+    struct.pack_into('>I', record0, 0x1C, 65001)       # UTF-8
+    struct.pack_into('>I', record0, 0x24, 6)           # file version
+    struct.pack_into('>II', record0, 0x54, full_name_offset, len(full_name))
+    struct.pack_into('>I', record0, 0x5C, language)    # locale
+    struct.pack_into('>I', record0, 0x64, language)    # output language
+    struct.pack_into('>I', record0, 0x68, 6)           # min reader version
+    struct.pack_into('>I', record0, 0x80, 0x40 if exth else 0)
+    record0[16 + MOBI_HEADER_LENGTH:full_name_offset] = exth
+    record0[full_name_offset:full_name_offset + len(full_name)] = full_name
+
+    header = bytearray(78)
+    header[:len(palm_name)] = palm_name
+    header[60:68] = b'BOOKMOBI'
+    struct.pack_into('>H', header, 76, 2)
+
+    record0_offset = 78 + 2 * 8 + 2
+    record1_offset = record0_offset + len(record0)
+    table = struct.pack('>II', record0_offset, 0) + struct.pack('>II', record1_offset, 1) + b'\x00\x00'
+    return bytes(header) + table + bytes(record0) + text
+
+
+@pytest.fixture
+def validator(tmp_path):
+    config = tmp_path / 'config.yaml'
+    config.write_text(json.dumps({
+        'database': {'path': str(tmp_path / 'foliofox.db')},
+        'processing': {'temp_dir': str(tmp_path / 'temp'), 'backup_originals': False},
+        'conversion': {'cache_dir': str(tmp_path / 'cache')},
+    }))
+    return format_validator.FormatValidator(str(config))
+
+
+def validate(validator, path):
+    return asyncio.run(validator._validate_mobi(path))
+
+
+def test_full_name_is_read_from_record0_offsets(validator, tmp_path):
+    path = tmp_path / 'book.mobi'
+    path.write_bytes(build_mobi(b'Real_Title', 'Real Title'.encode(), author=b'Jane Author'))
+
+    result = validate(validator, path)
+
+    assert result['issues'] == []
+    assert result['status'] == format_validator.ValidationStatus.VALID
+    assert result['metadata']['format'] == 'MOBI'
+    assert result['metadata']['title'] == 'Real Title'
+    assert result['metadata']['authors'] == ['Jane Author']
+    assert result['metadata']['text_encoding'] == 'utf-8'
+
+
+def test_palmdb_name_kept_when_full_name_is_empty(validator, tmp_path):
+    path = tmp_path / 'book.mobi'
+    path.write_bytes(build_mobi(b'Palm_Name', b''))
+
+    result = validate(validator, path)
+
+    assert result['metadata']['title'] == 'Palm_Name'
+    assert 'authors' not in result['metadata']
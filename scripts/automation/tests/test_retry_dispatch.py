@@ -0,0 +1,117 @@
+"""Request contract of RetryManager's batch retry dispatch."""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+pytest.importorskip('requests')
+pytest.importorskip('yaml')
+
+from conftest import import_script
+
+retry_manager = import_script('download_queue', 'retry_manager')
+
+
+class StubBatchAPI(BaseHTTPRequestHandler):
+    """Answers POST /api/v1/downloads/queue/batch like the Go handler."""
+
+    requests_seen = []
+    status = 200
+    failing_ids = set()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.requests_seen.append((self.path, self.headers.get('Authorization'), body))
+
+        if self.status != 200:
+            payload = {'title': 'Unauthorized', 'status': self.status}
+        elif len(body['download_ids']) > 100:
+            self.status = 400
+            payload = {'error': 'Too many downloads (max 100)'}
+        else:
+            payload = {'results': [
+                {'download_id': download_id, 'success': download_id not in self.failing_ids}
+                | ({'error': 'not failed'} if download_id in self.failing_ids else {})
+                for download_id in body['download_ids']
+            ]}
+
+        encoded = json.dumps(payload).encode()
+        self.send_response(self.status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_api():
+    StubBatchAPI.requests_seen = []
+    StubBatchAPI.status = 200
+    StubBatchAPI.failing_ids = set()
+    server = HTTPServer(('127.0.0.1', 0), StubBatchAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_manager(tmp_path, port, **server_config):
+    config = tmp_path / 'config.yaml'
+    config.write_text(json.dumps({
+        'database': {'path': str(tmp_path / 'foliofox.db')},
+        'server': {'host': '127.0.0.1', 'port': port, **server_config},
+    }))
+    return retry_manager.RetryManager(str(config))
+
+
+def test_retry_batches_send_bearer_token_and_respect_id_limit(tmp_path, stub_api):
+    StubBatchAPI.failing_ids = {7, 150}
+    manager = make_manager(tmp_path, stub_api.server_port, api_token='secret-token')
+
+    results = manager.retry_downloads(list(range(1, 251)))
+
+    assert len(StubBatchAPI.requests_seen) == 3
+    for path, authorization, body in StubBatchAPI.requests_seen:
+        assert path == '/api/v1/downloads/queue/batch'
+        assert authorization == 'Bearer secret-token'
+        assert body['action'] == 'retry'
+        assert len(body['download_ids']) <= retry_manager.MAX_RETRY_BATCH_SIZE
+
+    sent = sorted(i for _, _, body in StubBatchAPI.requests_seen for i in body['download_ids'])
+    assert sent == list(range(1, 251))
+    assert results == {i: i not in {7, 150} for i in range(1, 251)}
+
+
+def test_configured_batch_size_is_capped_at_api_limit(tmp_path, stub_api):
+    config = tmp_path / 'config.yaml'
+    config.write_text(json.dumps({
+        'server': {'host': '127.0.0.1', 'port': stub_api.server_port, 'api_token': 't'},
+        'downloads': {'retry_batch_size': 500},
+    }))
+    manager = retry_manager.RetryManager(str(config))
+
+    manager.retry_downloads(list(range(1, 201)))
+
+    assert [len(body['download_ids']) for _, _, body in StubBatchAPI.requests_seen] == [100, 100]
+
+
+@pytest.mark.parametrize('status', [401, 403])
+def test_rejected_credentials_raise_instead_of_failing_ids(tmp_path, stub_api, status):
+    StubBatchAPI.status = status
+    manager = make_manager(tmp_path, stub_api.server_port, api_token='expired')
+
+    with pytest.raises(retry_manager.RetryDispatchAuthError):
+        manager.retry_downloads([1, 2, 3])
+
+
+def test_server_errors_fail_only_that_batch(tmp_path, stub_api):
+    StubBatchAPI.status = 500
+    manager = make_manager(tmp_path, stub_api.server_port, api_token='t')
+
+    assert manager.retry_downloads([1, 2]) == {1: False, 2: False}
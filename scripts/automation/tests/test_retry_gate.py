@@ -0,0 +1,84 @@
+"""Per-indexer retry budgets and the circuit breaker gate."""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import apply_migrations, import_script
+
+retry_gate = import_script('download_queue', 'retry_gate')
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = tmp_path / 'foliofox.db'
+    conn = sqlite3.connect(path)
+    apply_migrations(conn)
+    conn.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'u', 'u@example.com', 'x')")
+    for indexer_id in (1, 2):
+        conn.execute("INSERT INTO indexers (id, name, base_url, indexer_type) VALUES (?, ?, 'http://i', 'public')",
+                     (indexer_id, f'indexer {indexer_id}'))
+    for download_id in range(1, 7):
+        conn.execute("""
+            INSERT INTO download_queue (id, user_id, indexer_id, title, download_url, file_format,
+                                        status, retry_count, next_retry_at)
+            VALUES (?, 1, ?, ?, 'http://i/f', 'epub', 'failed', 1, ?)
+        """, (download_id, 1 if download_id <= 3 else 2, f'Book {download_id}', datetime.now().isoformat()))
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def make_gate(db_path, **kwargs):
+    return retry_gate.RetryGate(lambda: sqlite3.connect(db_path), **kwargs)
+
+
+def publish_circuit(db_path, indexer_id, state, retry_after, updated_at):
+    conn = sqlite3.connect(db_path)
+    conn.execute("""
+        INSERT OR REPLACE INTO indexer_circuit_state (indexer_id, state, retry_after, updated_at)
+        VALUES (?, ?, ?, ?)
+    """, (indexer_id, state, retry_after.isoformat(), updated_at.isoformat()))
+    conn.commit()
+    conn.close()
+
+
+def next_retry_at(db_path, download_id):
+    conn = sqlite3.connect(db_path)
+    return datetime.fromisoformat(conn.execute("SELECT next_retry_at FROM download_queue WHERE id = ?",
+                                               (download_id,)).fetchone()[0])
+
+
+CANDIDATES = [(1, 1), (2, 1), (3, 1), (4, 2), (5, 2), (6, 2)]
+
+
+def test_open_circuit_defers_its_indexer_until_the_probe_time(db_path):
+    retry_after = datetime.now() + timedelta(minutes=5)
+    publish_circuit(db_path, 1, 'OPEN', retry_after, datetime.now())
+    gate = make_gate(db_path)
+
+    admitted, deferrals = gate.admit(CANDIDATES)
+
+    assert admitted == [4, 5, 6]
+    assert [download_id for download_id, _ in deferrals] == [1, 2, 3]
+    assert next_retry_at(db_path, 1) == retry_after
+    assert next_retry_at(db_path, 3) == retry_after + timedelta(seconds=2 * gate.get_budget(1).spacing())
+
+
+def test_stale_circuit_state_is_ignored(db_path):
+    publish_circuit(db_path, 1, 'OPEN', datetime.now() + timedelta(hours=1),
+                    datetime.now() - timedelta(minutes=10))
+
+    admitted, deferrals = make_gate(db_path, circuit_stale_seconds=300).admit(CANDIDATES)
+
+    assert admitted == [1, 2, 3, 4, 5, 6]
+    assert deferrals == []
+
+
+def test_budget_limits_retries_per_indexer(db_path):
+    admitted, deferrals = make_gate(db_path, burst=2).admit(CANDIDATES)
+
+    assert admitted == [1, 2, 4, 5]
+    assert [download_id for download_id, _ in deferrals] == [3, 6]
+    assert next_retry_at(db_path, 3) > datetime.now()
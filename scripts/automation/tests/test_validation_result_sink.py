@@ -0,0 +1,81 @@
+"""Batched persistence of validation results."""
+
+import sqlite3
+
+import pytest
+
+pytest.importorskip('yaml')
+pytest.importorskip('PIL')
+
+from conftest import apply_migrations, import_script
+
+format_validator = import_script('book_processing', 'format_validator')
+
+
+class FlakyDatabase:
+    """Connection factory that can be switched to fail like a locked database."""
+
+    def __init__(self, path):
+        self.path = path
+        self.failing = False
+
+    def __call__(self):
+        if self.failing:
+            raise sqlite3.OperationalError('database is locked')
+        return sqlite3.connect(self.path)
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'foliofox.db'
+    conn = sqlite3.connect(path)
+    apply_migrations(conn)
+    conn.execute("INSERT INTO books (id, title) VALUES (1, 'Book')")
+    conn.executemany("INSERT INTO book_files (id, book_id, format_id, file_path) VALUES (?, 1, 1, ?)",
+                     [(file_id, f'/books/{file_id}.epub') for file_id in range(1, 21)])
+    conn.commit()
+    conn.close()
+    return FlakyDatabase(str(path))
+
+
+def add_results(sink, file_ids):
+    for file_id in file_ids:
+        sink.add(file_id, format_validator.ValidationResult(
+            file_path=f'/books/{file_id}.epub', format=format_validator.BookFormat.EPUB,
+            status=format_validator.ValidationStatus.VALID, file_size=1, checksum=f'sum{file_id}',
+            mime_type='application/epub+zip', metadata={}, issues=[], quality_score=90,
+            processing_time_seconds=0.0
+        ))
+
+
+def test_flush_updates_book_files_and_checkpoint(database):
+    sink = format_validator.ValidationResultSink(database, batch_size=100)
+    sink.checkpoint_enabled = True
+    add_results(sink, range(1, 6))
+
+    assert sink.flush() == 5
+
+    conn = sqlite3.connect(database.path)
+    assert conn.execute("""
+        SELECT COUNT(*) FROM book_files WHERE checksum IS NOT NULL AND updated_at IS NOT NULL
+    """).fetchone()[0] == 5
+    assert sink.last_flushed_id() == 5
+
+
+def test_failing_flushes_cap_the_buffer_and_hold_the_checkpoint(database):
+    sink = format_validator.ValidationResultSink(database, batch_size=4, max_buffered=8)
+    sink.checkpoint_enabled = True
+
+    database.failing = True
+    add_results(sink, range(1, 13))
+    assert len(sink._buffer) <= 8
+
+    database.failing = False
+    add_results(sink, range(13, 17))
+    sink.flush()
+    assert sink.last_flushed_id() < 5
+
+    # Once the dropped files have been validated again the checkpoint moves on
+    add_results(sink, range(1, 5))
+    sink.flush()
+    assert sink.last_flushed_id() == 16
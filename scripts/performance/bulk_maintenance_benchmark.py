@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+FolioFox Bulk Maintenance Benchmark
+
+Measures how long a concurrent writer stalls while queue maintenance runs
+over a large download_queue:
+- baseline: each maintenance statement as a single UPDATE/DELETE
+- chunked: the same statements through ChunkedExecutor
+
+Both runs start from copies of one generated database (schema from
+database/migrations) and must leave identical rows behind.
+"""
+
+import argparse
+import json
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.append(str(REPO_ROOT / 'scripts' / 'automation' / 'system_maintenance'))
+from chunked_executor import ChunkedExecutor
+
+STATUSES = ['pending', 'downloading', 'completed', 'failed']
+
+
+def maintenance_statements(now: datetime):
+    """(SET clause or None for a DELETE, WHERE clause, params), as run by the queue monitor.
+
+    Cutoffs are fixed so both runs touch exactly the same rows.
+    """
+    return [
+        (None, "status = 'completed' AND updated_at < ?",
+         ((now - timedelta(days=30)).strftime('%Y-%m-%d %H:%M:%S'),)),
+        ("priority = CASE WHEN priority > 1 THEN priority - 1 ELSE 1 END",
+         "status = 'pending' AND created_at < ? AND priority > 1",
+         ((now - timedelta(hours=1)).strftime('%Y-%m-%d %H:%M:%S'),)),
+        ("priority = CASE WHEN priority < 10 THEN priority + 1 ELSE 10 END",
+         "status = 'failed' AND retry_count >= 2 AND priority < 10", ()),
+    ]
+
+
+def build_database(path: Path, rows: int, seed: int):
+    conn = sqlite3.connect(path)
+    for migration in sorted((REPO_ROOT / 'database' / 'migrations').glob('*.up.sql')):
+        conn.executescript(migration.read_text())
+    conn.execute("INSERT INTO users (id, username, email, password_hash) VALUES (1, 'bench', 'bench@example.com', 'x')")
+    conn.execute("INSERT INTO indexers (id, name, base_url, indexer_type) VALUES (1, 'bench', 'http://bench', 'public')")
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    conn.executemany("""
+        INSERT INTO download_queue (user_id, indexer_id, title, download_url, file_format, status,
+                                    retry_count, priority, created_at, updated_at)
+        VALUES (1, 1, ?, 'http://bench/file', 'epub', ?, ?, ?, ?, ?)
+    """, (
+        (f"Book {i}", rng.choice(STATUSES), rng.randint(0, 4), rng.randint(1, 10),
+         (now - timedelta(seconds=rng.randint(0, 2 * 3600))).strftime('%Y-%m-%d %H:%M:%S'),
+         (now - timedelta(seconds=rng.randint(0, 60 * 86400))).strftime('%Y-%m-%d %H:%M:%S'))
+        for i in range(rows)
+    ))
+    conn.commit()
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.close()
+
+
+def run_baseline(db_path: Path, statements):
+    conn = sqlite3.connect(db_path, timeout=60)
+    for set_clause, where, params in statements:
+        if set_clause is None:
+            conn.execute(f"DELETE FROM download_queue WHERE {where}", params)
+        else:
+            conn.execute(f"UPDATE download_queue SET {set_clause} WHERE {where}", params)
+        conn.commit()
+    conn.close()
+
+
+def run_chunked(db_path: Path, statements):
+    executor = ChunkedExecutor(str(db_path))
+    for set_clause, where, params in statements:
+        progress = None
+        while progress is None or not progress.completed:
+            if set_clause is None:
+                progress = executor.delete('download_queue', where, params)
+            else:
+                progress = executor.update('download_queue', set_clause, where, params)
+
+
+def measure(db_path: Path, maintenance, statements):
+    """Run maintenance while another connection keeps writing; return writer stall stats."""
+    stop = threading.Event()
+    latencies = []
+
+    def writer():
+        conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        while not stop.is_set():
+            started = time.perf_counter()
+            conn.execute("UPDATE download_queue SET retry_count = retry_count WHERE id = 1")
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.001)
+        conn.close()
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    time.sleep(0.05)
+    started = time.perf_counter()
+    maintenance(db_path, statements)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    thread.join()
+
+    latencies.sort()
+    return {
+        'maintenance_seconds': round(elapsed, 2),
+        'writer_max_ms': round(latencies[-1], 1),
+        'writer_p99_ms': round(latencies[len(latencies) * 99 // 100], 1),
+        'writer_statements': len(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FolioFox Bulk Maintenance Benchmark')
+    parser.add_argument('--rows', type=int, default=400000, help='download_queue rows to generate')
+    parser.add_argument('--seed', type=int, default=3, help='Random seed for the generated queue')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        template = Path(work_dir) / 'template.db'
+        build_database(template, args.rows, args.seed)
+        statements = maintenance_statements(datetime.utcnow())
+
+        results = {}
+        final_rows = {}
+        for name, maintenance in (('baseline', run_baseline), ('chunked', run_chunked)):
+            db_path = Path(work_dir) / f"{name}.db"
+            shutil.copy(template, db_path)
+            results[name] = measure(db_path, maintenance, statements)
+            with sqlite3.connect(db_path) as conn:
+                final_rows[name] = conn.execute(
+                    "SELECT id, status, priority FROM download_queue ORDER BY id"
+                ).fetchall()
+
+    print(json.dumps({
+        'rows': args.rows,
+        'results': results,
+        'identical_results': final_rows['baseline'] == final_rows['chunked'],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+FolioFox Download Write Benchmark
+
+Measures the CPU cost of writing a streamed download to disk:
+- baseline: 8 KiB iter_chunked reads written through aiofiles, without
+  hashing (the queue manager's write path before ChunkWriter)
+- chunk_writer: batched iter_any reads written by ChunkWriter, with the
+  SHA-256 computed inline
+
+The file is served from a separate process, so the reported CPU time
+covers only the downloading side.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import aiofiles
+import aiohttp
+from aiohttp import web
+
+sys.path.append(str(Path(__file__).parent.parent / 'automation' / 'download_queue'))
+from advanced_queue_manager import AdvancedQueueManager, ChunkWriter
+
+
+def serve(data_path: str, port: int, ready):
+    """Serve data_path at /book.pdf until terminated."""
+    async def handler(request):
+        return web.FileResponse(data_path)
+
+    async def main():
+        app = web.Application()
+        app.router.add_get('/book.pdf', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+        ready.set()
+        await asyncio.Event().wait()
+
+    asyncio.run(main())
+
+
+async def download_baseline(session: aiohttp.ClientSession, url: str, path: Path):
+    async with session.get(url) as response:
+        async with aiofiles.open(path, 'wb') as f:
+            async for chunk in response.content.iter_chunked(8192):
+                await f.write(chunk)
+    return None
+
+
+async def download_chunk_writer(session: aiohttp.ClientSession, url: str, path: Path):
+    async with session.get(url) as response:
+        writer = ChunkWriter(path, total_size=response.content_length)
+        try:
+            downloaded = 0
+            async for batch, nbytes in AdvancedQueueManager._read_batches(None, response):
+                await writer.write(batch, downloaded)
+                downloaded += nbytes
+            sha256 = await writer.close()
+            writer.truncate(downloaded)
+        finally:
+            await writer.abort()
+    return sha256
+
+
+async def measure(method, url: str, path: Path):
+    async with aiohttp.ClientSession() as session:
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        started = time.perf_counter()
+        sha256 = await method(session, url, path)
+        wall = time.perf_counter() - started
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    cpu = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {'wall_seconds': round(wall, 3), 'cpu_seconds': round(cpu, 3), 'sha256': sha256}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FolioFox Download Write Benchmark')
+    parser.add_argument('--size-mb', type=int, default=256, help='Size of the served file')
+    parser.add_argument('--runs', type=int, default=3, help='Runs per method; the best is reported')
+    parser.add_argument('--port', type=int, default=8765, help='Port for the local file server')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        data_path = Path(work_dir) / 'source.bin'
+        digest = hashlib.sha256()
+        with open(data_path, 'wb') as f:
+            for _ in range(args.size_mb):
+                block = os.urandom(1024 * 1024)
+                digest.update(block)
+                f.write(block)
+
+        ready = multiprocessing.Event()
+        server = multiprocessing.Process(target=serve, args=(str(data_path), args.port, ready), daemon=True)
+        server.start()
+        ready.wait(10)
+
+        url = f"http://127.0.0.1:{args.port}/book.pdf"
+        results = {}
+        try:
+            for name, method in (('baseline', download_baseline), ('chunk_writer', download_chunk_writer)):
+                runs = []
+                for run in range(args.runs):
+                    target = Path(work_dir) / f"{name}-{run}.pdf"
+                    runs.append(asyncio.run(measure(method, url, target)))
+                    if target.stat().st_size != data_path.stat().st_size:
+                        raise RuntimeError(f"{name} wrote {target.stat().st_size} bytes")
+                    target.unlink()
+
+                best = min(runs, key=lambda r: r['cpu_seconds'])
+                if best['sha256'] not in (None, digest.hexdigest()):
+                    raise RuntimeError(f"{name} produced a wrong SHA-256")
+                results[name] = {k: v for k, v in best.items() if k != 'sha256'}
+                results[name]['hashed'] = best['sha256'] is not None
+        finally:
+            server.terminate()
+            server.join()
+
+    print(json.dumps({'size_mb': args.size_mb, 'results': results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()